@@ -33,6 +33,7 @@ bool ParseAlphaCCConfig(const std::string& file_path) {
   auto GetString = ::rtc::GetStringFromJsonObject;
   auto GetBool = ::rtc::GetBoolFromJsonObject;
   auto GetInt = ::rtc::GetIntFromJsonObject;
+  auto GetDouble = ::rtc::GetDoubleFromJsonObject;
   auto GetValue = ::rtc::GetValueFromJsonObject;
 
   RETURN_ON_FAIL(reader.parse(is, top));
@@ -67,9 +68,67 @@ bool ParseAlphaCCConfig(const std::string& file_path) {
 
   RETURN_ON_FAIL(
       GetInt(top, "bwe_feedback_duration", &config->bwe_feedback_duration_ms));
+  // Also the timeout of the batched ONNX estimates without a pyinfer section
+  config->pyinfer_estimate_timeout_ms = 2 * config->bwe_feedback_duration_ms;
 
   if (GetValue(top, "onnx", &second)) {
     GetString(second, "onnx_model_path", &config->onnx_model_path);
+    GetBool(second, "batch_inference", &config->onnx_batch_inference);
+    GetInt(second, "batch_size", &config->onnx_batch_size);
+    GetInt(second, "metrics_interval", &config->onnx_metrics_interval_ms);
+    second.clear();
+  }
+
+  if (GetValue(top, "pyinfer", &second)) {
+    std::string report_format;
+    if (GetString(second, "report_format", &report_format)) {
+      if (report_format == "binary") {
+        config->pyinfer_report_format =
+            AlphaCCConfig::PyInferReportFormat::kBinary;
+      } else if (report_format == "json") {
+        config->pyinfer_report_format =
+            AlphaCCConfig::PyInferReportFormat::kJson;
+      } else {
+        return false;
+      }
+    }
+    GetBool(second, "async_estimate", &config->pyinfer_async_estimate);
+    if (!GetInt(second, "estimate_timeout",
+                &config->pyinfer_estimate_timeout_ms)) {
+      config->pyinfer_estimate_timeout_ms =
+          2 * config->bwe_feedback_duration_ms;
+    }
+    std::string stale_policy;
+    if (GetString(second, "stale_policy", &stale_policy)) {
+      if (stale_policy == "reuse") {
+        config->pyinfer_stale_policy = AlphaCCConfig::PyInferStalePolicy::kReuse;
+      } else if (stale_policy == "skip") {
+        config->pyinfer_stale_policy = AlphaCCConfig::PyInferStalePolicy::kSkip;
+      } else {
+        return false;
+      }
+    }
+    GetBool(second, "shadow", &config->pyinfer_shadow);
+    GetInt(second, "metrics_interval", &config->pyinfer_metrics_interval_ms);
+    second.clear();
+  }
+
+  if (GetValue(top, "stats_collect", &second)) {
+    GetString(second, "binary_path", &config->stats_binary_path);
+    if (!GetBool(second, "json_log", &config->stats_json_log)) {
+      config->stats_json_log = config->stats_binary_path.empty();
+    }
+    GetInt(second, "dump_interval", &config->stats_dump_interval_ms);
+    second.clear();
+  }
+
+  if (GetValue(top, "simulation", &second)) {
+    GetInt(second, "bandwidth", &config->simulation_bandwidth_kbps);
+    GetInt(second, "delay", &config->simulation_delay_ms);
+    GetInt(second, "delay_std_dev", &config->simulation_delay_std_dev_ms);
+    GetDouble(second, "loss_rate", &config->simulation_loss_rate);
+    GetInt(second, "queue_length", &config->simulation_queue_length);
+    GetBool(second, "software_encoder", &config->simulation_software_encoder);
     second.clear();
   }
 
@@ -43,6 +43,47 @@ struct AlphaCCConfig {
 
   int bwe_feedback_duration_ms = 0;
   std::string onnx_model_path;
+  // Run the ONNX model on a background worker: packets are fed to it in
+  // batches of onnx_batch_size and the inference runs every
+  // bwe_feedback_duration_ms, the receive path sends back the latest estimate
+  // subject to pyinfer_estimate_timeout_ms and pyinfer_stale_policy
+  bool onnx_batch_inference = false;
+  int onnx_batch_size = 256;
+  // Interval (in millisecond) at which the p50/p99 inference latency of the
+  // batched model is written to the log, 0 disables it
+  int onnx_metrics_interval_ms = 0;
+
+  // Wire format of the per-packet stats sent to the PyInfer estimator
+  enum class PyInferReportFormat {
+    kJson,
+    kBinary,
+  } pyinfer_report_format = PyInferReportFormat::kJson;
+  // Don't block the receive path on the PyInfer estimator: post bandwidth
+  // requests and use the latest estimate published so far
+  bool pyinfer_async_estimate = false;
+  // Age (in millisecond) after which an asynchronous estimate is stale
+  int pyinfer_estimate_timeout_ms = 0;
+  // What to do with a stale estimate: send it anyway or skip sending back
+  enum class PyInferStalePolicy {
+    kReuse,
+    kSkip,
+  } pyinfer_stale_policy = PyInferStalePolicy::kReuse;
+  // With an ONNX model as the bandwidth estimator, also feed PyInfer and
+  // log its estimates without sending them back
+  bool pyinfer_shadow = false;
+  // Interval (in millisecond) at which the round-trip times of PyInfer
+  // bandwidth requests are written to the log, 0 disables them
+  int pyinfer_metrics_interval_ms = 0;
+
+  // Per-packet statcollect records are appended to this binary file (see
+  // modules/third_party/statcollect/binary_sink.py), empty disables it
+  std::string stats_binary_path;
+  // Also write every record to the log as JSON. Defaults to true without a
+  // binary file, it is then the only output, and to false with one
+  bool stats_json_log = true;
+  // Records are collected in memory and written out in one batch every
+  // stats_dump_interval_ms (in millisecond), 0 writes them per packet
+  int stats_dump_interval_ms = 0;
 
   enum class VideoSourceOption {
     kVideoDisabled,
@@ -66,6 +107,21 @@ struct AlphaCCConfig {
 
   bool save_log_to_file;
   std::string log_output_path;
+
+  // Network emulated by peerconnection_serverless_simulation between the
+  // sender and the receiver, the call runs in simulated time
+  // Bottleneck rate (in kbps) of the forward path, 0 is unlimited
+  int simulation_bandwidth_kbps = 0;
+  // One-way delay (in millisecond) of both paths
+  int simulation_delay_ms = 0;
+  int simulation_delay_std_dev_ms = 0;
+  // Ratio of the forward packets dropped at random
+  double simulation_loss_rate = 0;
+  // Packets the bottleneck queues before dropping, 0 is unlimited
+  int simulation_queue_length = 0;
+  // Encode the video with VP8 instead of the fake encoder, which produces
+  // frames of the target size without looking at the source
+  bool simulation_software_encoder = false;
 };
 
 // Get alphaCC global configurations
@@ -11,10 +11,22 @@ class Estimator(object):
             "ssrc": int,
             "padding_length": uint,
             "header_length": uint,
-            "payload_size": uint
+            "payload_size": uint,
+            "loss_count": int,
+            "rtt_ms": int
         }
         '''
         pass
 
+    # Optionally implement report_states_batch instead of report_states to
+    # receive every packet since the last bandwidth request in one call:
+    #
+    # def report_states_batch(self, columns: dict):
+    #     '''
+    #     columns maps every field of report_states to a NumPy array (or a
+    #     list if NumPy is not installed), one element per packet
+    #     '''
+    #     pass
+
     def get_estimated_bandwidth(self)->int:
         return int(1e6) # 1Mbps
@@ -0,0 +1,140 @@
+/*
+ *  Copyright (c) 2020 The WebRTC project authors. All Rights Reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license
+ *  that can be found in the LICENSE file in the root of the source
+ *  tree. An additional intellectual property rights grant can be found
+ *  in the file PATENTS.  All contributing project authors may
+ *  be found in the AUTHORS file in the root of the source tree.
+ */
+
+// Runs a peerconnection_serverless call in simulated time: the sender and
+// the receiver are two calls of this process connected by an emulated
+// network, the clock only advances when every task due has run, so the
+// autoclose seconds of the call take as long as the work they contain. The
+// receiver feeds the same RemoteEstimatorProxy as peerconnection_serverless,
+// hence the ONNX model or the PyInfer estimator of the config.
+
+#include "logger.h"
+
+#include "api/alphacc_config.h"
+#include "api/units/data_rate.h"
+#include "api/units/time_delta.h"
+#include "system_wrappers/include/field_trial.h"
+#include "test/scenario/scenario.h"
+
+#include <iostream>
+#include <memory>
+
+#include <errno.h>
+#include <stdio.h>
+
+namespace {
+
+webrtc::test::NetworkSimulationConfig ForwardNetwork(
+    const webrtc::AlphaCCConfig& config) {
+  webrtc::test::NetworkSimulationConfig network;
+  if (config.simulation_bandwidth_kbps > 0) {
+    network.bandwidth =
+        webrtc::DataRate::KilobitsPerSec(config.simulation_bandwidth_kbps);
+  }
+  network.delay = webrtc::TimeDelta::Millis(config.simulation_delay_ms);
+  network.delay_std_dev =
+      webrtc::TimeDelta::Millis(config.simulation_delay_std_dev_ms);
+  network.loss_rate = config.simulation_loss_rate;
+  if (config.simulation_queue_length > 0) {
+    network.packet_queue_length_limit = config.simulation_queue_length;
+  }
+  return network;
+}
+
+void ConfigureVideo(const webrtc::AlphaCCConfig& config,
+                    webrtc::test::VideoStreamConfig* video) {
+  using Capture = webrtc::test::VideoStreamConfig::Source::Capture;
+  using Encoder = webrtc::test::VideoStreamConfig::Encoder;
+  // The send time of every packet is taken from its abs-send-time
+  video->stream.abs_send_time = true;
+  // Without a video file the frames are generated
+  if (config.video_source_option ==
+      webrtc::AlphaCCConfig::VideoSourceOption::kVideoFile) {
+    video->source.capture = Capture::kVideoFile;
+    video->source.video_file.name = config.video_file_path;
+    video->source.video_file.width = config.video_width;
+    video->source.video_file.height = config.video_height;
+    video->source.framerate = config.video_fps;
+  }
+  if (config.simulation_software_encoder) {
+    video->encoder.implementation = Encoder::Implementation::kSoftware;
+    video->encoder.codec = Encoder::Codec::kVideoCodecVP8;
+  }
+}
+
+}  // namespace
+
+int main(int argc, char* argv[]) {
+  if (argc != 2) {
+    fprintf(stderr, "Usage: %s config_file\n", argv[0]);
+    exit(EINVAL);
+  }
+
+  const auto json_file_path = argv[1];
+  if (!webrtc::ParseAlphaCCConfig(json_file_path)) {
+    std::cerr << "bad config file" << std::endl;
+    exit(EINVAL);
+  }
+
+  auto config = webrtc::GetAlphaCCConfig();
+  if (config->conn_autoclose <= 0) {
+    std::cerr << "a simulated call needs autoclose" << std::endl;
+    exit(EINVAL);
+  }
+
+  rtc::LogMessage::LogToDebug(rtc::LS_INFO);
+
+  std::unique_ptr<FileLogSink> sink;
+
+  if (config->save_log_to_file) {
+    sink = std::make_unique<FileLogSink>(config->log_output_path);
+  }
+
+  webrtc::field_trial::InitFieldTrialsFromString(
+      "WebRTC-KeepAbsSendTimeExtension/Enabled/");
+
+  webrtc::test::Scenario scenario("", /*real_time=*/false);
+  // Both clients run AlphaCC, the receiver sends its estimates back
+  webrtc::test::CallClientConfig sender_config;
+  // Without an audio file the audio is generated
+  if (config->audio_source_option ==
+      webrtc::AlphaCCConfig::AudioSourceOption::kAudioFile) {
+    sender_config.audio_file = config->audio_file_path;
+  }
+  auto* sender = scenario.CreateClient("sender", sender_config);
+  auto* receiver =
+      scenario.CreateClient("receiver", webrtc::test::CallClientConfig());
+  const auto forward = ForwardNetwork(*config);
+  auto* send_link = scenario.CreateSimulationNode(forward);
+  // The feedback only goes through the delay
+  auto* return_link = scenario.CreateSimulationNode(
+      [&](webrtc::test::NetworkSimulationConfig* network) {
+        network->delay = forward.delay;
+        network->delay_std_dev = forward.delay_std_dev;
+      });
+  auto* route =
+      scenario.CreateRoutes(sender, {send_link}, receiver, {return_link});
+
+  if (config->video_source_option !=
+      webrtc::AlphaCCConfig::VideoSourceOption::kVideoDisabled) {
+    scenario.CreateVideoStream(
+        route->forward(), [&](webrtc::test::VideoStreamConfig* video) {
+          ConfigureVideo(*config, video);
+        });
+  }
+  scenario.CreateAudioStream(
+      route->forward(), [](webrtc::test::AudioStreamConfig* audio) {
+        audio->stream.abs_send_time = true;
+      });
+
+  scenario.RunFor(webrtc::TimeDelta::Seconds(config->conn_autoclose));
+  RTC_LOG(LS_INFO) << "Simulated " << config->conn_autoclose << " s";
+  return 0;
+}
@@ -186,6 +186,8 @@ ReceiveSideCongestionController::GetRemoteBitrateEstimator(
 void ReceiveSideCongestionController::OnRttUpdate(int64_t avg_rtt_ms,
                                                   int64_t max_rtt_ms) {
   remote_bitrate_estimator_.OnRttUpdate(avg_rtt_ms, max_rtt_ms);
+  // The RTT reaches PyInfer and ONNXInfer through the proxy
+  remote_estimator_proxy_.OnRttUpdate(avg_rtt_ms, max_rtt_ms);
 }
 
 void ReceiveSideCongestionController::OnBitrateChanged(int bitrate_bps) {
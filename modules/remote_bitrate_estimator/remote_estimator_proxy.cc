@@ -18,6 +18,7 @@
 #include <algorithm>
 #include <limits>
 #include <memory>
+#include <string>
 #include <utility>
 #include <iostream>
 
@@ -52,18 +53,53 @@ RemoteEstimatorProxy::RemoteEstimatorProxy(
       feedback_packet_count_(0),
       send_interval_ms_(send_config_.default_interval->ms()),
       send_periodic_feedback_(true),
+      last_transport_seq_(0),
+      received_transport_packets_(0),
+      avg_rtt_ms_(-1),
       bwe_sendback_interval_ms_(GetAlphaCCConfig()->bwe_feedback_duration_ms),
       last_bwe_sendback_ms_(clock->TimeInMilliseconds()),
+      pyinfer_async_estimate_(GetAlphaCCConfig()->pyinfer_async_estimate),
+      pyinfer_estimates_(0),
+      pyinfer_stale_estimates_(0),
+      pyinfer_missing_estimates_(0),
+      last_pyinfer_metrics_ms_(clock->TimeInMilliseconds()),
       stats_collect_(StatCollect::SC_TYPE_STRUCT),
+      stats_json_log_(GetAlphaCCConfig()->stats_json_log),
+      last_stats_dump_ms_(clock->TimeInMilliseconds()),
       cycles_(-1),
       max_abs_send_time_(0),
-      onnx_infer_(nullptr) {
+      onnx_infer_(nullptr),
+      onnx_estimates_(0),
+      onnx_stale_estimates_(0),
+      last_onnx_metrics_ms_(clock->TimeInMilliseconds()),
+      pyinfer_shadow_(false) {
 
   if (!GetAlphaCCConfig()->onnx_model_path.empty()) {
     onnx_infer_ = onnxinfer::CreateONNXInferInterface(
         GetAlphaCCConfig()->onnx_model_path.c_str());
     if (!onnxinfer::IsReady(onnx_infer_)) {
       RTC_LOG(LS_ERROR) << "Failed to create onnx_infer_.";
+    } else if (GetAlphaCCConfig()->onnx_batch_inference) {
+      onnx_batch_.reset(new onnxinfer::BatchInfer(
+          onnx_infer_, GetAlphaCCConfig()->bwe_feedback_duration_ms,
+          GetAlphaCCConfig()->onnx_batch_size));
+    }
+    pyinfer_shadow_ = GetAlphaCCConfig()->pyinfer_shadow;
+  }
+  if (!onnx_infer_ || pyinfer_shadow_) {
+    cmdinfer::SetReportFormat(
+        GetAlphaCCConfig()->pyinfer_report_format ==
+                AlphaCCConfig::PyInferReportFormat::kBinary
+            ? cmdinfer::ReportFormat::kBinary
+            : cmdinfer::ReportFormat::kJson);
+  }
+  if (!GetAlphaCCConfig()->stats_binary_path.empty()) {
+    stats_sink_.reset(StatCollect::BinarySink::Open(
+        GetAlphaCCConfig()->stats_binary_path));
+    if (!stats_sink_) {
+      RTC_LOG(LS_ERROR) << "Failed to open the statcollect binary file "
+                        << GetAlphaCCConfig()->stats_binary_path
+                        << ", or it holds records of another format";
     }
   }
   RTC_LOG(LS_INFO)
@@ -72,9 +108,39 @@ RemoteEstimatorProxy::RemoteEstimatorProxy(
 }
 
 RemoteEstimatorProxy::~RemoteEstimatorProxy() {
+  if (onnx_batch_) {
+    RTC_LOG(LS_INFO) << "ONNXInfer: " << onnx_batch_->GetInfo()
+                     << "; estimates: " << onnx_estimates_
+                     << ", stale: " << onnx_stale_estimates_;
+    // The worker calls into the model until it is stopped
+    onnx_batch_.reset();
+  }
   if (onnx_infer_) {
     onnxinfer::DestroyONNXInferInterface(onnx_infer_);
   }
+  if (pyinfer_async_estimate_) {
+    RTC_LOG(LS_INFO) << "PyInfer asynchronous estimates: "
+                     << pyinfer_estimates_
+                     << ", stale: " << pyinfer_stale_estimates_
+                     << ", missing: " << pyinfer_missing_estimates_;
+  } else if (pyinfer_missing_estimates_ > 0) {
+    RTC_LOG(LS_INFO) << "PyInfer missing estimates: "
+                     << pyinfer_missing_estimates_;
+  }
+  if (GetAlphaCCConfig()->pyinfer_metrics_interval_ms > 0) {
+    std::string round_trips = cmdinfer::TakeRoundTripPlottableData();
+    if (!round_trips.empty()) {
+      RTC_LOG(LS_INFO) << round_trips;
+    }
+  }
+  {
+    rtc::CritScope cs(&lock_);
+    DumpStats();
+  }
+  if (stats_sink_ && stats_sink_->Dropped() > 0) {
+    RTC_LOG(LS_WARNING) << "Statcollect records dropped by the binary file: "
+                        << stats_sink_->Dropped();
+  }
 }
 
 void RemoteEstimatorProxy::IncomingPacket(int64_t arrival_time_ms,
@@ -94,13 +160,23 @@ void RemoteEstimatorProxy::IncomingPacket(int64_t arrival_time_ms,
   uint32_t send_time_ms =
       GetTtimeFromAbsSendtime(header.extension.absoluteSendTime);
 
-  // lossCound and RTT field for onnxinfer::OnReceived() are set to -1 since
-  // no available lossCound and RTT in webrtc
-  if (onnx_infer_) {
+  // The loss count and RTT are -1 until known, ONNXInfer takes the RTT in
+  // seconds
+  const int loss_count = TransportLossCount();
+  const int rtt_ms = static_cast<int>(avg_rtt_ms_);
+  const float rtt_s = rtt_ms < 0 ? -1.f : rtt_ms / 1000.f;
+  if (onnx_batch_) {
+    onnx_batch_->OnReceived(header.payloadType, header.sequenceNumber,
+                            send_time_ms, header.ssrc, header.paddingLength,
+                            header.headerLength, arrival_time_ms, payload_size,
+                            loss_count, rtt_s);
+  } else if (onnx_infer_) {
     onnxinfer::OnReceived(onnx_infer_, header.payloadType, header.sequenceNumber,
                           send_time_ms, header.ssrc, header.paddingLength,
-                          header.headerLength, arrival_time_ms, payload_size, -1, -1);
-  } else {
+                          header.headerLength, arrival_time_ms, payload_size,
+                          loss_count, rtt_s);
+  }
+  if (!onnx_infer_ || pyinfer_shadow_) {
     cmdinfer::ReportStates(
         send_time_ms,
         arrival_time_ms,
@@ -109,19 +185,35 @@ void RemoteEstimatorProxy::IncomingPacket(int64_t arrival_time_ms,
         header.sequenceNumber,
         header.ssrc,
         header.paddingLength,
-        header.headerLength);
+        header.headerLength,
+        loss_count,
+        rtt_ms);
   }
 
   //--- BandWidthControl: Send back bandwidth estimation into to sender ---
   bool time_to_send_bew_message = TimeToSendBweMessage();
   float estimation = 0;
   if (time_to_send_bew_message) {
-    BweMessage bwe;
-    if (onnx_infer_) {
+    if (onnx_batch_) {
+      time_to_send_bew_message = GetONNXBatchEstimate(&estimation);
+      if (time_to_send_bew_message && pyinfer_shadow_) {
+        LogPyInferShadowEstimate(estimation);
+      }
+    } else if (onnx_infer_) {
       estimation = onnxinfer::GetBweEstimate(onnx_infer_);
+      if (pyinfer_shadow_) {
+        LogPyInferShadowEstimate(estimation);
+      }
     } else {
-      estimation = cmdinfer::GetEstimatedBandwidth();
+      time_to_send_bew_message = GetPyInferEstimate(&estimation);
     }
+  }
+  if (!onnx_infer_ || pyinfer_shadow_) {
+    MaybeLogPyInferMetrics();
+  }
+  MaybeLogONNXInferMetrics();
+  if (time_to_send_bew_message) {
+    BweMessage bwe;
     bwe.pacing_rate = bwe.padding_rate = bwe.target_rate = estimation;
     bwe.timestamp_ms = clock_->TimeInMilliseconds();
     RTC_LOG(LS_INFO) << "Send back BWE estimation: " << estimation
@@ -131,6 +223,9 @@ void RemoteEstimatorProxy::IncomingPacket(int64_t arrival_time_ms,
 
   // Save per-packet info locally on receiving
   // ---------- Collect packet-related info into a local file ----------
+  if (!stats_sink_ && !stats_json_log_) {
+    return;
+  }
   double pacing_rate =
       time_to_send_bew_message ? estimation : SC_PACER_PACING_RATE_EMPTY;
   double padding_rate =
@@ -147,12 +242,13 @@ void RemoteEstimatorProxy::IncomingPacket(int64_t arrival_time_ms,
   {
     RTC_LOG(LS_ERROR) << "Collect data failed";
   }
-  std::string out_data = stats_collect_.DumpData();
-  if (out_data.empty())
-  {
-    RTC_LOG(LS_ERROR) << "Save data failed";
-  }
-  RTC_LOG(LS_INFO) << out_data;
+  MaybeDumpStats();
+}
+
+void RemoteEstimatorProxy::OnRttUpdate(int64_t avg_rtt_ms,
+                                       int64_t max_rtt_ms) {
+  rtc::CritScope cs(&lock_);
+  avg_rtt_ms_ = avg_rtt_ms;
 }
 
 bool RemoteEstimatorProxy::LatestEstimate(std::vector<unsigned int>* ssrcs,
@@ -242,6 +338,7 @@ void RemoteEstimatorProxy::OnPacketArrival(
     return;
 
   packet_arrival_times_[seq] = arrival_time;
+  CountTransportPacket(seq);
 
   // Limit the range of sequence numbers to send feedback for.
   auto first_arrival_time_to_keep = packet_arrival_times_.lower_bound(
@@ -263,6 +360,127 @@ void RemoteEstimatorProxy::OnPacketArrival(
   }
 }
 
+bool RemoteEstimatorProxy::GetPyInferEstimate(float* estimation) {
+  if (!pyinfer_async_estimate_) {
+    if (cmdinfer::GetEstimatedBandwidth(estimation)) {
+      return true;
+    }
+    ++pyinfer_missing_estimates_;
+    RTC_LOG(LS_WARNING) << "No PyInfer estimate received, missing: "
+                        << pyinfer_missing_estimates_;
+    return false;
+  }
+  // Post the next request and go on with whatever the estimator published
+  // last, instead of waiting for it while holding |lock_|.
+  cmdinfer::RequestEstimatedBandwidth();
+  ++pyinfer_estimates_;
+  int64_t age_ms = 0;
+  if (!cmdinfer::GetLatestEstimatedBandwidth(estimation, &age_ms)) {
+    ++pyinfer_missing_estimates_;
+    RTC_LOG(LS_WARNING) << "No PyInfer estimate available yet, missing: "
+                        << pyinfer_missing_estimates_;
+    return false;
+  }
+  if (age_ms > GetAlphaCCConfig()->pyinfer_estimate_timeout_ms) {
+    ++pyinfer_stale_estimates_;
+    RTC_LOG(LS_WARNING) << "PyInfer estimate is stale (" << age_ms
+                        << " ms old), stale: " << pyinfer_stale_estimates_
+                        << " of " << pyinfer_estimates_;
+    if (GetAlphaCCConfig()->pyinfer_stale_policy ==
+        AlphaCCConfig::PyInferStalePolicy::kSkip) {
+      return false;
+    }
+  }
+  return true;
+}
+
+bool RemoteEstimatorProxy::GetONNXBatchEstimate(float* estimation) {
+  // The latest estimate of the worker, none before its first inference
+  int64_t age_ms = 0;
+  if (!onnx_batch_->GetLatestEstimate(estimation, &age_ms)) {
+    return false;
+  }
+  ++onnx_estimates_;
+  if (age_ms > GetAlphaCCConfig()->pyinfer_estimate_timeout_ms) {
+    ++onnx_stale_estimates_;
+    RTC_LOG(LS_WARNING) << "ONNXInfer estimate is stale (" << age_ms
+                        << " ms old), stale: " << onnx_stale_estimates_
+                        << " of " << onnx_estimates_;
+    if (GetAlphaCCConfig()->pyinfer_stale_policy ==
+        AlphaCCConfig::PyInferStalePolicy::kSkip) {
+      return false;
+    }
+  }
+  return true;
+}
+
+void RemoteEstimatorProxy::LogPyInferShadowEstimate(float primary_estimation) {
+  // Never wait for the shadow estimator, the ONNX estimate goes out as is.
+  cmdinfer::RequestEstimatedBandwidth();
+  float shadow_estimation = 0;
+  int64_t age_ms = 0;
+  if (cmdinfer::GetLatestEstimatedBandwidth(&shadow_estimation, &age_ms)) {
+    RTC_LOG(LS_INFO) << "PyInfer shadow estimation: " << shadow_estimation
+                     << " (" << age_ms << " ms old), ONNX estimation: "
+                     << primary_estimation
+                     << " at time: " << clock_->TimeInMilliseconds();
+  }
+}
+
+void RemoteEstimatorProxy::MaybeLogPyInferMetrics() {
+  const int interval_ms = GetAlphaCCConfig()->pyinfer_metrics_interval_ms;
+  int64_t now_ms = clock_->TimeInMilliseconds();
+  if (interval_ms <= 0 || now_ms - last_pyinfer_metrics_ms_ < interval_ms) {
+    return;
+  }
+  last_pyinfer_metrics_ms_ = now_ms;
+  std::string round_trips = cmdinfer::TakeRoundTripPlottableData();
+  if (!round_trips.empty()) {
+    RTC_LOG(LS_INFO) << round_trips;
+  }
+}
+
+void RemoteEstimatorProxy::MaybeLogONNXInferMetrics() {
+  const int interval_ms = GetAlphaCCConfig()->onnx_metrics_interval_ms;
+  int64_t now_ms = clock_->TimeInMilliseconds();
+  if (!onnx_batch_ || interval_ms <= 0 ||
+      now_ms - last_onnx_metrics_ms_ < interval_ms) {
+    return;
+  }
+  last_onnx_metrics_ms_ = now_ms;
+  RTC_LOG(LS_INFO) << "ONNXInfer: " << onnx_batch_->GetInfo();
+}
+
+void RemoteEstimatorProxy::MaybeDumpStats() {
+  const int interval_ms = GetAlphaCCConfig()->stats_dump_interval_ms;
+  if (interval_ms > 0) {
+    int64_t now_ms = clock_->TimeInMilliseconds();
+    if (now_ms - last_stats_dump_ms_ < interval_ms) {
+      return;
+    }
+    last_stats_dump_ms_ = now_ms;
+  }
+  DumpStats();
+}
+
+void RemoteEstimatorProxy::DumpStats() {
+  std::string json_data;
+  if (stats_sink_) {
+    // The JSON log is only a debug copy of the binary records
+    auto res = stats_collect_.DumpToSink(
+        stats_sink_.get(), stats_json_log_ ? &json_data : nullptr);
+    if (res != StatCollect::SCResult::SC_SUCCESS) {
+      RTC_LOG(LS_ERROR) << "Save data failed";
+    }
+  } else if (stats_json_log_) {
+    stats_collect_.DumpData(&json_data);
+  }
+  // One log message per batch, one record per line
+  if (!json_data.empty()) {
+    RTC_LOG(LS_INFO) << json_data;
+  }
+}
+
 bool RemoteEstimatorProxy::TimeToSendBweMessage() {
   int64_t time_now = clock_->TimeInMilliseconds();
   if (time_now - bwe_sendback_interval_ms_ > last_bwe_sendback_ms_) {
@@ -419,4 +637,25 @@ uint32_t RemoteEstimatorProxy::GetTtimeFromAbsSendtime(
   return send_time_ms;
 }
 
+void RemoteEstimatorProxy::CountTransportPacket(int64_t seq) {
+  if (!first_transport_seq_) {
+    first_transport_seq_ = last_transport_seq_ = seq;
+  }
+  first_transport_seq_ = std::min(*first_transport_seq_, seq);
+  last_transport_seq_ = std::max(last_transport_seq_, seq);
+  ++received_transport_packets_;
+}
+
+int RemoteEstimatorProxy::TransportLossCount() const {
+  if (!first_transport_seq_) {
+    return -1;
+  }
+  // A reordered packet first counts as lost, then as received when it
+  // arrives. Duplicates older than |packet_arrival_times_| count twice.
+  const int64_t expected = last_transport_seq_ - *first_transport_seq_ + 1;
+  return static_cast<int>(rtc::SafeClamp<int64_t>(
+      expected - received_transport_packets_, 0,
+      std::numeric_limits<int>::max()));
+}
+
 }  // namespace webrtc
@@ -12,15 +12,18 @@
 #define MODULES_REMOTE_BITRATE_ESTIMATOR_REMOTE_ESTIMATOR_PROXY_H_
 
 #include <map>
+#include <memory>
 #include <vector>
 
 #include "api/transport/network_control.h"
 #include "api/transport/webrtc_key_value_config.h"
 #include "modules/remote_bitrate_estimator/include/remote_bitrate_estimator.h"
 #include "modules/third_party/onnxinfer/ONNXInferInterface.h"
+#include "modules/third_party/onnxinfer/batch_infer.h"
 #include "rtc_base/critical_section.h"
 #include "rtc_base/experiments/field_trial_parser.h"
 #include "rtc_base/numerics/sequence_number_util.h"
+#include "modules/third_party/statcollect/BinarySink.h"
 #include "modules/third_party/statcollect/StatCollect.h"
 
 namespace webrtc {
@@ -49,7 +52,7 @@ class RemoteEstimatorProxy : public RemoteBitrateEstimator {
   void RemoveStream(uint32_t ssrc) override {}
   bool LatestEstimate(std::vector<unsigned int>* ssrcs,
                       unsigned int* bitrate_bps) const override;
-  void OnRttUpdate(int64_t avg_rtt_ms, int64_t max_rtt_ms) override {}
+  void OnRttUpdate(int64_t avg_rtt_ms, int64_t max_rtt_ms) override;
   void SetMinBitrate(int min_bitrate_bps) override {}
   int64_t TimeUntilNextProcess() override;
   void Process() override;
@@ -86,6 +89,24 @@ class RemoteEstimatorProxy : public RemoteBitrateEstimator {
   void SendbackBweEstimation(const BweMessage& bwe_message)
       RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
   bool TimeToSendBweMessage() RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Returns false if no PyInfer estimate should be sent back this time.
+  bool GetPyInferEstimate(float* estimation)
+      RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Returns false if the batched ONNX model has no estimate to send back
+  // this time, applying the same timeout and stale policy as PyInfer.
+  bool GetONNXBatchEstimate(float* estimation)
+      RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Logs the latest PyInfer estimate next to the ONNX one it shadows.
+  void LogPyInferShadowEstimate(float primary_estimation)
+      RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Writes the PyInfer round-trip times every pyinfer_metrics_interval_ms.
+  void MaybeLogPyInferMetrics() RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Writes the ONNXInfer inference latency every onnx_metrics_interval_ms.
+  void MaybeLogONNXInferMetrics() RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Dumps the collected records every stats_dump_interval_ms.
+  void MaybeDumpStats() RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Moves every collected record to the binary file and/or the log.
+  void DumpStats() RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
 
   int64_t BuildFeedbackPacket(
       uint8_t feedback_packet_count,
@@ -99,6 +120,12 @@ class RemoteEstimatorProxy : public RemoteBitrateEstimator {
 
   uint32_t GetTtimeFromAbsSendtime(uint32_t absoluteSendTime)
       RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Counts the first arrival of |seq| (an unwrapped transport sequence
+  // number) for TransportLossCount.
+  void CountTransportPacket(int64_t seq) RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
+  // Packets lost so far according to the transport sequence numbers, -1
+  // before the first one.
+  int TransportLossCount() const RTC_EXCLUSIVE_LOCKS_REQUIRED(&lock_);
 
   Clock* const clock_;
   TransportFeedbackSenderInterface* const feedback_sender_;
@@ -117,16 +144,43 @@ class RemoteEstimatorProxy : public RemoteBitrateEstimator {
   std::map<int64_t, int64_t> packet_arrival_times_ RTC_GUARDED_BY(&lock_);
   int64_t send_interval_ms_ RTC_GUARDED_BY(&lock_);
   bool send_periodic_feedback_ RTC_GUARDED_BY(&lock_);
+  // Range of the transport sequence numbers received and how many of them
+  // arrived, their difference is the number of lost packets
+  absl::optional<int64_t> first_transport_seq_ RTC_GUARDED_BY(&lock_);
+  int64_t last_transport_seq_ RTC_GUARDED_BY(&lock_);
+  int64_t received_transport_packets_ RTC_GUARDED_BY(&lock_);
+  // Latest average RTT reported by the call stats (RTCP), -1 if none
+  int64_t avg_rtt_ms_ RTC_GUARDED_BY(&lock_);
 
   // Bandwidth estimation sending back
   int64_t bwe_sendback_interval_ms_ RTC_GUARDED_BY(&lock_);
   int64_t last_bwe_sendback_ms_ RTC_GUARDED_BY(&lock_);
 
+  // Asynchronous PyInfer estimates and how often they were not fresh, the
+  // missing ones are also counted for blocking queries that got no reply
+  const bool pyinfer_async_estimate_;
+  int64_t pyinfer_estimates_ RTC_GUARDED_BY(&lock_);
+  int64_t pyinfer_stale_estimates_ RTC_GUARDED_BY(&lock_);
+  int64_t pyinfer_missing_estimates_ RTC_GUARDED_BY(&lock_);
+  int64_t last_pyinfer_metrics_ms_ RTC_GUARDED_BY(&lock_);
+
   // StatCollect moudule
   StatCollect::StatsCollectModule stats_collect_;
+  // Binary file receiving the collected records, may be null
+  std::unique_ptr<StatCollect::BinarySink> stats_sink_;
+  const bool stats_json_log_;
+  int64_t last_stats_dump_ms_ RTC_GUARDED_BY(&lock_);
   int cycles_ RTC_GUARDED_BY(&lock_);
   uint32_t max_abs_send_time_ RTC_GUARDED_BY(&lock_);
   void* onnx_infer_;
+  // Runs |onnx_infer_| on a background worker, may be null
+  std::unique_ptr<onnxinfer::BatchInfer> onnx_batch_;
+  // Estimates of |onnx_batch_| sent back and how often they were stale
+  int64_t onnx_estimates_ RTC_GUARDED_BY(&lock_);
+  int64_t onnx_stale_estimates_ RTC_GUARDED_BY(&lock_);
+  int64_t last_onnx_metrics_ms_ RTC_GUARDED_BY(&lock_);
+  // PyInfer runs next to the ONNX model, its estimates are only logged
+  bool pyinfer_shadow_;
 };
 
 }  // namespace webrtc
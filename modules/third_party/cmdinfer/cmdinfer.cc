@@ -1,13 +1,230 @@
 #include "cmdinfer.h"
+#include "shm_ring.h"
 
 #include "modules/third_party/statcollect/json.hpp"
 
+#include <algorithm>
+#include <atomic>
+#include <cerrno>
+#include <chrono>
+#include <cmath>
+#include <cstdlib>
+#include <deque>
 #include <iostream>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <utility>
+#include <vector>
+
+#ifndef _WIN32
+#include <unistd.h>
+#endif
 
 
 const char * RequestBandwidthCommand = "RequestBandwidth";
 
-void cmdinfer::ReportStates(
+// Binary record layout (all integers little-endian):
+//   header:  uint8 magic, uint8 version, uint8 type, uint8 payload length
+//   payload: uint64 send_time_ms, uint64 arrival_time_ms,
+//            uint32 payload_size, uint32 ssrc, uint16 sequence_number,
+//            uint16 padding_length, uint16 header_length,
+//            uint8 payload_type, uint8 reserved,
+//            int32 loss_count, int32 rtt_ms
+// The magic byte is never a valid first byte of a UTF-8 text line, so
+// records can share the pipe with plain log lines.
+const std::uint8_t kBinaryMagic = 0xAC;
+const std::uint8_t kBinaryVersion = 2;
+const std::uint8_t kBinaryTypeStats = 1;
+const std::size_t kBinaryHeaderSize = 4;
+const std::size_t kBinaryStatsSize = 40;
+
+// If set, this environment variable holds the file descriptor of a
+// dedicated data channel (e.g. one end of a socketpair inherited from the
+// peerconnection_serverless wrapper). Stats and bandwidth requests then go
+// through that channel and stdin/stdout are left to the application logs.
+const char * kChannelFdEnv = "CMDINFER_CHANNEL_FD";
+
+// If set, this environment variable holds the file descriptor of a shared
+// memory ring (see shm_ring.h), which then replaces the channel above.
+const char * kShmFdEnv = "CMDINFER_SHM_FD";
+
+// Upper bound of a blocking bandwidth query through the shared ring, so a
+// dead estimator cannot wedge the receiver forever.
+const std::int64_t kShmReplyTimeoutMs = 5000;
+
+static cmdinfer::ReportFormat report_format = cmdinfer::ReportFormat::kJson;
+
+// State of the asynchronous bandwidth query
+static std::once_flag reply_reader_started;
+static std::atomic<bool> request_pending(false);
+static std::atomic<bool> estimate_available(false);
+static std::atomic<std::uint64_t> latest_estimate(0);
+static std::atomic<std::int64_t> latest_estimate_time_ms(0);
+
+// Send time of the request in flight, in steady clock microseconds
+static std::atomic<std::int64_t> request_time_us(0);
+
+// Post times of the shared ring requests whose reply was not timed yet:
+// {request sequence number, post time in steady clock microseconds}. A
+// request can be posted before the reply to the previous one is read, so
+// every reply is timed against the request it answers.
+const std::size_t kMaxShmRequestTimes = 64;
+static std::mutex shm_request_times_mutex;
+static std::deque<std::pair<std::uint64_t, std::int64_t>> shm_request_times;
+
+// Round trips of answered bandwidth requests, bounded in case nobody takes
+// them: {request time, round-trip time}, both in microseconds
+const std::size_t kMaxRoundTrips = 100000;
+static std::mutex round_trips_mutex;
+static std::vector<std::pair<std::int64_t, std::int64_t>> round_trips;
+
+static std::int64_t SteadyTimeMs() {
+    return std::chrono::duration_cast<std::chrono::milliseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+static std::int64_t SteadyTimeUs() {
+    return std::chrono::duration_cast<std::chrono::microseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+static void RecordRoundTrip(std::int64_t requestTimeUs, std::int64_t replyTimeUs) {
+    std::lock_guard<std::mutex> lock(round_trips_mutex);
+    if (round_trips.size() < kMaxRoundTrips) {
+        round_trips.emplace_back(requestTimeUs, replyTimeUs - requestTimeUs);
+    }
+}
+
+static void PostShmRequest(cmdinfer::ShmRing * ring) {
+    const std::int64_t postTimeUs = SteadyTimeUs();
+    const std::uint64_t request = ring->PostRequest();
+    std::lock_guard<std::mutex> lock(shm_request_times_mutex);
+    if (shm_request_times.size() == kMaxShmRequestTimes) {
+        shm_request_times.pop_front();
+    }
+    shm_request_times.emplace_back(request, postTimeUs);
+}
+
+// Records the round trip of the request answered by |reply|, once.
+static void TimeShmReply(std::uint64_t reply, std::int64_t replyTimeMs) {
+    std::lock_guard<std::mutex> lock(shm_request_times_mutex);
+    // Requests superseded before the estimator read them get no reply
+    while (!shm_request_times.empty() &&
+           shm_request_times.front().first < reply) {
+        shm_request_times.pop_front();
+    }
+    if (!shm_request_times.empty() &&
+        shm_request_times.front().first == reply) {
+        // The reply time has a millisecond resolution only
+        RecordRoundTrip(shm_request_times.front().second, replyTimeMs * 1000);
+        shm_request_times.pop_front();
+    }
+}
+
+static int FdFromEnv(const char * name) {
+    const char * value = std::getenv(name);
+    if (value == nullptr || *value == '\0') {
+        return -1;
+    }
+    char * end = nullptr;
+    long parsed = std::strtol(value, &end, 10);
+    if (*end != '\0' || parsed < 0) {
+        return -1;
+    }
+    return static_cast<int>(parsed);
+}
+
+static int ChannelFd() {
+#ifdef _WIN32
+    return -1;
+#else
+    static const int fd = FdFromEnv(kChannelFdEnv);
+    return fd;
+#endif
+}
+
+static cmdinfer::ShmRing * SharedRing() {
+    static cmdinfer::ShmRing * const ring = [] {
+        int fd = FdFromEnv(kShmFdEnv);
+        return fd < 0 ? nullptr
+                      : cmdinfer::ShmRing::OpenFromFd(fd, kBinaryStatsSize);
+    }();
+    return ring;
+}
+
+static void WriteMessage(const char * data, std::size_t size) {
+    int fd = ChannelFd();
+    if (fd < 0) {
+        std::cout.write(data, size);
+        std::cout.flush();
+        return;
+    }
+#ifndef _WIN32
+    while (size > 0) {
+        ssize_t written = ::write(fd, data, size);
+        if (written < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            return;
+        }
+        data += written;
+        size -= static_cast<std::size_t>(written);
+    }
+#endif
+}
+
+// Reads one bandwidth reply, returns false once the channel is closed.
+static bool ReadBandwidth(std::uint64_t * bandwidth) {
+    *bandwidth = 0;
+    int fd = ChannelFd();
+    if (fd < 0) {
+        return static_cast<bool>(std::cin >> *bandwidth);
+    }
+#ifndef _WIN32
+    // The reply is a single short line, read it byte by byte so nothing
+    // beyond the newline is consumed.
+    char c = 0;
+    while (true) {
+        ssize_t n = ::read(fd, &c, 1);
+        if (n < 0 && errno == EINTR) {
+            continue;
+        }
+        if (n <= 0) {
+            return false;
+        }
+        if (c == '\n') {
+            return true;
+        }
+        if (c >= '0' && c <= '9') {
+            *bandwidth = *bandwidth * 10 + static_cast<std::uint64_t>(c - '0');
+        }
+    }
+#endif
+    return false;
+}
+
+static void ReadRepliesForever() {
+    std::uint64_t bandwidth = 0;
+    while (ReadBandwidth(&bandwidth)) {
+        RecordRoundTrip(request_time_us.load(), SteadyTimeUs());
+        latest_estimate.store(bandwidth);
+        latest_estimate_time_ms.store(SteadyTimeMs());
+        estimate_available.store(true);
+        request_pending.store(false);
+    }
+}
+
+template <typename T>
+static std::uint8_t * PutLittleEndian(std::uint8_t * dst, T value) {
+    for (std::size_t i = 0; i < sizeof(T); ++i) {
+        *dst++ = static_cast<std::uint8_t>(value >> (8 * i));
+    }
+    return dst;
+}
+
+static void ReportStatesAsJson(
     std::uint64_t sendTimeMs,
     std::uint64_t receiveTimeMs,
     std::size_t payloadSize,
@@ -15,7 +232,9 @@ void cmdinfer::ReportStates(
     std::uint16_t sequenceNumber,
     std::uint32_t ssrc,
     std::size_t paddingLength,
-    std::size_t headerLength) {
+    std::size_t headerLength,
+    std::int32_t lossCount,
+    std::int32_t rttMs) {
 
     nlohmann::json j;
     j["send_time_ms"] = sendTimeMs;
@@ -26,13 +245,204 @@ void cmdinfer::ReportStates(
     j["padding_length"] = paddingLength;
     j["header_length"] = headerLength;
     j["payload_size"] = payloadSize;
+    j["loss_count"] = lossCount;
+    j["rtt_ms"] = rttMs;
 
-    std::cout << j.dump() << std::endl;
+    std::string line = j.dump();
+    line += '\n';
+    WriteMessage(line.data(), line.size());
 }
 
-float cmdinfer::GetEstimatedBandwidth() {
-    std::uint64_t bandwidth = 0;
-    std::cout << RequestBandwidthCommand << std::endl;
-    std::cin >> bandwidth;
-    return static_cast<float>(bandwidth);
+static void EncodeBinaryStats(
+    std::uint8_t * p,
+    std::uint64_t sendTimeMs,
+    std::uint64_t receiveTimeMs,
+    std::size_t payloadSize,
+    std::uint8_t payloadType,
+    std::uint16_t sequenceNumber,
+    std::uint32_t ssrc,
+    std::size_t paddingLength,
+    std::size_t headerLength,
+    std::int32_t lossCount,
+    std::int32_t rttMs) {
+
+    p = PutLittleEndian<std::uint64_t>(p, sendTimeMs);
+    p = PutLittleEndian<std::uint64_t>(p, receiveTimeMs);
+    p = PutLittleEndian<std::uint32_t>(p, static_cast<std::uint32_t>(payloadSize));
+    p = PutLittleEndian<std::uint32_t>(p, ssrc);
+    p = PutLittleEndian<std::uint16_t>(p, sequenceNumber);
+    p = PutLittleEndian<std::uint16_t>(p, static_cast<std::uint16_t>(paddingLength));
+    p = PutLittleEndian<std::uint16_t>(p, static_cast<std::uint16_t>(headerLength));
+    *p++ = payloadType;
+    *p++ = 0;
+    p = PutLittleEndian<std::uint32_t>(p, static_cast<std::uint32_t>(lossCount));
+    p = PutLittleEndian<std::uint32_t>(p, static_cast<std::uint32_t>(rttMs));
+}
+
+static void ReportStatesAsBinary(
+    std::uint64_t sendTimeMs,
+    std::uint64_t receiveTimeMs,
+    std::size_t payloadSize,
+    std::uint8_t payloadType,
+    std::uint16_t sequenceNumber,
+    std::uint32_t ssrc,
+    std::size_t paddingLength,
+    std::size_t headerLength,
+    std::int32_t lossCount,
+    std::int32_t rttMs) {
+
+    std::uint8_t record[kBinaryHeaderSize + kBinaryStatsSize];
+    record[0] = kBinaryMagic;
+    record[1] = kBinaryVersion;
+    record[2] = kBinaryTypeStats;
+    record[3] = static_cast<std::uint8_t>(kBinaryStatsSize);
+    EncodeBinaryStats(
+        record + kBinaryHeaderSize, sendTimeMs, receiveTimeMs, payloadSize,
+        payloadType, sequenceNumber, ssrc, paddingLength, headerLength,
+        lossCount, rttMs);
+
+    // A single write keeps the record atomic on the pipe.
+    WriteMessage(reinterpret_cast<const char *>(record), sizeof(record));
+}
+
+void cmdinfer::SetReportFormat(ReportFormat format) {
+    report_format = format;
+}
+
+void cmdinfer::ReportStates(
+    std::uint64_t sendTimeMs,
+    std::uint64_t receiveTimeMs,
+    std::size_t payloadSize,
+    std::uint8_t payloadType,
+    std::uint16_t sequenceNumber,
+    std::uint32_t ssrc,
+    std::size_t paddingLength,
+    std::size_t headerLength,
+    std::int32_t lossCount,
+    std::int32_t rttMs) {
+
+    if (cmdinfer::ShmRing * ring = SharedRing()) {
+        // The ring always carries binary records, a full ring drops them.
+        std::uint8_t record[kBinaryStatsSize];
+        EncodeBinaryStats(
+            record, sendTimeMs, receiveTimeMs, payloadSize, payloadType,
+            sequenceNumber, ssrc, paddingLength, headerLength, lossCount,
+            rttMs);
+        ring->Push(record);
+    } else if (report_format == ReportFormat::kBinary) {
+        ReportStatesAsBinary(
+            sendTimeMs, receiveTimeMs, payloadSize, payloadType,
+            sequenceNumber, ssrc, paddingLength, headerLength, lossCount,
+            rttMs);
+    } else {
+        ReportStatesAsJson(
+            sendTimeMs, receiveTimeMs, payloadSize, payloadType,
+            sequenceNumber, ssrc, paddingLength, headerLength, lossCount,
+            rttMs);
+    }
+}
+
+static void WriteRequest() {
+    std::string request = RequestBandwidthCommand;
+    request += '\n';
+    WriteMessage(request.data(), request.size());
+}
+
+bool cmdinfer::GetEstimatedBandwidth(float * bandwidth) {
+    std::uint64_t estimate = 0;
+    const std::int64_t start = SteadyTimeUs();
+    if (cmdinfer::ShmRing * ring = SharedRing()) {
+        const std::uint64_t request = ring->PostRequest();
+        const std::int64_t deadline = SteadyTimeMs() + kShmReplyTimeoutMs;
+        std::uint64_t reply = 0;
+        std::int64_t replyTimeMs = 0;
+        while (!ring->ReadReply(&reply, &estimate, &replyTimeMs) ||
+               reply < request) {
+            if (SteadyTimeMs() > deadline) {
+                return false;
+            }
+            std::this_thread::sleep_for(std::chrono::microseconds(50));
+        }
+    } else {
+        WriteRequest();
+        if (!ReadBandwidth(&estimate)) {
+            return false;
+        }
+    }
+    RecordRoundTrip(start, SteadyTimeUs());
+    *bandwidth = static_cast<float>(estimate);
+    return true;
+}
+
+void cmdinfer::RequestEstimatedBandwidth() {
+    if (cmdinfer::ShmRing * ring = SharedRing()) {
+        if (!ring->RequestPending()) {
+            PostShmRequest(ring);
+        }
+        return;
+    }
+    std::call_once(reply_reader_started, [] {
+        std::thread(ReadRepliesForever).detach();
+    });
+    // Only one request is in flight at a time, so a slow estimator is not
+    // flooded with requests it cannot keep up with.
+    bool expected = false;
+    if (request_pending.compare_exchange_strong(expected, true)) {
+        request_time_us.store(SteadyTimeUs());
+        WriteRequest();
+    }
+}
+
+bool cmdinfer::GetLatestEstimatedBandwidth(
+    float * bandwidth,
+    std::int64_t * ageMs) {
+    if (cmdinfer::ShmRing * ring = SharedRing()) {
+        std::uint64_t reply = 0;
+        std::uint64_t estimate = 0;
+        std::int64_t replyTimeMs = 0;
+        if (!ring->ReadReply(&reply, &estimate, &replyTimeMs)) {
+            return false;
+        }
+        TimeShmReply(reply, replyTimeMs);
+        // steady_clock and the Python side's time.monotonic() both use
+        // CLOCK_MONOTONIC on Linux.
+        *bandwidth = static_cast<float>(estimate);
+        *ageMs = SteadyTimeMs() - replyTimeMs;
+        return true;
+    }
+    if (!estimate_available.load()) {
+        return false;
+    }
+    *bandwidth = static_cast<float>(latest_estimate.load());
+    *ageMs = SteadyTimeMs() - latest_estimate_time_ms.load();
+    return true;
+}
+
+std::string cmdinfer::TakeRoundTripPlottableData() {
+    std::vector<std::pair<std::int64_t, std::int64_t>> taken;
+    {
+        std::lock_guard<std::mutex> lock(round_trips_mutex);
+        taken.swap(round_trips);
+    }
+    if (taken.empty()) {
+        return std::string();
+    }
+    double sum = 0;
+    double squares = 0;
+    nlohmann::json samples = nlohmann::json::array();
+    for (const auto & roundTrip : taken) {
+        const double value = static_cast<double>(roundTrip.second);
+        sum += value;
+        squares += value * value;
+        samples.push_back({{"time", roundTrip.first}, {"value", roundTrip.second}});
+    }
+    const double mean = sum / taken.size();
+    nlohmann::json j;
+    j["graph_name"] = "GetEstimatedBandwidth";
+    j["trace_name"] = "cmdinfer";
+    j["units"] = "us";
+    j["mean"] = mean;
+    j["std"] = std::sqrt(std::max(0.0, squares / taken.size() - mean * mean));
+    j["samples"] = samples;
+    return "PLOTTABLE_DATA: " + j.dump();
 }
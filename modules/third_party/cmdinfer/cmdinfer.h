@@ -3,8 +3,21 @@
 
 #include <cinttypes>
 #include <cstddef>
+#include <string>
 
 namespace cmdinfer {
+    // Wire format of the per-packet records written by ReportStates.
+    // kJson emits one JSON object per line. kBinary emits a versioned,
+    // length-prefixed record (see cmdinfer.py for the matching decoder).
+    enum class ReportFormat {
+        kJson,
+        kBinary,
+    };
+
+    void SetReportFormat(ReportFormat format);
+
+    // |lossCount| is the number of packets lost so far and |rttMs| the
+    // latest RTCP round-trip time, both -1 while unknown.
     void ReportStates(
         std::uint64_t sendTimeMs,
         std::uint64_t receiveTimeMs,
@@ -13,9 +26,28 @@ namespace cmdinfer {
         std::uint16_t sequenceNumber,
         std::uint32_t ssrc,
         std::size_t paddingLength,
-        std::size_t headerLength);
+        std::size_t headerLength,
+        std::int32_t lossCount,
+        std::int32_t rttMs);
+
+    // Blocks until the Python estimator answers. Returns false, leaving
+    // |bandwidth| untouched, if the channel is closed or the shared ring got
+    // no reply in time.
+    bool GetEstimatedBandwidth(float * bandwidth);
+
+    // Asynchronous variant: RequestEstimatedBandwidth posts a request
+    // without waiting (at most one request is in flight) and replies are
+    // collected by a background reader. GetLatestEstimatedBandwidth returns
+    // false until the first reply arrived, otherwise the latest estimate
+    // and how long ago (in ms) it was received.
+    // Do not mix with GetEstimatedBandwidth in the same process.
+    void RequestEstimatedBandwidth();
+    bool GetLatestEstimatedBandwidth(float * bandwidth, std::int64_t * ageMs);
 
-    float GetEstimatedBandwidth();
+    // Round-trip times of the bandwidth requests answered since the previous
+    // call, as a "PLOTTABLE_DATA: " line for rtc_tools/metrics_plotter.py
+    // (in microseconds), or an empty string if none was answered.
+    std::string TakeRoundTripPlottableData();
 }
 
 #endif
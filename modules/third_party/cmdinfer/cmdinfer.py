@@ -2,20 +2,95 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import os
 import json
 import glob
+import importlib
+import struct
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 RequestBandwidthCommand = "RequestBandwidth"
 
+# Binary record format, see cmdinfer.cc for the producer side.
+BinaryMagic = 0xAC
+BinaryVersion = 2
+BinaryTypeStats = 1
+BinaryHeader = struct.Struct("<BBBB")
+BinaryStats = struct.Struct("<QQIIHHHBxii")
+BinaryStatsFields = (
+    "send_time_ms",
+    "arrival_time_ms",
+    "payload_size",
+    "ssrc",
+    "sequence_number",
+    "padding_length",
+    "header_length",
+    "payload_type",
+    "loss_count",
+    "rtt_ms",
+)
+# Fields the receiver may not know, -1 when it does not: the packets lost
+# so far according to the transport sequence numbers, and the RTCP RTT
+BinaryStatsDefaults = {
+    "loss_count": -1,
+    "rtt_ms": -1,
+}
+# Fields every JSON stats line has
+RequiredStatsFields = tuple(
+    field for field in BinaryStatsFields if field not in BinaryStatsDefaults)
+
+# Structured dtype matching BinaryStats, used to deliver batches as columns
+BinaryStatsDtype = numpy.dtype([
+    ("send_time_ms", "<u8"),
+    ("arrival_time_ms", "<u8"),
+    ("payload_size", "<u4"),
+    ("ssrc", "<u4"),
+    ("sequence_number", "<u2"),
+    ("padding_length", "<u2"),
+    ("header_length", "<u2"),
+    ("payload_type", "u1"),
+    ("reserved", "u1"),
+    ("loss_count", "<i4"),
+    ("rtt_ms", "<i4"),
+]) if numpy else None
+
+# Upper bound of packets buffered between two bandwidth requests
+MaxBatchSize = 4096
+
+MessageStats = "stats"
+MessageRawStats = "raw_stats"
+MessageRequest = "request"
+MessageLog = "log"
+
+DefaultEstimatorModule = "BandwidthEstimator"
+DefaultEstimatorClass = "Estimator"
+
+# Estimator classes imported by this process, so that a long-lived process
+# serving several sessions imports every estimator (and its ML framework)
+# only once.
+EstimatorClasses = {}
+
 
 def fetch_stats(line: str)->dict:
+    '''
+    Returns the packet stats of a JSON line, None if the line is not a JSON
+    object with every field of RequiredStatsFields.
+    '''
     line = line.strip()
     try:
         stats = json.loads(line)
-        return stats
     except json.decoder.JSONDecodeError:
         return None
+    if not isinstance(stats, dict) or any(
+            field not in stats for field in RequiredStatsFields):
+        return None
+    return stats
 
 
 def request_estimated_bandwidth(line: str)->bool:
@@ -25,32 +100,348 @@ def request_estimated_bandwidth(line: str)->bool:
     return False
 
 
-def find_estimator_class():
-    import BandwidthEstimator
-    return BandwidthEstimator.Estimator
+def decode_binary_stats(payload: bytes)->dict:
+    return dict(zip(BinaryStatsFields, BinaryStats.unpack_from(payload)))
+
+
+def encode_binary_stats(stats: dict)->bytes:
+    return BinaryStats.pack(*[
+        stats[field] if field in stats else BinaryStatsDefaults[field]
+        for field in BinaryStatsFields])
+
+
+def read_binary_record(ifd, first: bytes, decode: bool = True, histogram = None):
+    header = first + ifd.read(BinaryHeader.size - len(first))
+    if len(header) < BinaryHeader.size:
+        return None, None
+    _, version, record_type, length = BinaryHeader.unpack(header)
+    payload = ifd.read(length)
+    if len(payload) < length:
+        return None, None
+    if version != BinaryVersion:
+        raise ValueError("Unsupported cmdinfer record version {}".format(version))
+    if record_type == BinaryTypeStats:
+        if not decode:
+            return MessageRawStats, payload
+        if histogram is None:
+            return MessageStats, decode_binary_stats(payload)
+        start = time.perf_counter_ns()
+        stats = decode_binary_stats(payload)
+        histogram.record_ns(time.perf_counter_ns() - start)
+        return MessageStats, stats
+    # Unknown record types are skipped by their length prefix
+    return MessageLog, ""
+
+
+def parse_line(line: str, histogram = None):
+    if histogram is None:
+        stats = fetch_stats(line)
+    else:
+        start = time.perf_counter_ns()
+        stats = fetch_stats(line)
+        histogram.record_ns(time.perf_counter_ns() - start)
+    if stats:
+        return MessageStats, stats
+    if request_estimated_bandwidth(line):
+        return MessageRequest, None
+    return MessageLog, line
+
+
+def read_message(ifd, decode: bool = True, histogram = None):
+    '''
+    Read the next message from ifd and return a (kind, value) tuple, where
+    kind is one of MessageStats, MessageRequest or MessageLog. Returns
+    (None, None) at the end of the stream. Binary streams may carry both
+    binary records and text lines, text streams are read line by line.
+    If decode is False, binary stats records are returned undecoded as
+    (MessageRawStats, payload). The time spent decoding stats is recorded
+    into histogram if given.
+    '''
+    first = ifd.read(1)
+    if not first:
+        return None, None
+    if isinstance(first, str):
+        return parse_line(first + ifd.readline(), histogram)
+    if first[0] == BinaryMagic:
+        return read_binary_record(ifd, first, decode, histogram)
+    line = first
+    if first != b"\n":
+        line += ifd.readline()
+    return parse_line(line.decode("utf-8", errors="replace"), histogram)
+
+
+class StatsBatch(object):
+    '''
+    Accumulates packet stats between two bandwidth requests and hands them
+    out as columns, i.e. a dict mapping every stats field to a NumPy array
+    (or a list when NumPy is not available).
+    '''
+    def __init__(self):
+        self.records = bytearray()
+
+    def __len__(self):
+        return len(self.records) // BinaryStats.size
+
+    def append(self, stats: dict):
+        self.records += encode_binary_stats(stats)
+
+    def append_raw(self, payload: bytes):
+        self.records += payload[:BinaryStats.size]
+
+    def flush(self)->dict:
+        records = bytes(self.records)
+        self.records = bytearray()
+        if numpy is not None:
+            table = numpy.frombuffer(records, dtype=BinaryStatsDtype)
+            return {field: table[field] for field in BinaryStatsFields}
+        values = list(zip(*BinaryStats.iter_unpack(records)))
+        if not values:
+            values = [()] * len(BinaryStatsFields)
+        return {field: list(column)
+                for field, column in zip(BinaryStatsFields, values)}
+
+
+class BatchAdapter(object):
+    '''
+    Exposes report_states_batch for an Estimator that only implements the
+    per-packet report_states.
+    '''
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def report_states_batch(self, columns: dict):
+        fields = list(columns)
+        for values in zip(*[columns[field] for field in fields]):
+            self.estimator.report_states(
+                dict(zip(fields, [int(value) for value in values])))
+
+    def get_estimated_bandwidth(self)->int:
+        return self.estimator.get_estimated_bandwidth()
 
 
-def main(ifd = sys.stdin, ofd = sys.stdout):
-    estimator_class = find_estimator_class()
-    estimator = estimator_class()
+def as_batch_estimator(estimator):
+    if hasattr(estimator, "report_states_batch"):
+        return estimator
+    return BatchAdapter(estimator)
+
+
+def estimator_options(config: dict)->dict:
+    '''
+    Return the "estimator" options of the "pyinfer" section of a serverless
+    config, completed with their defaults.
+    '''
+    return complete_estimator_options(
+        config.get("pyinfer", {}).get("estimator", {}))
+
+
+def complete_estimator_options(options: dict)->dict:
+    return {
+        "module": options.get("module", DefaultEstimatorModule),
+        "class": options.get("class", DefaultEstimatorClass),
+        "path": options.get("path", "."),
+        "preload": bool(options.get("preload", False)),
+        "instances": options.get("instances", "session"),
+        "args": dict(options.get("args") or {}),
+    }
+
+
+def find_estimator_class(
+        module: str = DefaultEstimatorModule,
+        class_name: str = DefaultEstimatorClass,
+        path: str = "."):
+    '''
+    Import module and return its class_name. path is the directory holding
+    the estimator, it is appended to sys.path on first use. With path None
+    the estimator is imported from sys.path only, e.g. an installed package.
+    '''
+    directory = os.path.abspath(path) if path is not None else None
+    key = (module, class_name, directory)
+    if key not in EstimatorClasses:
+        if directory is not None and directory not in sys.path:
+            sys.path.append(directory)
+        estimator_module = importlib.import_module(module)
+        EstimatorClasses[key] = getattr(estimator_module, class_name)
+    return EstimatorClasses[key]
+
+
+class SsrcEstimators(object):
+    '''
+    Runs a separate estimator instance for every SSRC. Packets are routed
+    by their ssrc field, the estimate of the session is the sum of the
+    estimates of its streams. Every instance is created with the keyword
+    arguments args.
+    '''
+    def __init__(self, estimator_class, args: dict = None):
+        self.estimator_class = estimator_class
+        self.args = args or {}
+        self.estimators = {}
+        if hasattr(estimator_class, "report_states_batch"):
+            self.report_states_batch = self.report_columns
+
+    def estimator(self, ssrc):
+        if ssrc not in self.estimators:
+            self.estimators[ssrc] = self.estimator_class(**self.args)
+        return self.estimators[ssrc]
+
+    def report_states(self, stats: dict):
+        self.estimator(stats["ssrc"]).report_states(stats)
+
+    def report_columns(self, columns: dict):
+        ssrcs = columns["ssrc"]
+        if numpy is not None and isinstance(ssrcs, numpy.ndarray):
+            for ssrc in numpy.unique(ssrcs):
+                mask = ssrcs == ssrc
+                self.estimator(int(ssrc)).report_states_batch(
+                    {field: column[mask] for field, column in columns.items()})
+            return
+        for ssrc in sorted(set(ssrcs)):
+            self.estimator(ssrc).report_states_batch(
+                {field: [value for value, s in zip(column, ssrcs) if s == ssrc]
+                 for field, column in columns.items()})
+
+    def get_estimated_bandwidth(self)->int:
+        streams = [estimator for ssrc, estimator in self.estimators.items()
+                   if ssrc is not None]
+        if not streams:
+            # No packet received yet, ask a stream-less instance
+            streams = [self.estimator(None)]
+        return sum(int(estimator.get_estimated_bandwidth())
+                   for estimator in streams)
+
+
+def create_estimator(options: dict = None):
+    '''
+    Instantiate the estimator of one session from estimator_options.
+    '''
+    if options is None:
+        options = estimator_options({})
+    estimator_class = find_estimator_class(
+        options["module"], options["class"], options["path"])
+    args = options.get("args", {})
+    if options["instances"] == "ssrc":
+        return SsrcEstimators(estimator_class, args)
+    if options["instances"] != "session":
+        raise ValueError("Unknown estimator instances {}".format(
+            options["instances"]))
+    return estimator_class(**args)
+
+
+def timed(histogram, function, *args):
+    '''
+    Call function, recording its duration into histogram unless it is None.
+    '''
+    if histogram is None:
+        return function(*args)
+    start = time.perf_counter_ns()
+    result = function(*args)
+    histogram.record_ns(time.perf_counter_ns() - start)
+    return result
+
+
+def main(ifd = sys.stdin, ofd = sys.stdout, estimator = None, metrics = None):
+    '''
+    Serve estimator over ifd and ofd until the end of ifd. metrics, a
+    metrics.Metrics, records the latency of every stage of the loop.
+    '''
+    if estimator is None:
+        estimator = create_estimator()
+    parse = report = estimate = None
+    if metrics is not None:
+        parse = metrics.parse
+        report = metrics.report_states
+        estimate = metrics.get_estimated_bandwidth
+    # Estimators implementing report_states_batch get every packet received
+    # since the last request in one call instead of one call per packet.
+    batch = StatsBatch() if hasattr(estimator, "report_states_batch") else None
     while True:
-        line = ifd.readline()
-        if not line:
+        kind, value = read_message(ifd, decode=batch is None, histogram=parse)
+        if kind is None:
             break
-        if isinstance(line, bytes):
-            line = line.decode("utf-8")
-        stats = fetch_stats(line)
-        if stats:
-            estimator.report_states(stats)
+        if kind == MessageStats or kind == MessageRawStats:
+            if batch is None:
+                timed(report, estimator.report_states, value)
+                continue
+            if kind == MessageRawStats:
+                batch.append_raw(value)
+            else:
+                batch.append(value)
+            if len(batch) >= MaxBatchSize:
+                timed(report, estimator.report_states_batch, batch.flush())
             continue
-        request = request_estimated_bandwidth(line)
-        if request:
-            bandwidth = estimator.get_estimated_bandwidth()
+        if kind == MessageRequest:
+            if batch is not None and len(batch):
+                timed(report, estimator.report_states_batch, batch.flush())
+            bandwidth = timed(estimate, estimator.get_estimated_bandwidth)
             ofd.write("{}\n".format(int(bandwidth)).encode("utf-8"))
             ofd.flush()
+            if metrics is not None:
+                metrics.maybe_export()
             continue
-        sys.stdout.write(line)
+        sys.stdout.write(value)
         sys.stdout.flush()
+    if batch is not None and len(batch):
+        timed(report, estimator.report_states_batch, batch.flush())
+    if metrics is not None:
+        metrics.export()
+
+
+def report_records(estimator, records: bytes, batch: bool):
+    if not records:
+        return
+    if batch:
+        columns = StatsBatch()
+        columns.records += records
+        estimator.report_states_batch(columns.flush())
+        return
+    for values in BinaryStats.iter_unpack(records):
+        estimator.report_states(dict(zip(BinaryStatsFields, values)))
+
+
+def main_shared_memory(
+        ring, running = lambda: True, idle_sleep = 0.0002, estimator = None,
+        metrics = None):
+    '''
+    Serve the estimator over a shmring.ShmRing until running() returns
+    False. Records are drained in bulk, so estimators implementing
+    report_states_batch receive every available packet in one call.
+    '''
+    if estimator is None:
+        estimator = create_estimator()
+    report = estimate = None
+    if metrics is not None:
+        report = metrics.report_states
+        estimate = metrics.get_estimated_bandwidth
+    batch = hasattr(estimator, "report_states_batch")
+    idle = 0
+    while True:
+        records = ring.read_records()
+        if records:
+            timed(report, report_records, estimator, records, batch)
+        request = ring.pending_request()
+        if request:
+            # Packets written before the request must be reported first
+            pending = ring.read_records()
+            if pending:
+                timed(report, report_records, estimator, pending, batch)
+            bandwidth = timed(estimate, estimator.get_estimated_bandwidth)
+            ring.publish_bandwidth(request, int(bandwidth))
+            if metrics is not None:
+                metrics.maybe_export()
+        if records or request:
+            idle = 0
+            continue
+        if not running():
+            report_records(estimator, ring.read_records(), batch)
+            break
+        # Back off gradually while the receiver is quiet
+        idle = min(idle + 1, 10)
+        time.sleep(idle_sleep * idle)
+    if metrics is not None:
+        metrics.export()
+    if ring.dropped():
+        sys.stderr.write(
+            "cmdinfer: {} packet records dropped, the shared ring was full\n"
+            .format(ring.dropped()))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Measures PyInfer transport throughput in packets per second.
+
+A producer process plays the receiver: it reports N packets and requests a
+bandwidth estimate every --request_interval packets, blocking on the reply
+like cmdinfer::GetEstimatedBandwidth. The consumer runs the cmdinfer loop
+with a no-op estimator. Run with
+
+      python3 cmdinfer_benchmark.py [--packets N] [--transports json,binary,shm]
+
+With --call_setup it measures instead the time from the start of a call to
+its first bandwidth reply, once with a freshly spawned estimator process and
+once attached to an estimator_server pool:
+
+      python3 cmdinfer_benchmark.py --call_setup [--config receiver.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cmdinfer
+import estimator_server
+import shmring
+
+
+# Estimator process started per call when no server is used
+SpawnEstimator = (
+    "import json, sys, cmdinfer\n"
+    "cmdinfer.main(sys.stdin.buffer, sys.stdout.buffer,\n"
+    "              cmdinfer.create_estimator(json.loads(sys.argv[1])))\n")
+
+
+class NullEstimator(object):
+    def report_states(self, stats: dict):
+        pass
+
+    def get_estimated_bandwidth(self)->int:
+        return int(1e6)
+
+
+class NullBatchEstimator(NullEstimator):
+    def report_states_batch(self, columns: dict):
+        pass
+
+
+def make_stats(i: int)->dict:
+    return {
+        "send_time_ms": i,
+        "arrival_time_ms": i + 20,
+        "payload_size": 1200,
+        "ssrc": 1,
+        "sequence_number": i & 0xffff,
+        "padding_length": 0,
+        "header_length": 24,
+        "payload_type": 96,
+    }
+
+
+def encode_json(stats: dict)->bytes:
+    return (json.dumps(stats) + "\n").encode("utf-8")
+
+
+def encode_binary(stats: dict)->bytes:
+    return cmdinfer.BinaryHeader.pack(
+        cmdinfer.BinaryMagic, cmdinfer.BinaryVersion,
+        cmdinfer.BinaryTypeStats, cmdinfer.BinaryStats.size) + \
+        cmdinfer.encode_binary_stats(stats)
+
+
+def produce_stream(wfd: int, rfd: int, encode, packets: int, interval: int):
+    reply = os.fdopen(rfd, "rb")
+    for i in range(packets):
+        os.write(wfd, encode(make_stats(i)))
+        if (i + 1) % interval == 0:
+            os.write(wfd, b"RequestBandwidth\n")
+            reply.readline()
+    os.close(wfd)
+
+
+def produce_shm(fd: int, packets: int, interval: int):
+    ring = shmring.ShmRing(fd)
+    for i in range(packets):
+        while not ring.push(cmdinfer.encode_binary_stats(make_stats(i))):
+            time.sleep(0)
+        if (i + 1) % interval == 0:
+            request = ring.post_request()
+            while ring.read_reply()[0] < request:
+                time.sleep(0)
+    ring.close()
+
+
+def run_stream(estimator, encode, packets: int, interval: int)->float:
+    data_r, data_w = os.pipe()
+    reply_r, reply_w = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(data_r)
+        os.close(reply_w)
+        produce_stream(data_w, reply_r, encode, packets, interval)
+        os._exit(0)
+    os.close(data_w)
+    os.close(reply_r)
+    with os.fdopen(data_r, "rb") as ifd, os.fdopen(reply_w, "wb") as ofd:
+        cmdinfer.main(ifd, ofd, estimator)
+    os.waitpid(pid, 0)
+    return time.perf_counter() - start
+
+
+def run_shm(estimator, packets: int, interval: int)->float:
+    fd = shmring.create()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        produce_shm(fd, packets, interval)
+        os._exit(0)
+    ring = shmring.ShmRing(fd)
+    os.close(fd)
+    done = []
+
+    def running()->bool:
+        if not done and os.waitpid(pid, os.WNOHANG)[0] == pid:
+            done.append(True)
+        return not done
+    cmdinfer.main_shared_memory(ring, running, estimator=estimator)
+    ring.close()
+    return time.perf_counter() - start
+
+
+def first_request()->bytes:
+    return encode_binary(make_stats(0)) + b"RequestBandwidth\n"
+
+
+def spawn_call_setup(options: dict)->float:
+    env = dict(os.environ)
+    paths = [os.path.dirname(os.path.abspath(cmdinfer.__file__))]
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    start = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-c", SpawnEstimator, json.dumps(options)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+    child.stdin.write(first_request())
+    child.stdin.flush()
+    child.stdout.readline()
+    elapsed = time.perf_counter() - start
+    child.stdin.close()
+    child.wait()
+    return elapsed
+
+
+def pool_call_setup(path: str)->float:
+    start = time.perf_counter()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.connect(path)
+        server.sendall(first_request())
+        with server.makefile("rb") as reply:
+            reply.readline()
+        return time.perf_counter() - start
+
+
+def run_call_setup(options: dict, calls: int):
+    spawned = [spawn_call_setup(options) for _ in range(calls)]
+    with tempfile.TemporaryDirectory() as directory:
+        pool = estimator_server.EstimatorPool(options)
+        server = estimator_server.EstimatorServer(
+            os.path.join(directory, "cmdinfer.sock"), pool, io.StringIO())
+        serving = threading.Thread(target=server.serve_forever, daemon=True)
+        serving.start()
+        pooled = [pool_call_setup(server.path) for _ in range(calls)]
+        server.close()
+    for name, samples in (("spawn", spawned), ("pool", pooled)):
+        print("{:>8}: {:>8.1f} ms median call setup ({} calls)".format(
+            name, statistics.median(samples) * 1000, calls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packets", type=int, default=100000)
+    parser.add_argument("--request_interval", type=int, default=200,
+                        help="packets between two bandwidth requests")
+    parser.add_argument("--transports", default="json,binary,shm")
+    parser.add_argument("--batch", action="store_true",
+                        help="use an estimator implementing report_states_batch")
+    parser.add_argument("--call_setup", action="store_true",
+                        help="measure call setup with and without the pool")
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--config",
+                        help="serverless config selecting the estimator for "
+                        "--call_setup (default: a no-op estimator)")
+    args = parser.parse_args()
+
+    if args.call_setup:
+        config = {"pyinfer": {"estimator": {
+            "module": "cmdinfer_benchmark",
+            "class": "NullEstimator",
+            "path": os.path.dirname(os.path.abspath(__file__)),
+        }}}
+        if args.config:
+            with open(args.config, "r") as config_file:
+                config = json.load(config_file)
+        run_call_setup(cmdinfer.estimator_options(config), args.calls)
+        return
+
+    estimator_class = NullBatchEstimator if args.batch else NullEstimator
+
+    for transport in args.transports.split(","):
+        if transport == "json":
+            elapsed = run_stream(
+                estimator_class(), encode_json, args.packets,
+                args.request_interval)
+        elif transport == "binary":
+            elapsed = run_stream(
+                estimator_class(), encode_binary, args.packets,
+                args.request_interval)
+        elif transport == "shm":
+            elapsed = run_shm(
+                estimator_class(), args.packets, args.request_interval)
+        else:
+            raise ValueError("Unknown transport {}".format(transport))
+        print("{:>8}: {:>10.0f} packets/s ({:.3f} s)".format(
+            transport, args.packets / elapsed, elapsed))
+
+
+if __name__ == "__main__":
+    main()
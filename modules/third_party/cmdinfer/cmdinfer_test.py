@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 cmdinfer_test.py
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+import cmdinfer
+
+
+STATS = {
+    "send_time_ms": 12345,
+    "arrival_time_ms": 12400,
+    "payload_size": 1100,
+    "ssrc": 0xdeadbeef,
+    "sequence_number": 65535,
+    "padding_length": 0,
+    "header_length": 24,
+    "payload_type": 96,
+    "loss_count": 3,
+    "rtt_ms": 48,
+}
+
+
+def encode_binary_stats(stats: dict)->bytes:
+    payload = cmdinfer.encode_binary_stats(stats)
+    header = cmdinfer.BinaryHeader.pack(
+        cmdinfer.BinaryMagic, cmdinfer.BinaryVersion,
+        cmdinfer.BinaryTypeStats, len(payload))
+    return header + payload
+
+
+class TestReadMessage(unittest.TestCase):
+    def read_all(self, ifd):
+        messages = []
+        while True:
+            kind, value = cmdinfer.read_message(ifd)
+            if kind is None:
+                return messages
+            messages.append((kind, value))
+
+    def testBinaryRecordSize(self):
+        self.assertEqual(cmdinfer.BinaryHeader.size, 4)
+        self.assertEqual(cmdinfer.BinaryStats.size, 40)
+
+    def testBinaryRecordsInterleavedWithLogs(self):
+        stream = io.BytesIO(
+            b"some log line\n" +
+            encode_binary_stats(STATS) +
+            b"RequestBandwidth\n" +
+            encode_binary_stats(STATS))
+        self.assertEqual(self.read_all(stream), [
+            (cmdinfer.MessageLog, "some log line\n"),
+            (cmdinfer.MessageStats, STATS),
+            (cmdinfer.MessageRequest, None),
+            (cmdinfer.MessageStats, STATS),
+        ])
+
+    def testJsonLines(self):
+        stream = io.BytesIO(
+            "{}\nRequestBandwidth\n".format(
+                cmdinfer.json.dumps(STATS)).encode("utf-8"))
+        self.assertEqual(self.read_all(stream), [
+            (cmdinfer.MessageStats, STATS),
+            (cmdinfer.MessageRequest, None),
+        ])
+
+    def testJsonLinesThatAreNotStats(self):
+        stats = dict(STATS)
+        del stats["loss_count"], stats["rtt_ms"]
+        stream = io.BytesIO("123\n{}\n{}\n".format(
+            cmdinfer.json.dumps({"foo": 1}),
+            cmdinfer.json.dumps(stats)).encode("utf-8"))
+        self.assertEqual(self.read_all(stream), [
+            (cmdinfer.MessageLog, "123\n"),
+            (cmdinfer.MessageLog, '{"foo": 1}\n'),
+            (cmdinfer.MessageStats, stats),
+        ])
+
+    def testTextStream(self):
+        stream = io.StringIO("RequestBandwidth\nhello\n")
+        self.assertEqual(self.read_all(stream), [
+            (cmdinfer.MessageRequest, None),
+            (cmdinfer.MessageLog, "hello\n"),
+        ])
+
+    def testTruncatedRecordEndsStream(self):
+        stream = io.BytesIO(encode_binary_stats(STATS)[:10])
+        self.assertEqual(self.read_all(stream), [])
+
+    def testUnsupportedVersion(self):
+        record = bytearray(encode_binary_stats(STATS))
+        record[1] = cmdinfer.BinaryVersion + 1
+        with self.assertRaises(ValueError):
+            cmdinfer.read_message(io.BytesIO(bytes(record)))
+
+
+class TestStatsBatch(unittest.TestCase):
+    def testColumns(self):
+        batch = cmdinfer.StatsBatch()
+        batch.append(STATS)
+        batch.append_raw(encode_binary_stats(STATS)[cmdinfer.BinaryHeader.size:])
+        self.assertEqual(len(batch), 2)
+        columns = batch.flush()
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(set(columns), set(cmdinfer.BinaryStatsFields))
+        for field, value in STATS.items():
+            self.assertEqual([int(v) for v in columns[field]], [value, value])
+
+    def testUnknownLossAndRtt(self):
+        # Stats recorded before the receiver reported loss and RTT
+        stats = dict(STATS)
+        del stats["loss_count"], stats["rtt_ms"]
+        batch = cmdinfer.StatsBatch()
+        batch.append(stats)
+        columns = batch.flush()
+        self.assertEqual(list(columns["loss_count"]), [-1])
+        self.assertEqual(list(columns["rtt_ms"]), [-1])
+
+    def testEmptyFlush(self):
+        columns = cmdinfer.StatsBatch().flush()
+        for field in cmdinfer.BinaryStatsFields:
+            self.assertEqual(len(columns[field]), 0)
+
+    def testBatchAdapter(self):
+        class Estimator(object):
+            def __init__(self):
+                self.stats = []
+
+            def report_states(self, stats):
+                self.stats.append(stats)
+
+        estimator = Estimator()
+        adapter = cmdinfer.as_batch_estimator(estimator)
+        batch = cmdinfer.StatsBatch()
+        batch.append(STATS)
+        adapter.report_states_batch(batch.flush())
+        self.assertEqual(estimator.stats, [STATS])
+        self.assertIs(cmdinfer.as_batch_estimator(adapter), adapter)
+
+
+class RecordingEstimator(object):
+    def __init__(self):
+        self.stats = []
+
+    def report_states(self, stats):
+        self.stats.append(stats)
+
+    def get_estimated_bandwidth(self):
+        return 1000 + len(self.stats)
+
+
+class RecordingBatchEstimator(RecordingEstimator):
+    def report_states_batch(self, columns):
+        for values in zip(*columns.values()):
+            self.stats.append(dict(zip(columns, [int(v) for v in values])))
+
+
+class TestEstimators(unittest.TestCase):
+    def testDefaultOptions(self):
+        options = cmdinfer.estimator_options({"pyinfer": {}})
+        self.assertEqual(options["module"], "BandwidthEstimator")
+        self.assertEqual(options["class"], "Estimator")
+        self.assertEqual(options["instances"], "session")
+        self.assertEqual(options["args"], {})
+        self.assertFalse(options["preload"])
+
+    def testFindEstimatorClassFromPath(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "cmdinfer_custom.py"), "w") as f:
+                f.write("class Custom(object):\n    pass\n")
+            try:
+                found = cmdinfer.find_estimator_class(
+                    "cmdinfer_custom", "Custom", directory)
+                self.assertEqual(found.__name__, "Custom")
+                self.assertIs(cmdinfer.find_estimator_class(
+                    "cmdinfer_custom", "Custom", directory), found)
+            finally:
+                sys.path.remove(os.path.abspath(directory))
+                sys.modules.pop("cmdinfer_custom", None)
+
+    def testSsrcEstimators(self):
+        estimators = cmdinfer.SsrcEstimators(RecordingEstimator)
+        self.assertFalse(hasattr(estimators, "report_states_batch"))
+        self.assertEqual(estimators.get_estimated_bandwidth(), 1000)
+        estimators.report_states(dict(STATS, ssrc=1))
+        estimators.report_states(dict(STATS, ssrc=2))
+        estimators.report_states(dict(STATS, ssrc=2))
+        self.assertEqual(len(estimators.estimators[1].stats), 1)
+        self.assertEqual(len(estimators.estimators[2].stats), 2)
+        self.assertEqual(estimators.get_estimated_bandwidth(), 2003)
+
+    def testEstimatorArgs(self):
+        class Configured(RecordingEstimator):
+            def __init__(self, base = 0):
+                super().__init__()
+                self.base = base
+
+        cmdinfer.EstimatorClasses[("configured", "Configured", None)] = \
+            Configured
+        try:
+            options = cmdinfer.complete_estimator_options({
+                "module": "configured", "class": "Configured", "path": None,
+                "args": {"base": 7}})
+            self.assertEqual(cmdinfer.create_estimator(options).base, 7)
+            options["instances"] = "ssrc"
+            estimators = cmdinfer.create_estimator(options)
+            estimators.report_states(dict(STATS, ssrc=1))
+            self.assertEqual(estimators.estimators[1].base, 7)
+        finally:
+            del cmdinfer.EstimatorClasses[("configured", "Configured", None)]
+
+    def testSsrcEstimatorsBatch(self):
+        estimators = cmdinfer.SsrcEstimators(RecordingBatchEstimator)
+        batch = cmdinfer.StatsBatch()
+        for ssrc in (5, 7, 5):
+            batch.append(dict(STATS, ssrc=ssrc))
+        estimators.report_states_batch(batch.flush())
+        self.assertEqual(
+            [stats["ssrc"] for stats in estimators.estimators[5].stats], [5, 5])
+        self.assertEqual(
+            [stats["ssrc"] for stats in estimators.estimators[7].stats], [7])
+
+    def testMainServesGivenEstimator(self):
+        estimator = RecordingEstimator()
+        ifd = io.BytesIO(encode_binary_stats(STATS) + b"RequestBandwidth\n")
+        ofd = io.BytesIO()
+        cmdinfer.main(ifd, ofd, estimator)
+        self.assertEqual(estimator.stats, [STATS])
+        self.assertEqual(ofd.getvalue(), b"1001\n")
+
+    def testMainBatchSkipsJsonThatIsNotStats(self):
+        estimator = RecordingBatchEstimator()
+        ifd = io.BytesIO("123\n{}\n{}\nRequestBandwidth\n".format(
+            cmdinfer.json.dumps({"foo": 1}),
+            cmdinfer.json.dumps(STATS)).encode("utf-8"))
+        ofd = io.BytesIO()
+        logs = io.StringIO()
+        with contextlib.redirect_stdout(logs):
+            cmdinfer.main(ifd, ofd, estimator)
+        self.assertEqual(estimator.stats, [STATS])
+        self.assertEqual(ofd.getvalue(), b"1001\n")
+        self.assertEqual(logs.getvalue(), '123\n{"foo": 1}\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#include "cmdinfer.h"
+
+#include "modules/third_party/statcollect/json.hpp"
+#include "test/gtest.h"
+
+#include <atomic>
+#include <chrono>
+#include <cinttypes>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include <sys/mman.h>
+#include <unistd.h>
+
+namespace {
+
+// Ring layout of shmring.py
+const std::uint32_t kMagic = 0x42524341;
+const std::uint32_t kVersion = 1;
+const std::uint32_t kRecordSize = 40;
+const std::uint32_t kCapacity = 16;
+const std::size_t kHeaderSize = 256;
+const std::size_t kRequestSeqOffset = 192;
+const std::size_t kReplySeqOffset = 200;
+const std::size_t kBandwidthOffset = 208;
+const std::size_t kReplyTimeOffset = 216;
+
+std::int64_t SteadyTimeMs() {
+    return std::chrono::duration_cast<std::chrono::milliseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+// Plays the Python estimator on a ring shared with cmdinfer through
+// CMDINFER_SHM_FD. cmdinfer opens the ring once per process, so this file
+// holds the only test using it.
+class FakeEstimator {
+public:
+    FakeEstimator() : file_(std::tmpfile()) {
+        const std::size_t size = kHeaderSize + kCapacity * kRecordSize;
+        const std::uint32_t header[4] = {kMagic, kVersion, kRecordSize, kCapacity};
+        EXPECT_EQ(0, ftruncate(fileno(file_), size));
+        base_ = static_cast<std::uint8_t *>(mmap(
+            nullptr, size, PROT_READ | PROT_WRITE, MAP_SHARED, fileno(file_), 0));
+        std::memcpy(base_, header, sizeof(header));
+        setenv("CMDINFER_SHM_FD", std::to_string(fileno(file_)).c_str(), 1);
+    }
+
+    std::uint64_t Request() const {
+        return Field(kRequestSeqOffset)->load();
+    }
+
+    void Reply(std::uint64_t request, std::uint64_t bandwidth) {
+        Field(kBandwidthOffset)->store(bandwidth);
+        Field(kReplyTimeOffset)->store(static_cast<std::uint64_t>(SteadyTimeMs()));
+        Field(kReplySeqOffset)->store(request);
+    }
+
+private:
+    std::atomic<std::uint64_t> * Field(std::size_t offset) const {
+        return reinterpret_cast<std::atomic<std::uint64_t> *>(base_ + offset);
+    }
+
+    std::FILE * const file_;
+    std::uint8_t * base_;
+};
+
+// Round trips in microseconds of TakeRoundTripPlottableData
+std::vector<std::int64_t> TakeRoundTrips() {
+    const std::string prefix = "PLOTTABLE_DATA: ";
+    const std::string data = cmdinfer::TakeRoundTripPlottableData();
+    std::vector<std::int64_t> round_trips;
+    if (data.empty()) {
+        return round_trips;
+    }
+    const nlohmann::json plottable = nlohmann::json::parse(data.substr(prefix.size()));
+    for (const auto & sample : plottable["samples"]) {
+        round_trips.push_back(sample["value"].get<std::int64_t>());
+    }
+    return round_trips;
+}
+
+TEST(CmdInferTest, ShmReplyIsTimedAgainstItsOwnRequest) {
+    FakeEstimator estimator;
+    float bandwidth = 0;
+    std::int64_t age_ms = 0;
+
+    cmdinfer::RequestEstimatedBandwidth();
+    ASSERT_EQ(1u, estimator.Request());
+    EXPECT_FALSE(cmdinfer::GetLatestEstimatedBandwidth(&bandwidth, &age_ms));
+    std::this_thread::sleep_for(std::chrono::milliseconds(20));
+    estimator.Reply(1, 300000);
+
+    // The next request goes out before the reply to the first one is read,
+    // like RemoteEstimatorProxy does
+    std::this_thread::sleep_for(std::chrono::milliseconds(50));
+    cmdinfer::RequestEstimatedBandwidth();
+    ASSERT_EQ(2u, estimator.Request());
+    ASSERT_TRUE(cmdinfer::GetLatestEstimatedBandwidth(&bandwidth, &age_ms));
+    EXPECT_EQ(300000, bandwidth);
+    std::vector<std::int64_t> round_trips = TakeRoundTrips();
+    ASSERT_EQ(1u, round_trips.size());
+    EXPECT_GE(round_trips[0], 15000);
+    EXPECT_LT(round_trips[0], 50000);
+
+    // The same reply read again is not timed twice
+    ASSERT_TRUE(cmdinfer::GetLatestEstimatedBandwidth(&bandwidth, &age_ms));
+    EXPECT_TRUE(TakeRoundTrips().empty());
+
+    std::this_thread::sleep_for(std::chrono::milliseconds(10));
+    estimator.Reply(2, 500000);
+    cmdinfer::RequestEstimatedBandwidth();
+    ASSERT_TRUE(cmdinfer::GetLatestEstimatedBandwidth(&bandwidth, &age_ms));
+    EXPECT_EQ(500000, bandwidth);
+    round_trips = TakeRoundTrips();
+    ASSERT_EQ(1u, round_trips.size());
+    EXPECT_GE(round_trips[0], 5000);
+    EXPECT_LT(round_trips[0], 50000);
+}
+
+}  // namespace
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Long-lived PyInfer estimator server.
+
+Imports the estimator once and keeps a pool of instantiated estimators, so
+a new call attaches to a ready estimator over a Unix socket instead of
+starting a Python interpreter and importing its ML framework. Start it with
+
+      python3 estimator_server.py receiver_pyinfer.json
+
+and set "pyinfer": {"server": "<socket path>"} in the receiver config.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import cmdinfer
+
+
+DefaultSocketPath = "/tmp/cmdinfer.sock"
+DefaultPoolSize = 2
+
+
+class EstimatorPool(object):
+    '''
+    Keeps size estimators instantiated ahead of time and refills the pool
+    in the background. Estimators are never reused across sessions, a
+    session finding the pool empty instantiates its own.
+    '''
+    def __init__(self, options: dict, size: int = DefaultPoolSize):
+        self.options = options
+        self.size = size
+        self.idle = []
+        self.lock = threading.Condition()
+        cmdinfer.find_estimator_class(
+            options["module"], options["class"], options["path"])
+        for _ in range(size):
+            self.idle.append(cmdinfer.create_estimator(options))
+        refill = threading.Thread(target=self.refill, daemon=True)
+        refill.start()
+
+    def take(self):
+        '''
+        Return an estimator and whether it came from the pool.
+        '''
+        with self.lock:
+            if self.idle:
+                estimator = self.idle.pop()
+                self.lock.notify()
+                return estimator, True
+        return cmdinfer.create_estimator(self.options), False
+
+    def refill(self):
+        while True:
+            with self.lock:
+                while len(self.idle) >= self.size:
+                    self.lock.wait()
+            estimator = cmdinfer.create_estimator(self.options)
+            with self.lock:
+                self.idle.append(estimator)
+                self.lock.notify_all()
+
+
+class EstimatorServer(object):
+    '''
+    Accepts receivers on a Unix socket and serves each of them with
+    cmdinfer.main and its own estimator in a separate thread.
+    '''
+    def __init__(self, path: str, pool: EstimatorPool, log = sys.stderr):
+        self.path = path
+        self.pool = pool
+        self.log = log
+        self.sessions = 0
+        self.running = True
+        if os.path.exists(path):
+            os.unlink(path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen()
+        self.listener.settimeout(0.5)
+
+    def serve_forever(self):
+        while self.running:
+            try:
+                connection, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            connection.settimeout(None)
+            self.sessions += 1
+            session = threading.Thread(
+                target=self.run_session, args=(connection, self.sessions),
+                daemon=True)
+            session.start()
+
+    def run_session(self, connection: socket.socket, session: int):
+        start = time.perf_counter()
+        estimator, pooled = self.pool.take()
+        self.log.write("session {}: estimator ready in {:.3f} ms ({})\n".format(
+            session, (time.perf_counter() - start) * 1000,
+            "pooled" if pooled else "created"))
+        self.log.flush()
+        with connection, connection.makefile("rb") as ifd, \
+                connection.makefile("wb") as ofd:
+            try:
+                cmdinfer.main(ifd, ofd, estimator)
+            except (OSError, ValueError) as error:
+                self.log.write("session {}: {}\n".format(session, error))
+        self.log.write("session {}: closed\n".format(session))
+        self.log.flush()
+
+    def close(self):
+        self.running = False
+        self.listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", nargs="?",
+                        help="serverless config selecting the estimator")
+    parser.add_argument("--socket", help="Unix socket path (default: "
+                        "pyinfer.server of the config or {})".format(
+                            DefaultSocketPath))
+    parser.add_argument("--pool", type=int, default=DefaultPoolSize,
+                        help="number of estimators instantiated ahead")
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config, "r") as config_file:
+            config = json.load(config_file)
+    path = args.socket or config.get("pyinfer", {}).get(
+        "server", DefaultSocketPath)
+    pool = EstimatorPool(cmdinfer.estimator_options(config), args.pool)
+    server = EstimatorServer(path, pool)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.close())
+    sys.stderr.write("serving estimators on {}\n".format(path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
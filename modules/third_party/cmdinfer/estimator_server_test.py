@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 estimator_server_test.py
+"""
+
+import io
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+import cmdinfer
+import estimator_server
+
+
+class Estimator(object):
+    def __init__(self):
+        self.packets = 0
+
+    def report_states(self, stats: dict):
+        self.packets += 1
+
+    def get_estimated_bandwidth(self)->int:
+        return 1000 + self.packets
+
+
+OPTIONS = cmdinfer.estimator_options({"pyinfer": {"estimator": {
+    "module": "estimator_server_test",
+    "class": "Estimator",
+    "path": os.path.dirname(os.path.abspath(__file__)),
+}}})
+
+
+def request(path: str, packets: int)->bytes:
+    stats = cmdinfer.encode_binary_stats({
+        "send_time_ms": 1,
+        "arrival_time_ms": 2,
+        "payload_size": 1200,
+        "ssrc": 1,
+        "sequence_number": 1,
+        "padding_length": 0,
+        "header_length": 24,
+        "payload_type": 96,
+    })
+    record = cmdinfer.BinaryHeader.pack(
+        cmdinfer.BinaryMagic, cmdinfer.BinaryVersion,
+        cmdinfer.BinaryTypeStats, len(stats)) + stats
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.connect(path)
+        server.sendall(record * packets + b"RequestBandwidth\n")
+        with server.makefile("rb") as reply:
+            return reply.readline()
+
+
+class TestEstimatorServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pool = estimator_server.EstimatorPool(OPTIONS, size=1)
+        self.log = io.StringIO()
+        self.server = estimator_server.EstimatorServer(
+            os.path.join(self.directory.name, "cmdinfer.sock"), self.pool,
+            self.log)
+        self.serving = threading.Thread(target=self.server.serve_forever)
+        self.serving.start()
+
+    def tearDown(self):
+        self.server.close()
+        self.serving.join()
+        self.directory.cleanup()
+
+    def testSessionsGetSeparateEstimators(self):
+        self.assertEqual(request(self.server.path, 3), b"1003\n")
+        self.assertEqual(request(self.server.path, 2), b"1002\n")
+
+    def testPoolRefills(self):
+        estimator, pooled = self.pool.take()
+        self.assertTrue(pooled)
+        with self.pool.lock:
+            self.assertTrue(self.pool.lock.wait_for(
+                lambda: len(self.pool.idle) == 1, 5))
+        self.assertIsNot(self.pool.take()[0], estimator)
+
+    def testRemovesSocketOnClose(self):
+        self.server.close()
+        self.assertFalse(os.path.exists(self.server.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Receiver-side features for PyInfer estimators.
+
+FeatureExtractor takes the packets PyInfer reports, one by one with
+report_states or as the columns of report_states_batch, and answers on
+demand with the usual bandwidth estimation features, for the whole receiver
+and per SSRC:
+
+- receive_rate_bps_<window>ms: payload bits received per second over the
+  latest window, or over the packets kept if it holds more than capacity
+- delay_gradient_<window>ms: least-squares slope of the one-way delay over
+  the window, in ms of delay per second
+- loss_ratio_<window>ms: packets missing from the sequence numbers received
+  over the window
+- jitter_ms: RFC 3550 interarrival jitter
+
+Packets are stored in NumPy ring buffers, the ones reported one by one are
+queued and stored together on the next request, so reporting a packet is
+O(1). The rates come from running byte counts and the window start only
+moves forward, so evicting old packets is amortized O(1) too.
+An estimator uses it like
+
+      self.features = features.FeatureExtractor(windows_ms=(200, 1000))
+
+      def report_states(self, stats: dict):
+          self.features.report_states(stats)
+
+      def get_estimated_bandwidth(self)->int:
+          rate = self.features.features()["receive_rate_bps_1000ms"]
+"""
+
+import operator
+
+import numpy
+
+
+DefaultWindowsMs = (100, 500, 1000)
+# Packets kept per stream, a window holding more only sees the latest ones
+DefaultCapacity = 1 << 15
+# Gain of the RFC 3550 jitter filter
+JitterGain = 1.0 / 16
+
+# Fields of the report_states dicts the features need
+PendingFields = ("arrival_time_ms", "send_time_ms", "payload_size", "ssrc",
+                 "sequence_number")
+PendingValues = operator.itemgetter(*PendingFields)
+
+PacketDtype = numpy.dtype([
+    ("arrival_time_ms", "<i8"),
+    ("delay_ms", "<i8"),
+    # Payload bytes received before this packet
+    ("bytes_before", "<i8"),
+    # Sequence number unwrapped per SSRC
+    ("sequence", "<i8"),
+])
+
+
+def unwrap_sequence(sequence_numbers, last: int = None):
+    '''
+    Unwraps 16-bit sequence numbers, continuing from the unwrapped last one.
+    '''
+    sequence = numpy.asarray(sequence_numbers, dtype=numpy.int64)
+    if last is None:
+        first = sequence[:1]
+    else:
+        first = last + (sequence[:1] - last + 32768) % 65536 - 32768
+    steps = (numpy.diff(sequence) + 32768) % 65536 - 32768
+    return numpy.concatenate((first, first + numpy.cumsum(steps)))
+
+
+def jitter_after(jitter: float, transit_deltas)->float:
+    '''
+    Runs the RFC 3550 filter J += (|D| - J) / 16 over transit_deltas, in
+    closed form so a batch does not loop in Python.
+    '''
+    deltas = numpy.abs(numpy.asarray(transit_deltas, dtype=numpy.float64))
+    if len(deltas) == 0:
+        return jitter
+    decay = 1.0 - JitterGain
+    weights = decay ** numpy.arange(len(deltas) - 1, -1, -1,
+                                    dtype=numpy.float64)
+    return float(decay ** len(deltas) * jitter +
+                 JitterGain * numpy.dot(weights, deltas))
+
+
+class PacketStream(object):
+    '''
+    The latest capacity packets of a stream in a mirrored ring buffer: every
+    packet is stored twice, capacity apart, so any run of consecutive
+    packets is a single contiguous slice.
+    '''
+    def __init__(self, windows_ms, capacity: int = DefaultCapacity):
+        self.packets = numpy.zeros(2 * capacity, dtype=PacketDtype)
+        self.capacity = capacity
+        self.count = 0
+        self.total_bytes = 0
+        self.first_arrival_ms = None
+        self.last_arrival_ms = None
+        self.last_send_ms = None
+        self.last_sequence = None
+        self.jitter = 0.0
+        # Index of the first packet of every window
+        self.window_starts = {window: 0 for window in windows_ms}
+
+    def extend(self, arrival_ms, send_ms, payload_size, sequence_number):
+        size = len(arrival_ms)
+        if size == 0:
+            return
+        arrival_ms = numpy.asarray(arrival_ms, dtype=numpy.int64)
+        send_ms = numpy.asarray(send_ms, dtype=numpy.int64)
+        payload_size = numpy.asarray(payload_size, dtype=numpy.int64)
+        sequence = unwrap_sequence(sequence_number, self.last_sequence)
+        transit = arrival_ms - send_ms
+        if self.last_arrival_ms is None:
+            self.first_arrival_ms = int(arrival_ms[0])
+            deltas = numpy.diff(transit)
+        else:
+            deltas = numpy.diff(transit, prepend=(
+                self.last_arrival_ms - self.last_send_ms))
+        self.jitter = jitter_after(self.jitter, deltas)
+        bytes_before = self.total_bytes + numpy.cumsum(payload_size) - \
+            payload_size
+        skip = max(size - self.capacity, 0)
+        rows = (self.count + numpy.arange(skip, size)) % self.capacity
+        for rows_copy in (rows, rows + self.capacity):
+            self.packets["arrival_time_ms"][rows_copy] = arrival_ms[skip:]
+            self.packets["delay_ms"][rows_copy] = transit[skip:]
+            self.packets["bytes_before"][rows_copy] = bytes_before[skip:]
+            self.packets["sequence"][rows_copy] = sequence[skip:]
+        self.count += size
+        self.total_bytes += int(payload_size.sum())
+        self.last_arrival_ms = int(arrival_ms[-1])
+        self.last_send_ms = int(send_ms[-1])
+        self.last_sequence = int(sequence[-1])
+
+    def slice(self, start: int):
+        '''
+        Returns the packets from index start to the latest one.
+        '''
+        row = start % self.capacity
+        return self.packets[row:row + self.count - start]
+
+    def window(self, window_ms: int, now_ms: int):
+        '''
+        Moves the start of window_ms forward past the packets older than
+        now_ms - window_ms and returns its packets.
+        '''
+        start = max(self.window_starts[window_ms], self.count - self.capacity)
+        packets = self.slice(start)
+        # Arrival times only go forward, the packets to evict are a prefix
+        start += int(numpy.searchsorted(
+            packets["arrival_time_ms"], now_ms - window_ms, side="right"))
+        self.window_starts[window_ms] = start
+        return self.slice(start)
+
+    def receive_rate(self, packets, window_ms: int, now_ms: int)->float:
+        '''
+        Returns the bits per second received over the window whose packets
+        window() returned. When the window holds more packets than the
+        stream keeps, the rate is measured over the span of the packets
+        kept instead, from the arrival of the oldest one.
+        '''
+        if len(packets) == 0:
+            return 0.0
+        truncated = self.count > self.capacity and \
+            self.window_starts[window_ms] == self.count - self.capacity
+        if truncated and len(packets) > 1:
+            received = self.total_bytes - int(packets["bytes_before"][1])
+            duration_ms = now_ms - int(packets["arrival_time_ms"][0])
+        else:
+            received = self.total_bytes - int(packets["bytes_before"][0])
+            duration_ms = min(window_ms, now_ms - self.first_arrival_ms)
+        return received * 8000.0 / max(duration_ms, 1)
+
+    @staticmethod
+    def delay_gradient(packets)->float:
+        arrival = (packets["arrival_time_ms"] -
+                   packets["arrival_time_ms"][:1]).astype(numpy.float64)
+        spread = arrival - arrival.mean() if len(arrival) else arrival
+        variance = numpy.dot(spread, spread)
+        if variance == 0:
+            return 0.0
+        delay = packets["delay_ms"].astype(numpy.float64)
+        return float(numpy.dot(spread, delay - delay.mean()) / variance * 1000)
+
+    @staticmethod
+    def lost_packets(packets):
+        '''
+        Returns the number of sequence numbers the packets span and how many
+        of them are missing.
+        '''
+        if len(packets) == 0:
+            return 0, 0
+        sequence = packets["sequence"]
+        expected = int(sequence.max() - sequence.min()) + 1
+        return expected, max(expected - len(packets), 0)
+
+
+class FeatureExtractor(object):
+    '''
+    Features over every window of windows_ms, for the whole receiver and per
+    SSRC. Each stream keeps its latest capacity packets.
+    '''
+    def __init__(self, windows_ms = DefaultWindowsMs,
+                 capacity: int = DefaultCapacity):
+        self.windows_ms = tuple(windows_ms)
+        self.capacity = capacity
+        self.all = self.new_stream()
+        self.streams = {}
+        # Packets of report_states not stored yet, as field tuples
+        self.pending = []
+
+    def new_stream(self)->PacketStream:
+        return PacketStream(self.windows_ms, self.capacity)
+
+    def stream(self, ssrc: int)->PacketStream:
+        stream = self.streams.get(ssrc)
+        if stream is None:
+            stream = self.streams[ssrc] = self.new_stream()
+        return stream
+
+    def ssrcs(self)->list:
+        self.flush()
+        return list(self.streams)
+
+    def report_states(self, stats: dict):
+        self.pending.append(PendingValues(stats))
+        if len(self.pending) >= self.capacity:
+            self.flush()
+
+    def flush(self):
+        '''
+        Stores the packets queued by report_states.
+        '''
+        if not self.pending:
+            return
+        columns = numpy.array(self.pending, dtype=numpy.int64).T
+        self.pending = []
+        self.store(dict(zip(PendingFields, columns)))
+
+    def report_states_batch(self, columns: dict):
+        self.flush()
+        self.store(columns)
+
+    def store(self, columns: dict):
+        arrival_ms = numpy.asarray(columns["arrival_time_ms"],
+                                   dtype=numpy.int64)
+        send_ms = numpy.asarray(columns["send_time_ms"], dtype=numpy.int64)
+        payload_size = numpy.asarray(columns["payload_size"], dtype=numpy.int64)
+        sequence_number = numpy.asarray(columns["sequence_number"],
+                                        dtype=numpy.int64)
+        self.all.extend(arrival_ms, send_ms, payload_size, sequence_number)
+        ssrcs = numpy.asarray(columns["ssrc"])
+        for ssrc in numpy.unique(ssrcs):
+            mask = ssrcs == ssrc
+            self.stream(int(ssrc)).extend(
+                arrival_ms[mask], send_ms[mask], payload_size[mask],
+                sequence_number[mask])
+
+    def features(self, ssrc: int = None)->dict:
+        '''
+        Returns the features of the whole receiver, or of ssrc, as of the
+        latest packet received. Empty until a packet was received.
+        '''
+        self.flush()
+        now_ms = self.all.last_arrival_ms
+        if now_ms is None:
+            return {}
+        streams = [self.streams[ssrc]] if ssrc is not None else \
+            list(self.streams.values())
+        # The aggregate stream mixes the sequence numbers of every SSRC, the
+        # loss is summed over the streams instead
+        stream = self.all if ssrc is None else streams[0]
+        features = {}
+        for window_ms in self.windows_ms:
+            packets = stream.window(window_ms, now_ms)
+            features["receive_rate_bps_%dms" % window_ms] = \
+                stream.receive_rate(packets, window_ms, now_ms)
+            features["delay_gradient_%dms" % window_ms] = \
+                stream.delay_gradient(packets)
+            expected = lost = 0
+            for ssrc_stream in streams:
+                counts = ssrc_stream.lost_packets(
+                    ssrc_stream.window(window_ms, now_ms))
+                expected += counts[0]
+                lost += counts[1]
+            features["loss_ratio_%dms" % window_ms] = \
+                lost / expected if expected else 0.0
+        features["jitter_ms"] = stream.jitter
+        return features
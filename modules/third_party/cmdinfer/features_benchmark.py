@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Measures how many packets per second features.FeatureExtractor takes.
+
+It replays a synthetic call of --ssrcs streams at --rate packets per second
+and asks for the features every --request_interval ms, like PyInfer does
+every bwe_feedback_duration. The packets are reported one by one
+(report_states), as batches (report_states_batch) and, for comparison, to
+the list-based extractor estimators used to implement, which evicts old
+packets by popping the front of a list. Run with
+
+      python3 features_benchmark.py [--packets N] [--rate 10000]
+"""
+
+import argparse
+import time
+
+import cmdinfer
+import features
+
+
+class ListFeatures(object):
+    '''
+    The receive rate over a sliding window kept in a Python list.
+    '''
+    def __init__(self, window_ms: int):
+        self.window_ms = window_ms
+        self.packets = []
+
+    def report_states(self, stats: dict):
+        self.packets.append(stats)
+
+    def features(self)->dict:
+        now_ms = self.packets[-1]["arrival_time_ms"]
+        while self.packets[0]["arrival_time_ms"] <= now_ms - self.window_ms:
+            self.packets.pop(0)
+        received = sum(stats["payload_size"] for stats in self.packets)
+        return {"receive_rate_bps": received * 8000.0 / self.window_ms}
+
+
+def make_stats(i: int, rate: int, ssrcs: int)->dict:
+    arrival_time_ms = 1000 + i * 1000 // rate
+    return {
+        "send_time_ms": arrival_time_ms - 20 - (i % 7),
+        "arrival_time_ms": arrival_time_ms,
+        "payload_size": 1200,
+        "ssrc": 1 + i % ssrcs,
+        "sequence_number": (i // ssrcs) & 0xffff,
+        "padding_length": 0,
+        "header_length": 24,
+        "payload_type": 96,
+    }
+
+
+def requests(packets: list, interval_ms: int):
+    '''
+    Splits packets into the runs received between two feature requests.
+    '''
+    start = 0
+    for end in range(1, len(packets) + 1):
+        if end == len(packets) or (
+                packets[end]["arrival_time_ms"] // interval_ms !=
+                packets[start]["arrival_time_ms"] // interval_ms):
+            yield packets[start:end]
+            start = end
+
+
+def run_packets(extractor, runs: list)->float:
+    start = time.perf_counter()
+    for run in runs:
+        for stats in run:
+            extractor.report_states(stats)
+        extractor.features()
+    return time.perf_counter() - start
+
+
+def run_batches(extractor, batches: list)->float:
+    start = time.perf_counter()
+    for columns in batches:
+        extractor.report_states_batch(columns)
+        extractor.features()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packets", type=int, default=200000)
+    parser.add_argument("--rate", type=int, default=10000,
+                        help="packets received per second")
+    parser.add_argument("--ssrcs", type=int, default=2)
+    parser.add_argument("--request_interval", type=int, default=200,
+                        help="ms between two feature requests")
+    parser.add_argument("--window", type=int, default=1000,
+                        help="longest window (ms)")
+    args = parser.parse_args()
+
+    packets = [make_stats(i, args.rate, args.ssrcs)
+               for i in range(args.packets)]
+    runs = list(requests(packets, args.request_interval))
+    batches = []
+    for run in runs:
+        batch = cmdinfer.StatsBatch()
+        for stats in run:
+            batch.append(stats)
+        batches.append(batch.flush())
+    windows_ms = (args.window // 10, args.window // 2, args.window)
+
+    results = [
+        ("packets", run_packets(
+            features.FeatureExtractor(windows_ms), runs)),
+        ("batches", run_batches(
+            features.FeatureExtractor(windows_ms), batches)),
+        ("list", run_packets(ListFeatures(args.window), runs)),
+    ]
+    for name, elapsed in results:
+        print("{:>8}: {:>10.0f} packets/s ({:.3f} s)".format(
+            name, args.packets / elapsed, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 features_test.py
+"""
+
+import unittest
+
+import cmdinfer
+import features
+
+
+def packet(sequence_number: int, arrival_time_ms: int, delay_ms: int = 40,
+           ssrc: int = 1, payload_size: int = 1000)->dict:
+    return {
+        "send_time_ms": arrival_time_ms - delay_ms,
+        "arrival_time_ms": arrival_time_ms,
+        "payload_size": payload_size,
+        "ssrc": ssrc,
+        "sequence_number": sequence_number % 65536,
+        "padding_length": 0,
+        "header_length": 12,
+        "payload_type": 96,
+    }
+
+
+def batch(packets: list)->dict:
+    stats_batch = cmdinfer.StatsBatch()
+    for stats in packets:
+        stats_batch.append(stats)
+    return stats_batch.flush()
+
+
+def reference_jitter(packets: list)->float:
+    jitter = 0.0
+    for previous, stats in zip(packets, packets[1:]):
+        delta = ((stats["arrival_time_ms"] - previous["arrival_time_ms"]) -
+                 (stats["send_time_ms"] - previous["send_time_ms"]))
+        jitter += (abs(delta) - jitter) / 16
+    return jitter
+
+
+class TestFeatureExtractor(unittest.TestCase):
+    def testEmpty(self):
+        self.assertEqual(features.FeatureExtractor().features(), {})
+
+    def testReceiveRate(self):
+        extractor = features.FeatureExtractor(windows_ms=(100, 1000))
+        # 1000 bytes every ms for 2s, then 500 bytes every ms for 100ms
+        for i in range(2000):
+            extractor.report_states(packet(i, 1000 + i))
+        for i in range(2000, 2100):
+            extractor.report_states(packet(i, 1000 + i, payload_size=500))
+        result = extractor.features()
+        self.assertAlmostEqual(result["receive_rate_bps_100ms"], 4e6)
+        self.assertAlmostEqual(result["receive_rate_bps_1000ms"], 7.6e6)
+        self.assertEqual(result["loss_ratio_100ms"], 0)
+        self.assertEqual(result["delay_gradient_1000ms"], 0)
+        self.assertEqual(result["jitter_ms"], 0)
+
+    def testRateAtCallStart(self):
+        extractor = features.FeatureExtractor(windows_ms=(1000,))
+        for i in range(101):
+            extractor.report_states(packet(i, 1000 + i))
+        self.assertAlmostEqual(
+            extractor.features()["receive_rate_bps_1000ms"],
+            101 * 1000 * 8e3 / 100)
+
+    def testDelayGradient(self):
+        extractor = features.FeatureExtractor(windows_ms=(100, 1000))
+        # The queuing delay grows by 1ms every 10ms during the latest 100ms
+        for i in range(1000):
+            delay_ms = 40 + max(i - 900, 0) // 10
+            extractor.report_states(packet(i, 1000 + i, delay_ms))
+        result = extractor.features()
+        self.assertAlmostEqual(result["delay_gradient_100ms"], 100, delta=2)
+        self.assertLess(result["delay_gradient_1000ms"],
+                        result["delay_gradient_100ms"])
+
+    def testLossPerSsrc(self):
+        extractor = features.FeatureExtractor(windows_ms=(1000,))
+        # SSRC 1 loses every 10th packet across the sequence number wrap,
+        # SSRC 2 loses nothing
+        for i in range(65500, 65600):
+            if i % 10 != 0:
+                extractor.report_states(packet(i, i - 65000, ssrc=1))
+            extractor.report_states(packet(i + 7, i - 65000, ssrc=2))
+        self.assertEqual(sorted(extractor.ssrcs()), [1, 2])
+        self.assertAlmostEqual(
+            extractor.features(1)["loss_ratio_1000ms"], 9 / 99)
+        self.assertEqual(extractor.features(2)["loss_ratio_1000ms"], 0)
+        self.assertAlmostEqual(
+            extractor.features()["loss_ratio_1000ms"], 9 / 199)
+        self.assertAlmostEqual(
+            extractor.features(2)["receive_rate_bps_1000ms"],
+            100 * 1000 * 8e3 / 99)
+
+    def testBatchesMatchPackets(self):
+        packets = [packet(i, 1000 + i + (i % 3) * 2, 40 + i % 5, 1 + i % 2)
+                   for i in range(3000) if i % 17 != 0]
+        one_by_one = features.FeatureExtractor()
+        batched = features.FeatureExtractor()
+        for start in range(0, len(packets), 250):
+            for stats in packets[start:start + 250]:
+                one_by_one.report_states(stats)
+            batched.report_states_batch(batch(packets[start:start + 250]))
+            for ssrc in (None, 1, 2):
+                expected = one_by_one.features(ssrc)
+                result = batched.features(ssrc)
+                self.assertEqual(set(result), set(expected))
+                for name, value in expected.items():
+                    self.assertAlmostEqual(result[name], value, 6, name)
+        self.assertAlmostEqual(
+            batched.features(1)["jitter_ms"],
+            reference_jitter([stats for stats in packets
+                              if stats["ssrc"] == 1]), 6)
+
+    def testWindowBeyondCapacity(self):
+        extractor = features.FeatureExtractor(windows_ms=(1000,), capacity=64)
+        for i in range(1000):
+            extractor.report_states(packet(i, 1000 + i))
+        extractor.report_states_batch(batch(
+            [packet(i, 1000 + i) for i in range(1000, 1200)]))
+        # Only the latest 64 packets are kept, the rate is measured over
+        # the 63 ms they span: 1000 bytes per ms
+        self.assertAlmostEqual(
+            extractor.features()["receive_rate_bps_1000ms"], 8e6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Measures how many concurrent serverless calls one machine sustains.
+
+Every step runs N sender/receiver pairs of peerconnection_serverless at the
+same time, connected over the loopback interface. The configs of every pair
+are generated from the corpus ones with a port of its own, in a working
+directory of its own. While the calls run, the CPU time and memory of every
+process tree are sampled from /proc. Once they end, the estimator latency
+is read from the receiver's log (PyInfer round trips, ONNXInfer inference
+latency) and PyInfer metrics file. A step is saturated when the CPU is
+busy, the estimator is slower than bwe_feedback_duration, a receiver sent
+back too few estimates, or a call failed. Run with
+
+      python3 -m loadgen --corpus examples/peerconnection/serverless/corpus \\
+          [--pairs 1,2,4,8] [--duration 30] [--output report.json]
+"""
+
+import argparse
+import copy
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+
+import metrics
+
+
+DefaultPairs = "1,2,4,8"
+DefaultBasePort = 18000
+DefaultDuration = 30
+DefaultSampleInterval = 1.0
+DefaultStartDelay = 1.0
+DefaultBweFeedbackDuration = 200
+# Share of the CPU time of all cores (%) above which a step is saturated
+DefaultCpuLimit = 90.0
+# A step is saturated if a receiver sends back fewer estimates than this
+# share of one per bwe_feedback_duration
+MinEstimateRatio = 0.9
+# Time left to the calls to close by themselves after autoclose (s)
+ExitGrace = 30
+
+ReceiverConfig = "receiver.json"
+SenderConfig = "sender.json"
+ReceiverLog = "receiver.out"
+SenderLog = "sender.out"
+PyInferMetricsFile = "pyinfer_metrics.txt"
+
+BweEstimationPattern = re.compile(r"Send back BWE estimation: ")
+ONNXLatencyPattern = re.compile(
+    r"inference latency \(us\): count (\d+), p50 (\d+), p99 (\d+)")
+ClockTicks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PageSize = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def absolute_path(path: str, corpus: str)->str:
+    return path if os.path.isabs(path) else os.path.join(corpus, path)
+
+
+def pair_config(config: dict, corpus: str, port: int, duration: int)->dict:
+    '''
+    Returns config connecting over the loopback interface on port, closing
+    after duration seconds and with its inputs read from corpus. Outputs
+    stay relative to the pair's working directory.
+    '''
+    config = copy.deepcopy(config)
+    connection = config["serverless_connection"]
+    connection["autoclose"] = duration
+    if connection["receiver"].get("enabled"):
+        connection["receiver"]["listening_ip"] = "127.0.0.1"
+        connection["receiver"]["listening_port"] = port
+    if connection["sender"].get("enabled"):
+        connection["sender"]["dest_ip"] = "127.0.0.1"
+        connection["sender"]["dest_port"] = port
+    for source in ("video_source", "audio_source"):
+        for section in config.get(source, {}).values():
+            if isinstance(section, dict) and "file_path" in section:
+                section["file_path"] = absolute_path(
+                    section["file_path"], corpus)
+    onnx = config.get("onnx", {})
+    if onnx.get("onnx_model_path"):
+        onnx["onnx_model_path"] = absolute_path(onnx["onnx_model_path"], corpus)
+    return config
+
+
+def instrument_receiver(config: dict)->dict:
+    '''
+    Enables the logs and metrics the estimator latency is read from.
+    '''
+    config["logging"] = {"enabled": True, "log_output_path": "webrtc.log"}
+    interval_ms = config.get("bwe_feedback_duration",
+                             DefaultBweFeedbackDuration)
+    if config.get("onnx", {}).get("onnx_model_path"):
+        config["onnx"].setdefault("metrics_interval", interval_ms * 10)
+    if not config.get("onnx", {}).get("onnx_model_path") or \
+            config.get("pyinfer", {}).get("shadow"):
+        pyinfer = config.setdefault("pyinfer", {})
+        pyinfer.setdefault("metrics_interval", interval_ms * 10)
+        pyinfer.setdefault("metrics_file", PyInferMetricsFile)
+    return config
+
+
+def write_pair(directory: str, receiver: dict, sender: dict, corpus: str,
+               port: int, duration: int):
+    os.makedirs(directory, exist_ok=True)
+    receiver = instrument_receiver(
+        pair_config(receiver, corpus, port, duration))
+    # The estimator is imported from the corpus, not the pair's directory
+    estimator = receiver.setdefault("pyinfer", {}).setdefault("estimator", {})
+    if "path" not in estimator:
+        estimator["path"] = corpus
+    for name, config in ((ReceiverConfig, receiver),
+                         (SenderConfig, pair_config(sender, corpus, port,
+                                                    duration))):
+        with open(os.path.join(directory, name), "w") as config_file:
+            json.dump(config, config_file, indent=4)
+
+
+def list_processes()->dict:
+    '''
+    Returns {pid: (parent pid, CPU ticks, resident bytes)} of every process.
+    '''
+    processes = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(name), "r") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # The command name may hold spaces, the fields follow its ")"
+        fields = stat[stat.rfind(")") + 2:].split()
+        processes[int(name)] = (int(fields[1]),
+                                int(fields[11]) + int(fields[12]),
+                                int(fields[21]) * PageSize)
+    return processes
+
+
+def process_tree(processes: dict, root: int)->list:
+    children = {}
+    for pid, (parent, _, _) in processes.items():
+        children.setdefault(parent, []).append(pid)
+    tree = []
+    pending = [root] if root in processes else []
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(children.get(pid, []))
+    return tree
+
+
+class ResourceSampler(object):
+    '''
+    CPU time and peak resident memory of process trees, e.g. the
+    peerconnection_serverless wrapper with the application and estimator
+    processes it starts. CPU time of processes that exited between two
+    samples is lost, sample more often than they live.
+    '''
+    def __init__(self, roots: dict):
+        self.roots = roots
+        self.ticks = {name: {} for name in roots}
+        self.peak_rss = {name: 0 for name in roots}
+        self.start = time.monotonic()
+        self.elapsed = 0.0
+
+    def sample(self):
+        processes = list_processes()
+        for name, root in self.roots.items():
+            rss = 0
+            for pid in process_tree(processes, root):
+                _, ticks, resident = processes[pid]
+                self.ticks[name][pid] = ticks
+                rss += resident
+            self.peak_rss[name] = max(self.peak_rss[name], rss)
+        self.elapsed = time.monotonic() - self.start
+
+    def cpu_seconds(self, name: str)->float:
+        return sum(self.ticks[name].values()) / ClockTicks
+
+    def cpu_percent(self, name: str)->float:
+        return 100.0 * self.cpu_seconds(name) / max(self.elapsed, 1e-6)
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(1, math.ceil(q / 100 * len(values))) - 1]
+
+
+def parse_receiver_log(path: str)->dict:
+    '''
+    Returns the number of estimates sent back, the PyInfer round trips
+    (us) and the latest ONNXInfer latency line of a receiver's log.
+    '''
+    result = {"estimates": 0, "round_trips_us": [], "onnx": None}
+    if not os.path.exists(path):
+        return result
+    with open(path, "r", errors="replace") as log:
+        for line in log:
+            if BweEstimationPattern.search(line):
+                result["estimates"] += 1
+                continue
+            match = ONNXLatencyPattern.search(line)
+            if match:
+                result["onnx"] = {
+                    "count": int(match.group(1)),
+                    "p50_us": int(match.group(2)),
+                    "p99_us": int(match.group(3)),
+                }
+                continue
+            start = line.find(metrics.PlottableDataPrefix)
+            if start == -1:
+                continue
+            try:
+                data = json.loads(
+                    line[start + len(metrics.PlottableDataPrefix):])
+            except ValueError:
+                continue
+            if data.get("graph_name") == "GetEstimatedBandwidth":
+                result["round_trips_us"].extend(
+                    sample["value"] for sample in data.get("samples", []))
+    return result
+
+
+def read_pyinfer_metrics(path: str)->dict:
+    '''
+    Returns {stage: p99 latency (us)} of a PyInfer metrics file.
+    '''
+    stages = {}
+    if not os.path.exists(path):
+        return stages
+    with open(path, "r") as metrics_file:
+        for line in metrics_file:
+            if line.startswith(metrics.PlottableDataPrefix):
+                data = json.loads(line[len(metrics.PlottableDataPrefix):])
+                stages[data["graph_name"]] = data["p99"]
+    return stages
+
+
+def pair_result(directory: str, sampler: ResourceSampler, index: int,
+                exit_codes: dict)->dict:
+    log = parse_receiver_log(os.path.join(directory, "webrtc.log"))
+    result = {
+        "pair": index,
+        "estimates": log["estimates"],
+        "round_trip_p50_us": percentile(log["round_trips_us"], 50),
+        "round_trip_p99_us": percentile(log["round_trips_us"], 99),
+        "onnx": log["onnx"],
+        "pyinfer_p99_us": read_pyinfer_metrics(
+            os.path.join(directory, PyInferMetricsFile)),
+    }
+    for role in ("receiver", "sender"):
+        name = "{}-{}".format(role, index)
+        result[role] = {
+            "exit_code": exit_codes[name],
+            "cpu_percent": round(sampler.cpu_percent(name), 1),
+            "peak_rss_mb": round(sampler.peak_rss[name] / (1 << 20), 1),
+        }
+    return result
+
+
+def run_step(args, pairs: int, receiver: dict, sender: dict)->dict:
+    '''
+    Runs pairs calls at once and returns the results of every pair.
+    '''
+    step_directory = os.path.join(args.workdir, "pairs-{}".format(pairs))
+    directories = []
+    for index in range(pairs):
+        directory = os.path.join(step_directory, "pair-{}".format(index))
+        write_pair(directory, receiver, sender, args.corpus,
+                   args.base_port + index, args.duration)
+        directories.append(directory)
+
+    def start(directory: str, config: str, output: str):
+        with open(os.path.join(directory, output), "w") as output_file:
+            return subprocess.Popen(
+                [args.binary, config], cwd=directory, stdout=output_file,
+                stderr=subprocess.STDOUT)
+    apps = {}
+    for index, directory in enumerate(directories):
+        apps["receiver-{}".format(index)] = start(
+            directory, ReceiverConfig, ReceiverLog)
+    # Let the receivers listen before the senders connect
+    time.sleep(args.start_delay)
+    for index, directory in enumerate(directories):
+        apps["sender-{}".format(index)] = start(
+            directory, SenderConfig, SenderLog)
+
+    sampler = ResourceSampler({name: app.pid for name, app in apps.items()})
+    deadline = time.monotonic() + args.duration + ExitGrace
+    while any(app.poll() is None for app in apps.values()):
+        sampler.sample()
+        if time.monotonic() > deadline:
+            for app in apps.values():
+                if app.poll() is None:
+                    app.terminate()
+            break
+        time.sleep(args.sample_interval)
+    exit_codes = {name: app.wait() for name, app in apps.items()}
+    return {
+        "pairs": pairs,
+        "elapsed_s": round(sampler.elapsed, 1),
+        "results": [pair_result(directory, sampler, index, exit_codes)
+                    for index, directory in enumerate(directories)],
+    }
+
+
+def saturation_reasons(step: dict, duration: int, bwe_feedback_ms: int,
+                       cpu_limit: float, cpu_count: int)->list:
+    '''
+    Returns why step is saturated, an empty list if it is not.
+    '''
+    reasons = []
+    cpu = sum(pair[role]["cpu_percent"] for pair in step["results"]
+              for role in ("receiver", "sender"))
+    if cpu >= cpu_limit * cpu_count:
+        reasons.append("CPU {:.0f}% of {} cores".format(cpu, cpu_count))
+    expected = duration * 1000 / bwe_feedback_ms
+    for pair in step["results"]:
+        name = "pair {}".format(pair["pair"])
+        for role in ("receiver", "sender"):
+            if pair[role]["exit_code"] != 0:
+                reasons.append("{} {} exited with {}".format(
+                    name, role, pair[role]["exit_code"]))
+        if pair["estimates"] < MinEstimateRatio * expected:
+            reasons.append("{} sent back {} of {:.0f} estimates".format(
+                name, pair["estimates"], expected))
+        latencies = [pair["round_trip_p99_us"]]
+        if pair["onnx"]:
+            latencies.append(pair["onnx"]["p99_us"])
+        if any(latency is not None and latency > bwe_feedback_ms * 1000
+               for latency in latencies):
+            reasons.append("{} estimator p99 above {} ms".format(
+                name, bwe_feedback_ms))
+    return reasons
+
+
+def print_step(step: dict):
+    results = step["results"]
+    receivers = [pair["receiver"] for pair in results]
+    round_trips = [pair["round_trip_p99_us"] for pair in results
+                   if pair["round_trip_p99_us"] is not None]
+    print("{:>5} pairs: receiver CPU {:>6.1f}% RSS {:>7.1f} MB, "
+          "estimates {:>5}, estimator p99 {} us{}".format(
+              step["pairs"],
+              sum(receiver["cpu_percent"] for receiver in receivers) /
+              len(receivers),
+              max(receiver["peak_rss_mb"] for receiver in receivers),
+              min(pair["estimates"] for pair in results),
+              max(round_trips) if round_trips else "-",
+              "  SATURATED: " + "; ".join(step["saturation"])
+              if step["saturation"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", required=True,
+                        help="directory of the configs, media and estimator")
+    parser.add_argument("--receiver", default="receiver_pyinfer.json",
+                        help="receiver config in the corpus")
+    parser.add_argument("--sender", default="sender_pyinfer.json",
+                        help="sender config in the corpus")
+    parser.add_argument("--pairs", default=DefaultPairs,
+                        help="comma separated numbers of concurrent calls")
+    parser.add_argument("--duration", type=int, default=DefaultDuration,
+                        help="length of every call (s)")
+    parser.add_argument("--base_port", type=int, default=DefaultBasePort)
+    parser.add_argument("--binary", default="peerconnection_serverless")
+    parser.add_argument("--workdir", default="loadgen",
+                        help="directory receiving the configs and logs")
+    parser.add_argument("--sample_interval", type=float,
+                        default=DefaultSampleInterval)
+    parser.add_argument("--start_delay", type=float, default=DefaultStartDelay,
+                        help="seconds between the receivers and the senders")
+    parser.add_argument("--cpu_limit", type=float, default=DefaultCpuLimit,
+                        help="CPU share (%%) of every core saturating a step")
+    parser.add_argument("--keep_going", action="store_true",
+                        help="run the steps after the first saturated one")
+    parser.add_argument("--output", help="JSON report")
+    args = parser.parse_args()
+    args.corpus = os.path.abspath(args.corpus)
+    args.workdir = os.path.abspath(args.workdir)
+
+    with open(os.path.join(args.corpus, args.receiver), "r") as config_file:
+        receiver = json.load(config_file)
+    with open(os.path.join(args.corpus, args.sender), "r") as config_file:
+        sender = json.load(config_file)
+    bwe_feedback_ms = receiver.get("bwe_feedback_duration",
+                                   DefaultBweFeedbackDuration)
+    cpu_count = os.cpu_count() or 1
+
+    report = {"cpu_count": cpu_count, "steps": [], "sustained_pairs": 0,
+              "saturated_pairs": None}
+    for pairs in sorted(int(value) for value in args.pairs.split(",")):
+        step = run_step(args, pairs, receiver, sender)
+        step["saturation"] = saturation_reasons(
+            step, args.duration, bwe_feedback_ms, args.cpu_limit, cpu_count)
+        report["steps"].append(step)
+        print_step(step)
+        sys.stdout.flush()
+        if not step["saturation"]:
+            report["sustained_pairs"] = max(report["sustained_pairs"], pairs)
+        elif report["saturated_pairs"] is None:
+            report["saturated_pairs"] = pairs
+            if not args.keep_going:
+                break
+    print("Sustained {} concurrent pairs, saturated at {}".format(
+        report["sustained_pairs"], report["saturated_pairs"] or "-"))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=4)
+
+
+if __name__ == "__main__":
+    main()
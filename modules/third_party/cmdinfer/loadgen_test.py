@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 loadgen_test.py
+"""
+
+import argparse
+import json
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+import loadgen
+
+
+CORPUS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "examples",
+    "peerconnection", "serverless", "corpus")
+
+# Plays peerconnection_serverless: the receiver logs an estimate every
+# bwe_feedback_duration and its PyInfer round trips
+FakeApp = """#!{python}
+import json, sys, time
+with open(sys.argv[1]) as config_file:
+    config = json.load(config_file)
+if config["serverless_connection"]["receiver"]["enabled"]:
+    with open(config["logging"]["log_output_path"], "w") as log:
+        for i in range({estimates}):
+            log.write("(remote_estimator_proxy.cc:1): Send back BWE "
+                      "estimation: 1e+06 at time: %d\\n" % i)
+        log.write("(remote_estimator_proxy.cc:2): PLOTTABLE_DATA: " +
+                  json.dumps({{"graph_name": "GetEstimatedBandwidth",
+                              "samples": [{{"time": 0, "value": 300}},
+                                          {{"time": 1, "value": 900}}]}}) +
+                  "\\n")
+time.sleep(0.3)
+"""
+
+
+class TestLoadgen(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        with open(os.path.join(CORPUS, "receiver_pyinfer.json")) as config:
+            self.receiver = json.load(config)
+        with open(os.path.join(CORPUS, "sender_pyinfer.json")) as config:
+            self.sender = json.load(config)
+
+    def fake_app(self, estimates: int)->str:
+        path = os.path.join(self.directory.name, "peerconnection_serverless")
+        with open(path, "w") as app:
+            app.write(FakeApp.format(python=sys.executable,
+                                     estimates=estimates))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def testPairConfigs(self):
+        directory = os.path.join(self.directory.name, "pair")
+        loadgen.write_pair(directory, self.receiver, self.sender, "/corpus",
+                           18005, 7)
+        with open(os.path.join(directory, loadgen.ReceiverConfig)) as config:
+            receiver = json.load(config)
+        with open(os.path.join(directory, loadgen.SenderConfig)) as config:
+            sender = json.load(config)
+        self.assertEqual(receiver["serverless_connection"]["receiver"], {
+            "enabled": True, "listening_ip": "127.0.0.1",
+            "listening_port": 18005})
+        self.assertEqual(sender["serverless_connection"]["sender"], {
+            "enabled": True, "dest_ip": "127.0.0.1", "dest_port": 18005})
+        self.assertEqual(sender["serverless_connection"]["autoclose"], 7)
+        self.assertEqual(sender["video_source"]["video_file"]["file_path"],
+                         "/corpus/testmedia/test.yuv")
+        # Outputs stay in the pair's directory
+        self.assertEqual(receiver["save_to_file"]["video"]["file_path"],
+                         "outvideo.yuv")
+        self.assertEqual(receiver["pyinfer"]["estimator"]["path"], "/corpus")
+        self.assertEqual(receiver["pyinfer"]["metrics_file"],
+                         loadgen.PyInferMetricsFile)
+        self.assertTrue(receiver["logging"]["enabled"])
+        # The corpus configs are left untouched
+        self.assertNotIn("pyinfer", self.receiver)
+
+    def testProcessTree(self):
+        processes = {1: (0, 5, 10), 2: (1, 7, 20), 3: (2, 1, 30), 4: (0, 9, 1)}
+        self.assertEqual(sorted(loadgen.process_tree(processes, 2)), [2, 3])
+        self.assertEqual(loadgen.process_tree(processes, 5), [])
+        self.assertIn(os.getpid(), loadgen.list_processes())
+
+    def testParseReceiverLog(self):
+        log = os.path.join(self.directory.name, "webrtc.log")
+        with open(log, "w") as log_file:
+            log_file.write("Send back BWE estimation: 300000 at time: 1\n")
+            log_file.write("ONNXInfer: model; inference latency (us): count "
+                           "12, p50 800, p99 1500\n")
+            log_file.write("Send back BWE estimation: 300000 at time: 2\n")
+        result = loadgen.parse_receiver_log(log)
+        self.assertEqual(result["estimates"], 2)
+        self.assertEqual(result["onnx"],
+                         {"count": 12, "p50_us": 800, "p99_us": 1500})
+
+    def run_step(self, pairs: int, estimates: int)->dict:
+        args = argparse.Namespace(
+            workdir=self.directory.name, corpus=CORPUS, base_port=18000,
+            duration=1, binary=self.fake_app(estimates), start_delay=0,
+            sample_interval=0.05)
+        return loadgen.run_step(args, pairs, self.receiver, self.sender)
+
+    def testRunStep(self):
+        step = self.run_step(2, 5)
+        self.assertEqual([pair["pair"] for pair in step["results"]], [0, 1])
+        for pair in step["results"]:
+            self.assertEqual(pair["estimates"], 5)
+            self.assertEqual(pair["round_trip_p50_us"], 300)
+            self.assertEqual(pair["round_trip_p99_us"], 900)
+            self.assertEqual(pair["receiver"]["exit_code"], 0)
+            self.assertGreater(pair["receiver"]["peak_rss_mb"], 0)
+        # 5 estimates per second at the corpus' 200ms feedback, the CPU is
+        # left out of the verdict
+        self.assertEqual(
+            loadgen.saturation_reasons(step, 1, 200, 90, 1 << 10), [])
+
+    def testSaturation(self):
+        step = self.run_step(1, 2)
+        step["results"][0]["round_trip_p99_us"] = 250000
+        step["results"][0]["sender"]["exit_code"] = 1
+        step["results"][0]["receiver"]["cpu_percent"] = 80
+        step["results"][0]["sender"]["cpu_percent"] = 15
+        self.assertEqual(loadgen.saturation_reasons(step, 1, 200, 90, 1), [
+            "CPU 95% of 1 cores",
+            "pair 0 sender exited with 1",
+            "pair 0 sent back 2 of 5 estimates",
+            "pair 0 estimator p99 above 200 ms",
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import os
+import time
+
+
+# Prefix understood by rtc_tools/metrics_plotter.py
+PlottableDataPrefix = "PLOTTABLE_DATA: "
+
+DefaultIntervalMs = 5000
+
+# 4 buckets per power of two above 8 us, exact below
+SubBuckets = 4
+BucketCount = SubBuckets * 40
+
+
+def bucket_index(us: int)->int:
+    if us < 2 * SubBuckets:
+        return us
+    shift = us.bit_length() - 3
+    return min((shift << 2) + (us >> shift), BucketCount - 1)
+
+
+def bucket_value(index: int)->int:
+    '''
+    Return the lower bound (in us) of the latencies counted by a bucket.
+    '''
+    if index < 2 * SubBuckets:
+        return index
+    shift = (index >> 2) - 1
+    return (index % SubBuckets + SubBuckets) << shift
+
+
+class LatencyHistogram(object):
+    '''
+    Log-linear latency histogram, recording costs a few integer operations
+    and percentiles are within 25% of the exact value.
+    '''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * BucketCount
+        self.count = 0
+        self.total = 0
+        self.squares = 0
+        self.max = 0
+
+    def record_ns(self, ns: int):
+        us = ns // 1000
+        self.counts[bucket_index(us)] += 1
+        self.count += 1
+        self.total += us
+        self.squares += us * us
+        if us > self.max:
+            self.max = us
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.squares += other.squares
+        self.max = max(self.max, other.max)
+
+    def mean(self)->float:
+        return self.total / self.count if self.count else 0.0
+
+    def std(self)->float:
+        if not self.count:
+            return 0.0
+        return math.sqrt(max(0.0, self.squares / self.count - self.mean() ** 2))
+
+    def percentile(self, q: float)->int:
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return bucket_value(index)
+        return 0
+
+
+class Metrics(object):
+    '''
+    Latency of the estimator loop: parsing packet stats, report_states (or
+    report_states_batch) and get_estimated_bandwidth, in microseconds.
+    Every interval the current window is summarized and the metrics file is
+    rewritten with one PLOTTABLE_DATA line per stage, whose samples are the
+    p99 latency of every window so far.
+    '''
+    Stages = ("parse", "report_states", "get_estimated_bandwidth")
+
+    def __init__(self, path: str, interval_ms: int = DefaultIntervalMs,
+                 trace_name: str = "cmdinfer"):
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.trace_name = trace_name
+        self.parse = LatencyHistogram()
+        self.report_states = LatencyHistogram()
+        self.get_estimated_bandwidth = LatencyHistogram()
+        self.totals = {stage: LatencyHistogram() for stage in self.Stages}
+        self.samples = {stage: [] for stage in self.Stages}
+        self.next_export = time.monotonic() + self.interval
+
+    def maybe_export(self):
+        if time.monotonic() >= self.next_export:
+            self.export()
+
+    def export(self):
+        self.next_export = time.monotonic() + self.interval
+        now_us = int(time.time() * 1e6)
+        for stage in self.Stages:
+            window = getattr(self, stage)
+            if not window.count:
+                continue
+            self.samples[stage].append(
+                {"time": now_us, "value": window.percentile(99)})
+            self.totals[stage].merge(window)
+            window.reset()
+        lines = []
+        for stage in self.Stages:
+            total = self.totals[stage]
+            if not total.count:
+                continue
+            lines.append(PlottableDataPrefix + json.dumps({
+                "graph_name": stage,
+                "trace_name": self.trace_name,
+                "units": "us",
+                "mean": total.mean(),
+                "std": total.std(),
+                "count": total.count,
+                "p50": total.percentile(50),
+                "p99": total.percentile(99),
+                "max": total.max,
+                "samples": self.samples[stage],
+            }) + "\n")
+        # Replace the file at once so readers never see a partial export
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as metrics_file:
+            metrics_file.writelines(lines)
+        os.replace(temporary, self.path)
+
+
+def from_config(config: dict):
+    '''
+    Return the Metrics configured by pyinfer.metrics_file and
+    pyinfer.metrics_interval, or None if they are disabled.
+    '''
+    section = config.get("pyinfer", {})
+    if not section.get("metrics_file"):
+        return None
+    return Metrics(section["metrics_file"],
+                   section.get("metrics_interval") or DefaultIntervalMs)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 metrics_test.py
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import cmdinfer
+import metrics
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def testBucketsCoverEveryLatency(self):
+        previous = 0
+        for us in range(100000):
+            index = metrics.bucket_index(us)
+            lower = metrics.bucket_value(index)
+            self.assertGreaterEqual(index, previous)
+            self.assertLessEqual(lower, us)
+            self.assertLess(us, max(lower * 1.25, lower + 1))
+            previous = index
+
+    def testPercentiles(self):
+        histogram = metrics.LatencyHistogram()
+        for us in range(1, 101):
+            histogram.record_ns(us * 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.max, 100)
+        self.assertAlmostEqual(histogram.mean(), 50.5)
+        self.assertLessEqual(histogram.percentile(50), 50)
+        self.assertGreater(histogram.percentile(50), 50 / 1.25)
+        self.assertLessEqual(histogram.percentile(99), 99)
+        self.assertGreater(histogram.percentile(99), 99 / 1.25)
+
+    def testMerge(self):
+        first = metrics.LatencyHistogram()
+        second = metrics.LatencyHistogram()
+        first.record_ns(5000)
+        second.record_ns(7000)
+        first.merge(second)
+        self.assertEqual(first.count, 2)
+        self.assertEqual(first.max, 7)
+        self.assertEqual(first.percentile(100), 7)
+
+
+class Estimator(object):
+    def report_states(self, stats: dict):
+        pass
+
+    def get_estimated_bandwidth(self)->int:
+        return 1000
+
+
+class TestMetrics(unittest.TestCase):
+    def testMainExportsPlottableData(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.txt")
+            loop_metrics = metrics.from_config(
+                {"pyinfer": {"metrics_file": path}})
+            stats = json.dumps({
+                "send_time_ms": 1, "arrival_time_ms": 2, "payload_size": 3,
+                "ssrc": 4, "sequence_number": 5, "padding_length": 0,
+                "header_length": 24, "payload_type": 96})
+            ifd = io.BytesIO(
+                ((stats + "\n") * 3 + "RequestBandwidth\n").encode("utf-8"))
+            cmdinfer.main(ifd, io.BytesIO(), Estimator(), loop_metrics)
+            with open(path, "r") as metrics_file:
+                lines = metrics_file.read().splitlines()
+        data = {}
+        for line in lines:
+            self.assertTrue(line.startswith(metrics.PlottableDataPrefix))
+            metric = json.loads(line[len(metrics.PlottableDataPrefix):])
+            data[metric["graph_name"]] = metric
+        # The request line goes through the JSON parser too
+        self.assertEqual(data["parse"]["count"], 4)
+        self.assertEqual(data["report_states"]["count"], 3)
+        self.assertEqual(data["get_estimated_bandwidth"]["count"], 1)
+        self.assertEqual(len(data["parse"]["samples"]), 1)
+        self.assertEqual(data["parse"]["units"], "us")
+
+    def testDisabledByDefault(self):
+        self.assertIsNone(metrics.from_config({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
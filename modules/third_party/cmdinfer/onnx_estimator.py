@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""PyInfer estimator running an ONNX model with onnxruntime.
+
+The model receives, once per bandwidth request, the state of the OpenNetLab
+gym: the receiving rate, the queuing delay and the loss ratio of the packets
+received since the previous request, and the previous estimate. Packet stats
+are kept in a preallocated ring buffer, so reporting a packet never grows a
+Python list and the state is computed with a few NumPy operations. Use it
+with the "estimator" options of the "pyinfer" section, e.g.
+
+      "estimator": {
+          "module": "onnx_estimator",
+          "path": null,
+          "args": {"model_path": "onnx-model.onnx"}
+      }
+"""
+
+import numpy
+
+import cmdinfer
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+DefaultModelPath = "onnx-model.onnx"
+DefaultCapacity = 1 << 14
+# Estimate sent back until the model answered for the first time (bps)
+DefaultBandwidth = 300000
+
+# Bandwidth range of the model, its input and output are the log of the
+# bandwidth scaled to [0, 1] over this range
+MinBandwidthMbps = 0.01
+MaxBandwidthMbps = 8.0
+LogMinBandwidthMbps = numpy.log(MinBandwidthMbps)
+LogMaxBandwidthMbps = numpy.log(MaxBandwidthMbps)
+
+
+def linear_to_log(bandwidth: float)->float:
+    mbps = numpy.clip(bandwidth / 1e6, MinBandwidthMbps, MaxBandwidthMbps)
+    return float((numpy.log(mbps) - LogMinBandwidthMbps) /
+                 (LogMaxBandwidthMbps - LogMinBandwidthMbps))
+
+
+def log_to_linear(value: float)->float:
+    value = numpy.clip(value, 0, 1)
+    return float(numpy.exp(
+        value * (LogMaxBandwidthMbps - LogMinBandwidthMbps) +
+        LogMinBandwidthMbps) * 1e6)
+
+
+class PacketWindow(object):
+    '''
+    Ring buffer of the latest capacity packets, as a structured array of
+    cmdinfer.BinaryStatsDtype, and the state of the packets received since
+    the previous call to take_state.
+    '''
+    def __init__(self, capacity: int = DefaultCapacity):
+        self.packets = numpy.zeros(capacity, dtype=cmdinfer.BinaryStatsDtype)
+        self.capacity = capacity
+        self.count = 0
+        self.taken = 0
+        self.last_arrival_ms = None
+        # Smallest one-way delay seen, the queuing delay is relative to it
+        self.base_delay_ms = None
+        # Sequence number of the latest packet of every SSRC
+        self.last_sequence = {}
+
+    def append(self, stats: dict):
+        self.packets[self.count % self.capacity] = numpy.frombuffer(
+            cmdinfer.encode_binary_stats(stats),
+            dtype=cmdinfer.BinaryStatsDtype)[0]
+        self.count += 1
+
+    def extend(self, columns: dict):
+        size = len(columns["ssrc"])
+        skip = max(size - self.capacity, 0)
+        rows = (self.count + numpy.arange(skip, size)) % self.capacity
+        for field in cmdinfer.BinaryStatsFields:
+            self.packets[field][rows] = numpy.asarray(columns[field])[skip:]
+        self.count += size
+
+    def recent(self):
+        '''
+        Returns the packets received since the previous take_state, at most
+        capacity of them, in arrival order.
+        '''
+        size = min(self.count - self.taken, self.capacity)
+        start = (self.count - size) % self.capacity
+        if start + size <= self.capacity:
+            return self.packets[start:start + size]
+        return numpy.concatenate(
+            (self.packets[start:], self.packets[:start + size - self.capacity]))
+
+    def lost_packets(self, packets, overwritten: int = 0)->int:
+        '''
+        Returns the packets missing from the sequences of packets, counted
+        from the last sequence number seen of every SSRC. The overwritten
+        packets, received but dropped from the ring buffer before packets,
+        fill the gaps since the last sequence numbers.
+        '''
+        lost = 0
+        skipped = 0
+        for ssrc in numpy.unique(packets["ssrc"]):
+            sequence = packets["sequence_number"][
+                packets["ssrc"] == ssrc].astype(numpy.int64)
+            previous = self.last_sequence.get(int(ssrc))
+            if previous is not None:
+                sequence = numpy.concatenate(([previous], sequence))
+            # Gaps in the 16-bit sequence, reordered packets are not losses
+            gaps = numpy.clip(
+                (numpy.diff(sequence) + 32768) % 65536 - 32768 - 1, 0, None)
+            if previous is not None:
+                skipped += int(gaps[0])
+                gaps = gaps[1:]
+            lost += int(gaps.sum())
+            self.last_sequence[int(ssrc)] = int(sequence[-1])
+        return lost + max(skipped - overwritten, 0)
+
+    def take_state(self, last_estimate: float):
+        '''
+        Returns the model input for the packets received since the previous
+        call, or None if there was none.
+        '''
+        packets = self.recent()
+        overwritten = self.count - self.taken - len(packets)
+        self.taken = self.count
+        if len(packets) == 0:
+            return None
+        arrival = packets["arrival_time_ms"].astype(numpy.int64)
+        delay = arrival - packets["send_time_ms"].astype(numpy.int64)
+        first_arrival = (self.last_arrival_ms if self.last_arrival_ms is not None
+                         else int(arrival[0]))
+        duration_ms = max(int(arrival[-1]) - first_arrival, 1)
+        self.last_arrival_ms = int(arrival[-1])
+        lowest = int(delay.min())
+        if self.base_delay_ms is None or lowest < self.base_delay_ms:
+            self.base_delay_ms = lowest
+        receiving_rate = packets["payload_size"].sum() * 8000.0 / duration_ms
+        queuing_delay_ms = float(delay.mean()) - self.base_delay_ms
+        lost = self.lost_packets(packets, overwritten)
+        return numpy.array([[
+            linear_to_log(receiving_rate),
+            min(queuing_delay_ms / 1000.0, 1.0),
+            lost / (lost + len(packets)),
+            linear_to_log(last_estimate),
+        ]], dtype=numpy.float32)
+
+
+class Estimator(object):
+    '''
+    Runs model_path with one inference per get_estimated_bandwidth. A model
+    with a second input is recurrent, that input (e.g. the GRU hidden state)
+    starts at zero and is fed back from the model's second output.
+    '''
+    def __init__(self, model_path: str = DefaultModelPath,
+                 capacity: int = DefaultCapacity, session = None):
+        if session is None:
+            if onnxruntime is None:
+                raise ImportError("onnx_estimator needs onnxruntime")
+            session = onnxruntime.InferenceSession(
+                model_path, providers=["CPUExecutionProvider"])
+        self.session = session
+        inputs = session.get_inputs()
+        self.state_name = inputs[0].name
+        self.hidden_name = inputs[1].name if len(inputs) > 1 else None
+        self.hidden = None
+        if self.hidden_name is not None:
+            shape = [dim if isinstance(dim, int) else 1
+                     for dim in inputs[1].shape]
+            self.hidden = numpy.zeros(shape, dtype=numpy.float32)
+        self.window = PacketWindow(capacity)
+        self.estimate = DefaultBandwidth
+
+    def report_states(self, stats: dict):
+        self.window.append(stats)
+
+    def report_states_batch(self, columns: dict):
+        self.window.extend(columns)
+
+    def get_estimated_bandwidth(self)->int:
+        state = self.window.take_state(self.estimate)
+        if state is None:
+            return int(self.estimate)
+        feeds = {self.state_name: state}
+        if self.hidden_name is not None:
+            feeds[self.hidden_name] = self.hidden
+        outputs = self.session.run(None, feeds)
+        if self.hidden_name is not None:
+            self.hidden = outputs[1]
+        self.estimate = log_to_linear(float(numpy.ravel(outputs[0])[0]))
+        return int(self.estimate)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 onnx_estimator_test.py
+"""
+
+import os
+import unittest
+
+import cmdinfer
+import onnx_estimator
+from features_test import packet
+
+
+CorpusModel = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "examples",
+    "peerconnection", "serverless", "corpus", "onnx-model.onnx")
+
+
+class Input(object):
+    def __init__(self, name, shape):
+        self.name = name
+        self.shape = shape
+
+
+class FakeSession(object):
+    '''
+    Recurrent model answering with its state's first feature, the hidden
+    state counts the inferences.
+    '''
+    def __init__(self):
+        self.feeds = []
+
+    def get_inputs(self):
+        return [Input("states", [1, 4]), Input("hidden_states", [2, 1, 2])]
+
+    def run(self, output_names, feeds):
+        self.feeds.append(feeds)
+        return [feeds["states"][:, :1], feeds["hidden_states"] + 1]
+
+
+class TestPacketWindow(unittest.TestCase):
+    def testRingBufferWraps(self):
+        window = onnx_estimator.PacketWindow(capacity=4)
+        for sequence_number in range(6):
+            window.append(packet(sequence_number, 1000 + sequence_number))
+        self.assertEqual(list(window.recent()["sequence_number"]),
+                         [2, 3, 4, 5])
+
+    def testExtendBeyondCapacity(self):
+        window = onnx_estimator.PacketWindow(capacity=4)
+        window.append(packet(0, 1000))
+        batch = cmdinfer.StatsBatch()
+        for sequence_number in range(1, 7):
+            batch.append(packet(sequence_number, 1000 + sequence_number))
+        window.extend(batch.flush())
+        self.assertEqual(window.count, 7)
+        self.assertEqual(list(window.recent()["sequence_number"]),
+                         [3, 4, 5, 6])
+
+    def testState(self):
+        window = onnx_estimator.PacketWindow()
+        self.assertIsNone(window.take_state(1e6))
+        # 100 packets of 1000 bytes over 100ms, a loss and 10ms of queuing
+        for sequence_number in range(101):
+            if sequence_number == 50:
+                continue
+            delay_ms = 50 if sequence_number > 50 else 40
+            window.append(packet(sequence_number, 1000 + sequence_number,
+                                 delay_ms))
+        state = window.take_state(1e6)[0]
+        self.assertAlmostEqual(
+            state[0], onnx_estimator.linear_to_log(100 * 1000 * 8000 / 100), 5)
+        self.assertAlmostEqual(state[1], 0.005, 5)
+        self.assertAlmostEqual(state[2], 1 / 101, 5)
+        self.assertAlmostEqual(state[3], onnx_estimator.linear_to_log(1e6), 5)
+        self.assertIsNone(window.take_state(1e6))
+
+    def testLossAcrossRequestsAndWrap(self):
+        window = onnx_estimator.PacketWindow()
+        window.append(packet(65534, 1000))
+        window.take_state(1e6)
+        window.append(packet(65535, 1001))
+        window.append(packet(65537, 1002))
+        window.append(packet(3, 1003, ssrc=2))
+        self.assertAlmostEqual(window.take_state(1e6)[0][2], 1 / 4, 5)
+
+    def testLossBeyondCapacity(self):
+        window = onnx_estimator.PacketWindow(capacity=4)
+        window.append(packet(0, 1000))
+        window.take_state(1e6)
+        # Packets 1 to 5 are overwritten before the request, 8 is lost
+        batch = cmdinfer.StatsBatch()
+        for sequence_number in (1, 2, 3, 4, 5, 6, 7, 9, 10):
+            batch.append(packet(sequence_number, 1000 + sequence_number))
+        window.extend(batch.flush())
+        self.assertAlmostEqual(window.take_state(1e6)[0][2], 1 / 5, 5)
+        window.append(packet(11, 1011))
+        self.assertEqual(window.take_state(1e6)[0][2], 0)
+
+
+class TestEstimator(unittest.TestCase):
+    def testLogScale(self):
+        for bandwidth in (1e5, 1e6, 5e6):
+            self.assertAlmostEqual(
+                onnx_estimator.log_to_linear(
+                    onnx_estimator.linear_to_log(bandwidth)), bandwidth, 0)
+
+    def testRecurrentInference(self):
+        session = FakeSession()
+        estimator = onnx_estimator.Estimator(session=session)
+        self.assertEqual(estimator.get_estimated_bandwidth(),
+                         onnx_estimator.DefaultBandwidth)
+        self.assertEqual(session.feeds, [])
+        for request in range(2):
+            for sequence_number in range(100):
+                estimator.report_states(
+                    packet(request * 100 + sequence_number,
+                           1000 + request * 100 + sequence_number))
+            # The fake model answers with the receiving rate, 8Mbps
+            self.assertAlmostEqual(estimator.get_estimated_bandwidth(), 8e6,
+                                   delta=1)
+        self.assertEqual(session.feeds[0]["hidden_states"].sum(), 0)
+        self.assertEqual(session.feeds[1]["hidden_states"].sum(), 4)
+
+    @unittest.skipIf(onnx_estimator.onnxruntime is None,
+                     "onnxruntime is not installed")
+    def testCorpusModel(self):
+        estimator = onnx_estimator.Estimator(CorpusModel)
+        batch = cmdinfer.StatsBatch()
+        for sequence_number in range(200):
+            batch.append(packet(sequence_number, 1000 + sequence_number))
+        estimator.report_states_batch(batch.flush())
+        bandwidth = estimator.get_estimated_bandwidth()
+        self.assertGreaterEqual(bandwidth, 1e6 * onnx_estimator.MinBandwidthMbps)
+        self.assertLessEqual(bandwidth, 1e6 * onnx_estimator.MaxBandwidthMbps)
+
+
+if __name__ == "__main__":
+    unittest.main()
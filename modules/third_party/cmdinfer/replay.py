@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Replays recorded packet stats into a PyInfer Estimator without WebRTC.
+
+A trace is a text file with one packet per line, either the statcollect
+records written to webrtc.log (as extracted by statcollect/parse.py) or the
+JSON lines sent by cmdinfer. Bandwidth is requested every
+bwe_feedback_duration on the trace's own arrival clock, like the receiver
+does, but the trace is replayed as fast as the estimator allows. Run with
+
+      python3 replay.py [--config receiver_pyinfer.json] [--jobs N] \\
+          [--output estimates.csv] trace [trace ...]
+"""
+
+import argparse
+import csv
+import glob
+import json
+import math
+import multiprocessing
+import os
+import time
+
+import cmdinfer
+
+
+DefaultIntervalMs = 200
+
+
+def stats_from_record(record: dict)->dict:
+    '''
+    Return the report_states dict of a statcollect or cmdinfer record, or
+    None if the record does not describe a packet.
+    '''
+    if "packetInfo" in record:
+        packet = record["packetInfo"]
+        header = packet["header"]
+        return {
+            "send_time_ms": header["sendTimestamp"],
+            "arrival_time_ms": packet["arrivalTimeMs"],
+            "payload_type": header["payloadType"],
+            "sequence_number": header["sequenceNumber"],
+            "ssrc": header["ssrc"],
+            "padding_length": header["paddingLength"],
+            "header_length": header["headerLength"],
+            "payload_size": packet["payloadSize"],
+            "loss_count": cmdinfer.BinaryStatsDefaults["loss_count"],
+            "rtt_ms": cmdinfer.BinaryStatsDefaults["rtt_ms"],
+        }
+    if "arrival_time_ms" in record:
+        # Traces recorded before loss_count and rtt_ms were reported
+        return {field: record.get(field, cmdinfer.BinaryStatsDefaults.get(
+                    field)) for field in cmdinfer.BinaryStatsFields}
+    return None
+
+
+def read_trace(path: str)->list:
+    '''
+    Return the packets of a trace file in order. Log prefixes before the
+    JSON object and lines without a packet are skipped.
+    '''
+    packets = []
+    with open(path, "r", errors="replace") as trace:
+        for line in trace:
+            start = line.find("{")
+            if start == -1:
+                continue
+            try:
+                record = json.loads(line[start:])
+            except ValueError:
+                continue
+            stats = stats_from_record(record) if isinstance(record, dict) \
+                else None
+            if stats is not None:
+                packets.append(stats)
+    return packets
+
+
+def replay(estimator, packets: list, interval_ms: int):
+    '''
+    Feed packets to estimator and request an estimate whenever interval_ms
+    elapsed on the arrival clock. Return the (arrival time, estimate,
+    latency in ms) of every request. The latency includes delivering a
+    pending batch to estimators implementing report_states_batch.
+    '''
+    batch = cmdinfer.StatsBatch() \
+        if hasattr(estimator, "report_states_batch") else None
+    series = []
+    if not packets:
+        return series
+    last_request_ms = packets[0]["arrival_time_ms"]
+    for stats in packets:
+        if batch is None:
+            estimator.report_states(stats)
+        else:
+            batch.append(stats)
+            if len(batch) >= cmdinfer.MaxBatchSize:
+                estimator.report_states_batch(batch.flush())
+        now_ms = stats["arrival_time_ms"]
+        # Same condition as RemoteEstimatorProxy::TimeToSendBweMessage
+        if now_ms - interval_ms <= last_request_ms:
+            continue
+        last_request_ms = now_ms
+        start = time.perf_counter()
+        if batch is not None and len(batch):
+            estimator.report_states_batch(batch.flush())
+        bandwidth = int(estimator.get_estimated_bandwidth())
+        series.append(
+            (now_ms, bandwidth, (time.perf_counter() - start) * 1000))
+    return series
+
+
+def percentile(values: list, q: float)->float:
+    if not values:
+        return float("nan")
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def replay_trace(task):
+    '''
+    Replay one trace with a fresh estimator, used as multiprocessing task.
+    '''
+    path, options, interval_ms = task
+    packets = read_trace(path)
+    start = time.perf_counter()
+    series = replay(cmdinfer.create_estimator(options), packets, interval_ms)
+    return path, len(packets), time.perf_counter() - start, series
+
+
+def trace_paths(patterns: list)->list:
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(
+                os.path.join(pattern, name) for name in os.listdir(pattern)))
+        else:
+            paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return paths
+
+
+def summary(name: str, packets: int, elapsed: float, latencies: list)->str:
+    return ("{}: {} packets, {} requests in {:.3f} s, latency ms "
+            "p50 {:.3f} p90 {:.3f} p99 {:.3f} max {:.3f}").format(
+                name, packets, len(latencies), elapsed,
+                percentile(latencies, 50), percentile(latencies, 90),
+                percentile(latencies, 99),
+                max(latencies) if latencies else float("nan"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("traces", nargs="+",
+                        help="trace files, directories or glob patterns")
+    parser.add_argument("--config",
+                        help="serverless config selecting the estimator and "
+                        "bwe_feedback_duration")
+    parser.add_argument("--interval", type=int,
+                        help="request interval in ms (default: "
+                        "bwe_feedback_duration or {})".format(
+                            DefaultIntervalMs))
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="traces replayed in parallel")
+    parser.add_argument("--output",
+                        help="CSV file receiving the estimate time series")
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config, "r") as config_file:
+            config = json.load(config_file)
+    interval_ms = args.interval or config.get(
+        "bwe_feedback_duration", DefaultIntervalMs)
+    options = cmdinfer.estimator_options(config)
+    tasks = [(path, options, interval_ms) for path in trace_paths(args.traces)]
+
+    output = None
+    if args.output:
+        output = open(args.output, "w", newline="")
+        writer = csv.writer(output)
+        writer.writerow(["trace", "arrival_time_ms", "estimate_bps",
+                         "latency_ms"])
+    start = time.perf_counter()
+    total_packets = 0
+    latencies = []
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        results = pool.imap(replay_trace, tasks)
+    else:
+        pool = None
+        results = map(replay_trace, tasks)
+    for path, packets, elapsed, series in results:
+        trace_latencies = [latency for _, _, latency in series]
+        print(summary(path, packets, elapsed, trace_latencies))
+        total_packets += packets
+        latencies.extend(trace_latencies)
+        if output is not None:
+            for arrival_ms, bandwidth, latency in series:
+                writer.writerow(
+                    [path, arrival_ms, bandwidth, "{:.3f}".format(latency)])
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if output is not None:
+        output.close()
+    if len(tasks) > 1:
+        print(summary("{} traces".format(len(tasks)), total_packets,
+                      time.perf_counter() - start, latencies))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 replay_test.py
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import replay
+
+
+def statcollect_line(arrival_time_ms: int)->str:
+    record = {
+        "hastransportSequenceNumber": True,
+        "mediaInfo": {"audioInfo": {}, "videoInfo": {}},
+        "pacerPacingRate": -1,
+        "pacerPaddingRate": -1,
+        "packetInfo": {
+            "arrivalTimeMs": arrival_time_ms,
+            "header": {
+                "headerLength": 24,
+                "paddingLength": 0,
+                "payloadType": 96,
+                "sendTimestamp": arrival_time_ms - 30,
+                "sequenceNumber": arrival_time_ms % 65536,
+                "ssrc": 12345,
+            },
+            "lossRates": 0,
+            "payloadSize": 1000,
+        },
+    }
+    return "(remote_estimator_proxy.cc:180): " + json.dumps(record) + "\n"
+
+
+def cmdinfer_line(arrival_time_ms: int)->str:
+    return json.dumps({
+        "send_time_ms": arrival_time_ms - 30,
+        "arrival_time_ms": arrival_time_ms,
+        "payload_type": 96,
+        "sequence_number": arrival_time_ms % 65536,
+        "ssrc": 12345,
+        "padding_length": 0,
+        "header_length": 24,
+        "payload_size": 1000,
+    }) + "\n"
+
+
+class Estimator(object):
+    def __init__(self):
+        self.packets = 0
+
+    def report_states(self, stats: dict):
+        self.packets += 1
+
+    def get_estimated_bandwidth(self)->int:
+        return self.packets
+
+
+class BatchEstimator(Estimator):
+    def report_states_batch(self, columns: dict):
+        self.packets += len(columns["ssrc"])
+
+
+class TestReplay(unittest.TestCase):
+    def write_trace(self, lines: list)->str:
+        handle, path = tempfile.mkstemp()
+        with os.fdopen(handle, "w") as trace:
+            trace.writelines(lines)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def testReadBothFormats(self):
+        statcollect = replay.read_trace(self.write_trace(
+            ["log line without packet\n"] +
+            [statcollect_line(t) for t in (1000, 1010)]))
+        flat = replay.read_trace(self.write_trace(
+            [cmdinfer_line(t) for t in (1000, 1010)]))
+        self.assertEqual(statcollect, flat)
+        self.assertEqual(flat[1]["send_time_ms"], 980)
+
+    def testRequestCadence(self):
+        packets = replay.read_trace(self.write_trace(
+            [cmdinfer_line(t) for t in range(1000, 2000, 10)]))
+        series = replay.replay(Estimator(), packets, 200)
+        # Requests are sent once more than 200 ms passed since the last one
+        self.assertEqual([arrival for arrival, _, _ in series],
+                         [1210, 1420, 1630, 1840])
+        self.assertEqual([estimate for _, estimate, _ in series],
+                         [22, 43, 64, 85])
+
+    def testBatchEstimatorSeesSamePackets(self):
+        packets = replay.read_trace(self.write_trace(
+            [cmdinfer_line(t) for t in range(1000, 2000, 10)]))
+        self.assertEqual(
+            [estimate for _, estimate, _ in replay.replay(
+                BatchEstimator(), packets, 200)],
+            [estimate for _, estimate, _ in replay.replay(
+                Estimator(), packets, 200)])
+
+    def testPercentile(self):
+        self.assertEqual(replay.percentile(list(range(1, 101)), 50), 50)
+        self.assertEqual(replay.percentile([3.0], 99), 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
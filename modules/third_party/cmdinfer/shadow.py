@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+
+import cmdinfer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DefaultWorkers = "process"
+
+
+def candidate_options(config: dict)->list:
+    '''
+    Return the estimator options of every candidate listed in the
+    "candidates" section of "pyinfer", each with a "name".
+    '''
+    candidates = config.get("pyinfer", {}).get("candidates", {})
+    options = []
+    for candidate in candidates.get("estimators", []):
+        option = cmdinfer.complete_estimator_options(candidate)
+        option["name"] = candidate.get(
+            "name", "{}.{}".format(option["module"], option["class"]))
+        options.append(option)
+    return options
+
+
+def encode_columns(columns: dict)->bytes:
+    if numpy is not None and isinstance(columns["ssrc"], numpy.ndarray):
+        table = numpy.zeros(
+            len(columns["ssrc"]), dtype=cmdinfer.BinaryStatsDtype)
+        for field in cmdinfer.BinaryStatsFields:
+            table[field] = columns[field]
+        return table.tobytes()
+    fields = cmdinfer.BinaryStatsFields
+    return b"".join(
+        cmdinfer.encode_binary_stats(dict(zip(fields, values)))
+        for values in zip(*[columns[field] for field in fields]))
+
+
+def run_candidate(options: dict, requests, results):
+    '''
+    Worker loop of one candidate: report the packets of every request, then
+    answer it with the candidate's estimate.
+    '''
+    estimator = cmdinfer.create_estimator(options)
+    batch = hasattr(estimator, "report_states_batch")
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        request, request_time, records = message
+        cmdinfer.report_records(estimator, records, batch)
+        bandwidth = int(estimator.get_estimated_bandwidth())
+        results.put({
+            "request": request,
+            "name": options["name"],
+            "estimate": bandwidth,
+            "time_ms": int(time.time() * 1000),
+            "latency_ms": round((time.time() - request_time) * 1000, 3),
+        })
+
+
+class ShadowEstimators(object):
+    '''
+    Feeds the packet stream of the primary estimator to candidate
+    estimators too. Only the primary answers bandwidth requests, every
+    candidate runs in its own worker thread or process and its estimates
+    are written as JSON lines to log, so a slow candidate falls behind
+    instead of delaying the primary.
+    '''
+    def __init__(self, primary, candidates: list, log,
+                 workers: str = DefaultWorkers):
+        self.primary = primary
+        self.log = log
+        self.records = bytearray()
+        self.request = 0
+        if workers == "process":
+            make_queue = multiprocessing.Queue
+            make_worker = multiprocessing.Process
+        elif workers == "thread":
+            make_queue = queue.Queue
+            make_worker = threading.Thread
+        else:
+            raise ValueError("Unknown candidate workers {}".format(workers))
+        self.results = make_queue()
+        self.requests = []
+        self.workers = []
+        for options in candidates:
+            requests = make_queue()
+            worker = make_worker(
+                target=run_candidate, args=(options, requests, self.results),
+                daemon=True)
+            worker.start()
+            self.requests.append(requests)
+            self.workers.append(worker)
+        self.logger = threading.Thread(target=self.write_results, daemon=True)
+        self.logger.start()
+        if hasattr(primary, "report_states_batch"):
+            self.report_states_batch = self.report_columns
+
+    def report_states(self, stats: dict):
+        self.records += cmdinfer.encode_binary_stats(stats)
+        self.primary.report_states(stats)
+
+    def report_columns(self, columns: dict):
+        self.records += encode_columns(columns)
+        self.primary.report_states_batch(columns)
+
+    def get_estimated_bandwidth(self)->int:
+        self.request += 1
+        request_time = time.time()
+        records = bytes(self.records)
+        self.records = bytearray()
+        # Candidates start on their copy before the primary is asked
+        for requests in self.requests:
+            requests.put((self.request, request_time, records))
+        bandwidth = int(self.primary.get_estimated_bandwidth())
+        self.results.put({
+            "request": self.request,
+            "name": "primary",
+            "estimate": bandwidth,
+            "time_ms": int(time.time() * 1000),
+            "latency_ms": round((time.time() - request_time) * 1000, 3),
+        })
+        return bandwidth
+
+    def write_results(self):
+        while True:
+            result = self.results.get()
+            if result is None:
+                break
+            self.log.write(json.dumps(result) + "\n")
+            self.log.flush()
+
+    def close(self):
+        '''
+        Let every candidate answer its pending requests, then stop.
+        '''
+        for requests in self.requests:
+            requests.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.results.put(None)
+        self.logger.join()
+
+
+def with_candidates(primary, config: dict):
+    '''
+    Wrap primary in ShadowEstimators if the config lists candidates,
+    otherwise return it unchanged.
+    '''
+    candidates = candidate_options(config)
+    if not candidates:
+        return primary
+    section = config.get("pyinfer", {}).get("candidates", {})
+    log = sys.stderr
+    if "log" in section:
+        log = open(section["log"], "a")
+    return ShadowEstimators(
+        primary, candidates, log, section.get("workers", DefaultWorkers))
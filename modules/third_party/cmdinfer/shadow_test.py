@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 shadow_test.py
+"""
+
+import io
+import json
+import os
+import unittest
+
+import cmdinfer
+import shadow
+
+
+STATS = {
+    "send_time_ms": 100,
+    "arrival_time_ms": 120,
+    "payload_size": 1200,
+    "ssrc": 7,
+    "sequence_number": 1,
+    "padding_length": 0,
+    "header_length": 24,
+    "payload_type": 96,
+}
+
+
+class Estimator(object):
+    def __init__(self):
+        self.packets = 0
+
+    def report_states(self, stats: dict):
+        self.packets += 1
+
+    def get_estimated_bandwidth(self)->int:
+        return 1000 + self.packets
+
+
+class DoublingEstimator(Estimator):
+    def get_estimated_bandwidth(self)->int:
+        return 2 * super().get_estimated_bandwidth()
+
+
+class BatchEstimator(Estimator):
+    def report_states_batch(self, columns: dict):
+        self.packets += len(columns["ssrc"])
+
+
+CONFIG = {"pyinfer": {"candidates": {"estimators": [
+    {"module": "shadow_test", "class": "DoublingEstimator",
+     "path": os.path.dirname(os.path.abspath(__file__))},
+    {"module": "shadow_test", "class": "Estimator", "name": "baseline",
+     "path": os.path.dirname(os.path.abspath(__file__))},
+]}}}
+
+
+class TestShadowEstimators(unittest.TestCase):
+    def run_session(self, primary, workers: str):
+        log = io.StringIO()
+        estimators = shadow.ShadowEstimators(
+            primary, shadow.candidate_options(CONFIG), log, workers)
+        for _ in range(3):
+            estimators.report_states(STATS)
+        self.assertEqual(estimators.get_estimated_bandwidth(), 1003)
+        if hasattr(estimators, "report_states_batch"):
+            batch = cmdinfer.StatsBatch()
+            batch.append(STATS)
+            estimators.report_states_batch(batch.flush())
+        else:
+            estimators.report_states(STATS)
+        self.assertEqual(estimators.get_estimated_bandwidth(), 1004)
+        estimators.close()
+        results = [json.loads(line) for line in log.getvalue().splitlines()]
+        return {(result["request"], result["name"]): result["estimate"]
+                for result in results}
+
+    def testThreadWorkers(self):
+        estimates = self.run_session(Estimator(), "thread")
+        self.assertEqual(estimates, {
+            (1, "primary"): 1003,
+            (1, "shadow_test.DoublingEstimator"): 2006,
+            (1, "baseline"): 1003,
+            (2, "primary"): 1004,
+            (2, "shadow_test.DoublingEstimator"): 2008,
+            (2, "baseline"): 1004,
+        })
+
+    def testProcessWorkers(self):
+        estimates = self.run_session(Estimator(), "process")
+        self.assertEqual(estimates[(2, "shadow_test.DoublingEstimator")], 2008)
+
+    def testBatchPrimary(self):
+        estimates = self.run_session(BatchEstimator(), "thread")
+        self.assertEqual(estimates[(2, "primary")], 1004)
+        self.assertEqual(estimates[(2, "baseline")], 1004)
+
+    def testNoCandidates(self):
+        primary = Estimator()
+        self.assertIs(shadow.with_candidates(primary, {}), primary)
+
+
+if __name__ == "__main__":
+    unittest.main()
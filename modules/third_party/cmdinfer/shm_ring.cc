@@ -0,0 +1,104 @@
+#include "shm_ring.h"
+
+#include <cstring>
+
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <sys/stat.h>
+#endif
+
+// Header layout, must match shmring.py. Indices live on separate cache
+// lines so the producer and the consumer do not share one.
+const std::uint32_t kShmMagic = 0x42524341;  // "ACRB"
+const std::uint32_t kShmVersion = 1;
+const std::size_t kShmHeaderSize = 256;
+const std::size_t kWriteIndexOffset = 64;
+const std::size_t kDroppedOffset = 72;
+const std::size_t kReadIndexOffset = 128;
+const std::size_t kRequestSeqOffset = 192;
+const std::size_t kReplySeqOffset = 200;
+const std::size_t kBandwidthOffset = 208;
+const std::size_t kReplyTimeOffset = 216;
+
+// std::uint64_t is as wide as long long on every supported target, and
+// only always lock-free atomics are address-free across processes.
+static_assert(sizeof(std::uint64_t) == sizeof(long long) &&
+                  ATOMIC_LLONG_LOCK_FREE == 2,
+              "The shared ring needs address-free 64-bit atomics");
+
+cmdinfer::ShmRing * cmdinfer::ShmRing::OpenFromFd(int fd, std::size_t recordSize) {
+#ifdef _WIN32
+    return nullptr;
+#else
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size < static_cast<off_t>(kShmHeaderSize)) {
+        return nullptr;
+    }
+    void * mapped = mmap(nullptr, static_cast<std::size_t>(st.st_size),
+                         PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    if (mapped == MAP_FAILED) {
+        return nullptr;
+    }
+    std::uint8_t * base = static_cast<std::uint8_t *>(mapped);
+    std::uint32_t header[4];
+    std::memcpy(header, base, sizeof(header));
+    const std::uint32_t capacity = header[3];
+    if (header[0] != kShmMagic || header[1] != kShmVersion ||
+        header[2] != recordSize || capacity == 0 ||
+        (capacity & (capacity - 1)) != 0 ||
+        static_cast<std::size_t>(st.st_size) <
+            kShmHeaderSize + capacity * recordSize) {
+        munmap(mapped, static_cast<std::size_t>(st.st_size));
+        return nullptr;
+    }
+    return new ShmRing(base, capacity, recordSize);
+#endif
+}
+
+cmdinfer::ShmRing::ShmRing(
+    std::uint8_t * base,
+    std::uint32_t capacity,
+    std::size_t recordSize)
+    : base_(base), capacity_(capacity), recordSize_(recordSize) {}
+
+std::atomic<std::uint64_t> * cmdinfer::ShmRing::Field(std::size_t offset) const {
+    return reinterpret_cast<std::atomic<std::uint64_t> *>(base_ + offset);
+}
+
+bool cmdinfer::ShmRing::Push(const std::uint8_t * record) {
+    const std::uint64_t write = Field(kWriteIndexOffset)->load(std::memory_order_relaxed);
+    const std::uint64_t read = Field(kReadIndexOffset)->load(std::memory_order_acquire);
+    if (write - read >= capacity_) {
+        Field(kDroppedOffset)->fetch_add(1, std::memory_order_relaxed);
+        return false;
+    }
+    std::uint8_t * slot =
+        base_ + kShmHeaderSize + (write & (capacity_ - 1)) * recordSize_;
+    std::memcpy(slot, record, recordSize_);
+    Field(kWriteIndexOffset)->store(write + 1, std::memory_order_release);
+    return true;
+}
+
+std::uint64_t cmdinfer::ShmRing::PostRequest() {
+    return Field(kRequestSeqOffset)->fetch_add(1, std::memory_order_acq_rel) + 1;
+}
+
+bool cmdinfer::ShmRing::RequestPending() const {
+    return Field(kReplySeqOffset)->load(std::memory_order_acquire) <
+           Field(kRequestSeqOffset)->load(std::memory_order_relaxed);
+}
+
+bool cmdinfer::ShmRing::ReadReply(
+    std::uint64_t * replySeq,
+    std::uint64_t * bandwidth,
+    std::int64_t * replyTimeMs) const {
+    // The consumer writes bandwidth and time before the reply sequence.
+    *replySeq = Field(kReplySeqOffset)->load(std::memory_order_acquire);
+    if (*replySeq == 0) {
+        return false;
+    }
+    *bandwidth = Field(kBandwidthOffset)->load(std::memory_order_relaxed);
+    *replyTimeMs = static_cast<std::int64_t>(
+        Field(kReplyTimeOffset)->load(std::memory_order_relaxed));
+    return true;
+}
@@ -0,0 +1,45 @@
+#ifndef MODULES_THIRD_PARTY_CMDINFER_SHM_RING_H_
+#define MODULES_THIRD_PARTY_CMDINFER_SHM_RING_H_
+
+#include <atomic>
+#include <cinttypes>
+#include <cstddef>
+
+namespace cmdinfer {
+    // Single-producer/single-consumer ring buffer in shared memory, created
+    // by the peerconnection_serverless wrapper (see shmring.py for the
+    // layout). Packet records flow from this process to the Python
+    // estimator, bandwidth replies flow back through the header.
+    class ShmRing {
+    public:
+        // Maps the ring behind |fd|, returns nullptr if it is not a valid
+        // ring of the expected version and record size.
+        static ShmRing * OpenFromFd(int fd, std::size_t recordSize);
+
+        // Appends one record of the configured size. Never blocks, returns
+        // false (and counts the drop) if the consumer fell behind.
+        bool Push(const std::uint8_t * record);
+
+        // Posts a bandwidth request and returns its sequence number.
+        std::uint64_t PostRequest();
+        bool RequestPending() const;
+
+        // Returns false until the first reply was published. |replyTimeMs|
+        // is the CLOCK_MONOTONIC time of the reply in milliseconds.
+        bool ReadReply(
+            std::uint64_t * replySeq,
+            std::uint64_t * bandwidth,
+            std::int64_t * replyTimeMs) const;
+
+    private:
+        ShmRing(std::uint8_t * base, std::uint32_t capacity, std::size_t recordSize);
+
+        std::atomic<std::uint64_t> * Field(std::size_t offset) const;
+
+        std::uint8_t * const base_;
+        const std::uint32_t capacity_;
+        const std::size_t recordSize_;
+    };
+}
+
+#endif
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+import cmdinfer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Shared memory layout, must match shm_ring.cc. All integers little-endian.
+#   0    uint32 magic, uint32 version, uint32 record size, uint32 capacity
+#   64   uint64 write index (producer), 72 uint64 dropped records
+#   128  uint64 read index (consumer)
+#   192  uint64 request seq, 200 uint64 reply seq,
+#   208  uint64 bandwidth, 216 uint64 reply time (CLOCK_MONOTONIC, ms)
+#   256  capacity records of cmdinfer.BinaryStats
+ShmMagic = 0x42524341
+ShmVersion = 1
+ShmHeader = struct.Struct("<IIII")
+ShmHeaderSize = 256
+WriteIndexOffset = 64
+DroppedOffset = 72
+ReadIndexOffset = 128
+RequestSeqOffset = 192
+ReplySeqOffset = 200
+BandwidthOffset = 208
+ReplyTimeOffset = 216
+DefaultCapacity = 1 << 16
+
+ShmFdEnv = "CMDINFER_SHM_FD"
+
+U64 = struct.Struct("<Q")
+
+
+def create(capacity: int = DefaultCapacity)->int:
+    '''
+    Create an anonymous, initialized shared memory ring able to hold
+    capacity records and return its file descriptor.
+    '''
+    if capacity <= 0 or capacity & (capacity - 1):
+        raise ValueError("capacity must be a power of two")
+    size = ShmHeaderSize + capacity * cmdinfer.BinaryStats.size
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("cmdinfer")
+    else:
+        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        with tempfile.TemporaryFile(dir=shm_dir) as backing:
+            fd = os.dup(backing.fileno())
+    os.ftruncate(fd, size)
+    with mmap.mmap(fd, size) as buffer:
+        ShmHeader.pack_into(
+            buffer, 0, ShmMagic, ShmVersion, cmdinfer.BinaryStats.size,
+            capacity)
+    return fd
+
+
+class ShmRing(object):
+    '''
+    Python end of the shared memory ring. The estimator side consumes
+    records and publishes bandwidth replies, push and post_request
+    implement the receiver side for tests and benchmarks.
+    '''
+    def __init__(self, fd: int):
+        self.buffer = mmap.mmap(fd, 0)
+        magic, version, record_size, capacity = ShmHeader.unpack_from(
+            self.buffer, 0)
+        if magic != ShmMagic or version != ShmVersion:
+            raise ValueError("Not a cmdinfer shared memory ring")
+        if record_size != cmdinfer.BinaryStats.size:
+            raise ValueError("Unexpected record size {}".format(record_size))
+        self.capacity = capacity
+        self.record_size = record_size
+        self.records_offset = ShmHeaderSize
+
+    def close(self):
+        self.buffer.close()
+
+    def load(self, offset: int)->int:
+        return U64.unpack_from(self.buffer, offset)[0]
+
+    def store(self, offset: int, value: int):
+        U64.pack_into(self.buffer, offset, value)
+
+    def dropped(self)->int:
+        return self.load(DroppedOffset)
+
+    def read_records(self)->bytes:
+        '''
+        Consume every available record and return them as contiguous
+        BinaryStats records.
+        '''
+        read = self.load(ReadIndexOffset)
+        write = self.load(WriteIndexOffset)
+        if write == read:
+            return b""
+        start = read % self.capacity
+        count = write - read
+        first = min(count, self.capacity - start)
+        begin = self.records_offset + start * self.record_size
+        records = self.buffer[begin:begin + first * self.record_size]
+        if first < count:
+            records += self.buffer[
+                self.records_offset:
+                self.records_offset + (count - first) * self.record_size]
+        self.store(ReadIndexOffset, write)
+        return records
+
+    def read_table(self):
+        '''
+        Consume every available record and return them as a NumPy
+        structured array of cmdinfer.BinaryStatsDtype.
+        '''
+        return numpy.frombuffer(
+            self.read_records(), dtype=cmdinfer.BinaryStatsDtype)
+
+    def pending_request(self)->int:
+        request = self.load(RequestSeqOffset)
+        if request > self.load(ReplySeqOffset):
+            return request
+        return 0
+
+    def publish_bandwidth(self, request: int, bandwidth: int):
+        self.store(BandwidthOffset, int(bandwidth))
+        self.store(ReplyTimeOffset, int(time.monotonic() * 1000))
+        self.store(ReplySeqOffset, request)
+
+    def push(self, payload: bytes)->bool:
+        write = self.load(WriteIndexOffset)
+        if write - self.load(ReadIndexOffset) >= self.capacity:
+            self.store(DroppedOffset, self.dropped() + 1)
+            return False
+        begin = self.records_offset + (write % self.capacity) * self.record_size
+        self.buffer[begin:begin + self.record_size] = payload
+        self.store(WriteIndexOffset, write + 1)
+        return True
+
+    def post_request(self)->int:
+        request = self.load(RequestSeqOffset) + 1
+        self.store(RequestSeqOffset, request)
+        return request
+
+    def read_reply(self):
+        return self.load(ReplySeqOffset), self.load(BandwidthOffset)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 shmring_test.py
+"""
+
+import os
+import unittest
+
+import cmdinfer
+import shmring
+
+
+def record(sequence_number: int)->bytes:
+    return cmdinfer.BinaryStats.pack(
+        sequence_number, sequence_number + 10, 1200, 1, sequence_number, 0,
+        12, 96, 0, 30)
+
+
+class TestShmRing(unittest.TestCase):
+    def setUp(self):
+        fd = shmring.create(4)
+        self.producer = shmring.ShmRing(fd)
+        self.consumer = shmring.ShmRing(fd)
+        os.close(fd)
+
+    def tearDown(self):
+        self.producer.close()
+        self.consumer.close()
+
+    def testCapacityMustBePowerOfTwo(self):
+        with self.assertRaises(ValueError):
+            shmring.create(3)
+
+    def testRecordsWrapAround(self):
+        for i in range(3):
+            self.assertTrue(self.producer.push(record(i)))
+        self.assertEqual(self.consumer.read_records(),
+                         b"".join(record(i) for i in range(3)))
+        for i in range(3, 7):
+            self.assertTrue(self.producer.push(record(i)))
+        self.assertEqual(self.consumer.read_records(),
+                         b"".join(record(i) for i in range(3, 7)))
+        self.assertEqual(self.consumer.read_records(), b"")
+
+    def testFullRingDropsRecords(self):
+        for i in range(4):
+            self.assertTrue(self.producer.push(record(i)))
+        self.assertFalse(self.producer.push(record(4)))
+        self.assertEqual(self.consumer.dropped(), 1)
+        self.assertEqual(len(self.consumer.read_records()),
+                         4 * cmdinfer.BinaryStats.size)
+
+    def testBandwidthRequest(self):
+        self.assertEqual(self.consumer.pending_request(), 0)
+        request = self.producer.post_request()
+        self.assertEqual(self.consumer.pending_request(), request)
+        self.consumer.publish_bandwidth(request, 300000)
+        self.assertEqual(self.consumer.pending_request(), 0)
+        self.assertEqual(self.producer.read_reply(), (request, 300000))
+
+    @unittest.skipIf(cmdinfer.numpy is None, "Missing numpy")
+    def testReadTable(self):
+        self.producer.push(record(7))
+        table = self.consumer.read_table()
+        self.assertEqual(len(table), 1)
+        self.assertEqual(int(table["sequence_number"][0]), 7)
+        self.assertEqual(int(table["arrival_time_ms"][0]), 17)
+
+
+if __name__ == "__main__":
+    unittest.main()
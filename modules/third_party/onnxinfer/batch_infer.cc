@@ -0,0 +1,163 @@
+/**
+ * @file      batch_infer.cc
+ * @brief     The c++ file of BatchInfer. BatchInfer runs an ONNXInfer model on a background worker, off the receive path.
+ * @repo      AlphaRTC
+ * @copyright Copyright (c) Microsoft Corporation. All rights reserved.
+ * @license   Licensed under the MIT License.
+ **/
+
+#include "batch_infer.h"
+#include "ONNXInferInterface.h"
+
+#include <algorithm>
+#include <sstream>
+
+// Number of inference latencies the percentiles are computed over
+const std::size_t kLatencyWindow = 1024;
+// Number of batches waiting for a worker that fell behind, the oldest
+// packets are dropped beyond it
+const std::size_t kMaxPendingBatches = 16;
+
+onnxinfer::BatchInfer::BatchInfer(
+    void * onnxInfer,
+    int intervalMs,
+    std::size_t batchSize)
+    : onnxInfer_(onnxInfer),
+      interval_(std::max(intervalMs, 1)),
+      batchSize_(std::max<std::size_t>(batchSize, 1)),
+      dropped_(0),
+      stopping_(false),
+      hasEstimate_(false),
+      estimate_(0),
+      latencyCount_(0) {
+    const char * info = onnxinfer::GetInfo(onnxInfer_);
+    modelInfo_ = info ? info : "";
+    pending_.reserve(batchSize_);
+    latencies_.reserve(kLatencyWindow);
+    worker_ = std::thread(&BatchInfer::RunForever, this);
+}
+
+onnxinfer::BatchInfer::~BatchInfer() {
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        stopping_ = true;
+    }
+    wakeup_.notify_one();
+    worker_.join();
+}
+
+void onnxinfer::BatchInfer::OnReceived(
+    unsigned char payloadType,
+    unsigned short sequenceNumber,
+    unsigned int sendTimestamp,
+    unsigned int ssrc,
+    unsigned long paddingLength,
+    unsigned long headerLength,
+    unsigned long long arrivalTimestamp,
+    unsigned long payloadSize,
+    int lossCount,
+    float rtt) {
+    bool full = false;
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (pending_.size() >= kMaxPendingBatches * batchSize_) {
+            // The worker fell behind, the oldest batch is dropped at once
+            // rather than shifting the buffer for every packet
+            pending_.erase(pending_.begin(), pending_.begin() + batchSize_);
+            dropped_ += batchSize_;
+        }
+        pending_.push_back({payloadType, sequenceNumber, sendTimestamp, ssrc,
+                            paddingLength, headerLength, arrivalTimestamp,
+                            payloadSize, lossCount, rtt});
+        full = pending_.size() >= batchSize_;
+    }
+    if (full) {
+        wakeup_.notify_one();
+    }
+}
+
+bool onnxinfer::BatchInfer::GetLatestEstimate(float * bandwidth, std::int64_t * ageMs) {
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (!hasEstimate_) {
+        return false;
+    }
+    *bandwidth = estimate_;
+    *ageMs = std::chrono::duration_cast<std::chrono::milliseconds>(
+        std::chrono::steady_clock::now() - estimateTime_).count();
+    return true;
+}
+
+std::string onnxinfer::BatchInfer::GetInfo() {
+    std::vector<std::int64_t> latencies;
+    std::size_t count;
+    unsigned long long dropped;
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        latencies = latencies_;
+        count = latencyCount_;
+        dropped = dropped_;
+    }
+    std::ostringstream info;
+    info << modelInfo_ << "; inference latency (us): count " << count;
+    if (!latencies.empty()) {
+        // Nearest-rank percentiles of the latest kLatencyWindow inferences
+        std::sort(latencies.begin(), latencies.end());
+        auto percentile = [&latencies](std::size_t p) {
+            std::size_t rank = (p * latencies.size() + 99) / 100;
+            return latencies[std::max<std::size_t>(rank, 1) - 1];
+        };
+        info << ", p50 " << percentile(50) << ", p99 " << percentile(99);
+    }
+    info << "; dropped " << dropped;
+    return info.str();
+}
+
+void onnxinfer::BatchInfer::RunForever() {
+    using Clock = std::chrono::steady_clock;
+    std::vector<ReceivedPacket> batch;
+    batch.reserve(batchSize_);
+    Clock::time_point nextInference = Clock::now() + interval_;
+    std::unique_lock<std::mutex> lock(mutex_);
+    while (!stopping_) {
+        wakeup_.wait_until(lock, nextInference, [this] {
+            return stopping_ || pending_.size() >= batchSize_;
+        });
+        if (stopping_) {
+            break;
+        }
+        // Feed the model without holding the lock, the receive path keeps
+        // appending to the other buffer meanwhile
+        batch.swap(pending_);
+        lock.unlock();
+        for (const ReceivedPacket & p : batch) {
+            onnxinfer::OnReceived(
+                onnxInfer_, p.payloadType, p.sequenceNumber, p.sendTimestamp,
+                p.ssrc, p.paddingLength, p.headerLength, p.arrivalTimestamp,
+                p.payloadSize, p.lossCount, p.rtt);
+        }
+        batch.clear();
+
+        const Clock::time_point start = Clock::now();
+        const bool infer = start >= nextInference;
+        float estimate = 0;
+        if (infer) {
+            estimate = onnxinfer::GetBweEstimate(onnxInfer_);
+            nextInference = std::max(nextInference + interval_, start);
+        }
+        const Clock::time_point end = Clock::now();
+        lock.lock();
+        if (infer) {
+            const std::int64_t latencyUs =
+                std::chrono::duration_cast<std::chrono::microseconds>(end - start).count();
+            if (latencies_.size() < kLatencyWindow) {
+                latencies_.push_back(latencyUs);
+            } else {
+                latencies_[latencyCount_ % kLatencyWindow] = latencyUs;
+            }
+            ++latencyCount_;
+            estimate_ = estimate;
+            estimateTime_ = end;
+            hasEstimate_ = true;
+        }
+    }
+}
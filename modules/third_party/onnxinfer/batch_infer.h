@@ -0,0 +1,94 @@
+/**
+ * @file      batch_infer.h
+ * @brief     The header file of BatchInfer. BatchInfer runs an ONNXInfer model on a background worker, off the receive path.
+ * @repo      AlphaRTC
+ * @copyright Copyright (c) Microsoft Corporation. All rights reserved.
+ * @license   Licensed under the MIT License.
+ **/
+
+#ifndef MODULES_THIRD_PARTY_ONNXINFER_BATCH_INFER_H_
+#define MODULES_THIRD_PARTY_ONNXINFER_BATCH_INFER_H_
+
+#include <chrono>
+#include <condition_variable>
+#include <cstddef>
+#include <cstdint>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+namespace onnxinfer {
+    // Arguments of an onnxinfer::OnReceived call.
+    struct ReceivedPacket {
+        unsigned char payloadType;
+        unsigned short sequenceNumber;
+        unsigned int sendTimestamp;  // ms
+        unsigned int ssrc;
+        unsigned long paddingLength;
+        unsigned long headerLength;
+        unsigned long long arrivalTimestamp;  // ms
+        unsigned long payloadSize;  // bytes
+        int lossCount;
+        float rtt;  // sec
+    };
+
+    // Takes an ONNXInfer model off the receive path. Packets are appended to
+    // a batch of |batchSize| packets, a background worker feeds the batches
+    // to the model and runs the inference every |intervalMs|. The worker is
+    // the only thread calling into the model once BatchInfer is created, and
+    // it must be destroyed before the model. While the worker falls behind,
+    // a bounded number of batches wait for it and the oldest packets
+    // are dropped beyond that.
+    class BatchInfer {
+    public:
+        BatchInfer(void * onnxInfer, int intervalMs, std::size_t batchSize);
+        ~BatchInfer();
+
+        // Same arguments as onnxinfer::OnReceived, never blocks on the model.
+        void OnReceived(
+            unsigned char payloadType,
+            unsigned short sequenceNumber,
+            unsigned int sendTimestamp,
+            unsigned int ssrc,
+            unsigned long paddingLength,
+            unsigned long headerLength,
+            unsigned long long arrivalTimestamp,
+            unsigned long payloadSize,
+            int lossCount,
+            float rtt);
+
+        // Returns false until the first inference finished, otherwise the
+        // latest estimate (bps) and how long ago (in ms) it was made.
+        bool GetLatestEstimate(float * bandwidth, std::int64_t * ageMs);
+
+        // The model's GetInfo followed by the latency of the latest
+        // inferences and the packets dropped so far, e.g. "<model info>;
+        // inference latency (us): count 120, p50 812, p99 1630; dropped 0".
+        std::string GetInfo();
+
+    private:
+        void RunForever();
+
+        void * const onnxInfer_;
+        const std::chrono::milliseconds interval_;
+        const std::size_t batchSize_;
+
+        std::mutex mutex_;
+        std::condition_variable wakeup_;
+        std::vector<ReceivedPacket> pending_;
+        unsigned long long dropped_;
+        bool stopping_;
+        bool hasEstimate_;
+        float estimate_;
+        std::chrono::steady_clock::time_point estimateTime_;
+        // The latest inference latencies (us), a ring buffer
+        std::vector<std::int64_t> latencies_;
+        std::size_t latencyCount_;
+        std::string modelInfo_;
+
+        std::thread worker_;
+    };
+}
+
+#endif
@@ -0,0 +1,208 @@
+/**
+ * @file      BinarySink.cpp
+ * @brief     The c++ file of BinarySink. BinarySink appends StatsCollectModule records to a binary file, the compact alternative to the per-packet JSON log.
+ * @repo      AlphaRTC
+ * @copyright Copyright (c) Microsoft Corporation. All rights reserved.
+ * @license   Licensed under the MIT License.
+ **/
+
+#include "BinarySink.h"
+
+#include <cstring>
+
+#ifdef _WIN32
+#include <io.h>
+#else
+#include <unistd.h>
+#endif
+
+namespace StatCollect {
+
+    const char kSinkMagic[8] = {'S', 'C', 'B', 'I', 'N', 'A', 'R', 'Y'};
+    const std::uint32_t kSinkVersion = 1;
+    const std::size_t kSinkHeaderSize = 16;
+    const std::size_t kSinkRecordSize = 232;
+
+    // The writer thread is woken up early once this much is pending, and
+    // records are dropped rather than buffered beyond the limit.
+    const std::size_t kWakeupBytes = 64 * 1024;
+    const std::size_t kMaxPendingBytes = 16 * 1024 * 1024;
+
+    template <typename T>
+    static std::uint8_t* PutLittleEndian(std::uint8_t* dst, T value) {
+        for (std::size_t i = 0; i < sizeof(T); ++i) {
+            *dst++ = static_cast<std::uint8_t>(value >> (8 * i));
+        }
+        return dst;
+    }
+
+    static std::uint8_t* PutFloat(std::uint8_t* dst, float value) {
+        std::uint32_t bits;
+        std::memcpy(&bits, &value, sizeof(bits));
+        return PutLittleEndian<std::uint32_t>(dst, bits);
+    }
+
+    static std::uint8_t* PutDouble(std::uint8_t* dst, double value) {
+        std::uint64_t bits;
+        std::memcpy(&bits, &value, sizeof(bits));
+        return PutLittleEndian<std::uint64_t>(dst, bits);
+    }
+
+    static void EncodeRecord(const CollectInfo& info, std::uint8_t* p) {
+        const RTPHeader& header = info.packetInfo.header;
+        const VideoInfo& video = info.mediaInfo.videoInfo;
+        const AudioInfo& audio = info.mediaInfo.audioInfo;
+        p = PutLittleEndian<std::uint8_t>(p, header.payloadType);
+        p = PutLittleEndian<std::uint16_t>(p, header.sequenceNumber);
+        p = PutLittleEndian<std::uint32_t>(p, header.sendTimestamp);
+        p = PutLittleEndian<std::uint32_t>(p, header.ssrc);
+        p = PutLittleEndian<std::uint64_t>(p, header.paddingLength);
+        p = PutLittleEndian<std::uint64_t>(p, header.headerLength);
+        p = PutLittleEndian<std::uint64_t>(p, info.packetInfo.arrivalTimeMs);
+        p = PutLittleEndian<std::uint64_t>(p, info.packetInfo.payloadSize);
+        p = PutFloat(p, info.packetInfo.lossRate);
+        p = PutLittleEndian<std::uint64_t>(p, video.framesCaptured);
+        p = PutLittleEndian<std::uint64_t>(p, video.framesSent);
+        p = PutLittleEndian<std::uint64_t>(p, video.hugeFramesSent);
+        p = PutLittleEndian<std::uint64_t>(p, video.keyFramesSent);
+        p = PutDouble(p, video.jitterBufferDelay);
+        p = PutLittleEndian<std::uint64_t>(p, video.jitterBufferEmittedCount);
+        p = PutLittleEndian<std::uint64_t>(p, video.framesReceived);
+        p = PutLittleEndian<std::uint64_t>(p, video.keyFramesReceived);
+        p = PutLittleEndian<std::uint64_t>(p, video.framesDecoded);
+        p = PutLittleEndian<std::uint64_t>(p, video.framesDropped);
+        p = PutLittleEndian<std::uint64_t>(p, video.partialFramesLost);
+        p = PutLittleEndian<std::uint64_t>(p, video.fullFramesLost);
+        p = PutDouble(p, audio.echoReturnLoss);
+        p = PutDouble(p, audio.echoReturnLossEnhancement);
+        p = PutLittleEndian<std::uint64_t>(p, audio.totalSamplesSent);
+        p = PutLittleEndian<std::uint64_t>(p, audio.estimatedPlayoutTimestamp);
+        p = PutDouble(p, audio.jitterBufferDelay);
+        p = PutLittleEndian<std::uint64_t>(p, audio.jitterBufferEmittedCount);
+        p = PutLittleEndian<std::uint64_t>(p, audio.totalSamplesReceived);
+        p = PutLittleEndian<std::uint64_t>(p, audio.concealedSamples);
+        p = PutLittleEndian<std::uint64_t>(p, audio.concealmentEvents);
+        p = PutLittleEndian<std::uint8_t>(p, info.hastransportSequenceNumber ? 1 : 0);
+        p = PutDouble(p, info.pacerPacingRate);
+        PutDouble(p, info.pacerPaddingRate);
+    }
+
+    static bool TruncateFile(FILE* file, long size) {
+        if (fflush(file) != 0) {
+            return false;
+        }
+#ifdef _WIN32
+        return _chsize_s(_fileno(file), size) == 0;
+#else
+        return ftruncate(fileno(file), size) == 0;
+#endif
+    }
+
+    BinarySink* BinarySink::Open(const std::string& path, int flushIntervalMs) {
+        // "ab+" always writes at the end and lets the header be read back
+        FILE* file = fopen(path.c_str(), "ab+");
+        if (file == NULL) {
+            return NULL;
+        }
+        std::uint8_t header[kSinkHeaderSize];
+        std::memcpy(header, kSinkMagic, sizeof(kSinkMagic));
+        std::uint8_t* p = PutLittleEndian<std::uint32_t>(header + 8, kSinkVersion);
+        PutLittleEndian<std::uint32_t>(p, kSinkRecordSize);
+        if (fseek(file, 0, SEEK_END) != 0) {
+            fclose(file);
+            return NULL;
+        }
+        const long size = ftell(file);
+        if (size == 0) {
+            // An empty file gets the header first
+            if (fwrite(header, 1, sizeof(header), file) != sizeof(header)) {
+                fclose(file);
+                return NULL;
+            }
+        } else {
+            // Only records of the same layout are appended to an existing file
+            std::uint8_t existing[kSinkHeaderSize];
+            if (size < 0 || fseek(file, 0, SEEK_SET) != 0 ||
+                fread(existing, 1, sizeof(existing), file) != sizeof(existing) ||
+                std::memcmp(existing, header, sizeof(header)) != 0) {
+                fclose(file);
+                return NULL;
+            }
+            // Records appended after a partial one would all be misaligned
+            const long partial = static_cast<long>(
+                (size - kSinkHeaderSize) % kSinkRecordSize);
+            if ((partial != 0 && !TruncateFile(file, size - partial)) ||
+                fseek(file, 0, SEEK_END) != 0) {
+                fclose(file);
+                return NULL;
+            }
+        }
+        return new BinarySink(file, flushIntervalMs);
+    }
+
+    BinarySink::BinarySink(FILE* file, int flushIntervalMs)
+        : file_(file),
+          flushInterval_(flushIntervalMs > 0 ? flushIntervalMs : 1000),
+          dropped_(0),
+          stopping_(false) {
+        pending_.reserve(kWakeupBytes);
+        writer_ = std::thread(&BinarySink::WriteForever, this);
+    }
+
+    BinarySink::~BinarySink() {
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            stopping_ = true;
+        }
+        wakeup_.notify_one();
+        writer_.join();
+        fclose(file_);
+    }
+
+    void BinarySink::Append(const CollectInfo& collectInfo) {
+        std::uint8_t record[kSinkRecordSize];
+        EncodeRecord(collectInfo, record);
+        bool wakeup = false;
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            if (pending_.size() + kSinkRecordSize > kMaxPendingBytes) {
+                ++dropped_;
+                return;
+            }
+            pending_.insert(pending_.end(), record, record + kSinkRecordSize);
+            wakeup = pending_.size() >= kWakeupBytes;
+        }
+        if (wakeup) {
+            wakeup_.notify_one();
+        }
+    }
+
+    unsigned long long BinarySink::Dropped() {
+        std::lock_guard<std::mutex> lock(mutex_);
+        return dropped_;
+    }
+
+    void BinarySink::WriteForever() {
+        std::vector<std::uint8_t> batch;
+        batch.reserve(kWakeupBytes);
+        std::unique_lock<std::mutex> lock(mutex_);
+        while (true) {
+            wakeup_.wait_for(lock, flushInterval_, [this] {
+                return stopping_ || pending_.size() >= kWakeupBytes;
+            });
+            // Swap the buffers, the file is written without holding the lock
+            batch.swap(pending_);
+            const bool stopping = stopping_;
+            lock.unlock();
+            if (!batch.empty()) {
+                fwrite(batch.data(), 1, batch.size(), file_);
+                fflush(file_);
+                batch.clear();
+            }
+            if (stopping) {
+                return;
+            }
+            lock.lock();
+        }
+    }
+}  // namespace StatCollect
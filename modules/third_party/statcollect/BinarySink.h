@@ -0,0 +1,85 @@
+/**
+ * @file      BinarySink.h
+ * @brief     The header file of BinarySink. BinarySink appends StatsCollectModule records to a binary file, the compact alternative to the per-packet JSON log.
+ * @repo      AlphaRTC
+ * @copyright Copyright (c) Microsoft Corporation. All rights reserved.
+ * @license   Licensed under the MIT License.
+ **/
+
+#ifndef STATES_COLLECTION_BINARY_SINK_H_
+#define STATES_COLLECTION_BINARY_SINK_H_
+
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <cstdio>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include "StatCollect.h"
+
+namespace StatCollect {
+    /**
+     ** File layout (all integers little-endian), see binary_sink.py:
+     **   header:  char[8] magic "SCBINARY", uint32 version, uint32 record size
+     **   records: fixed-width rows with the columns of extract.SCHEMA,
+     **            packed in the order of the CollectInfo struct
+     ** A file reopened by a later run is appended to if its header matches,
+     ** the header is only written to an empty file. A partial record left at
+     ** the end by an interrupted run is cut off before appending.
+    **/
+    extern const char kSinkMagic[8];
+    extern const std::uint32_t kSinkVersion;
+    extern const std::size_t kSinkHeaderSize;
+    extern const std::size_t kSinkRecordSize;
+
+    class BinarySink {
+    public:
+        /**
+         ** Open the file at path for appending and start the writer thread.
+         ** @param  const std::string& path,            the output file
+         ** @param  int                flushIntervalMs, the longest time a record waits in memory
+         ** return: the sink  if successfully opened
+                    NULL      if the file can not be opened, or if it is not
+                              empty and its header does not match this
+                              version and record size.
+        */
+        static BinarySink* Open(const std::string& path, int flushIntervalMs = 1000);
+
+        /**
+         ** Write the pending records, stop the writer thread and close the file.
+        */
+        ~BinarySink();
+
+        /**
+         ** Encode a record into the pending buffer. Never touches the file, the
+         ** writer thread does. Records are dropped (and counted) while the
+         ** pending buffer is full.
+         ** @param  const CollectInfo& collectInfo,  the record
+        */
+        void Append(const CollectInfo& collectInfo);
+
+        /**
+         ** The number of records dropped so far.
+        */
+        unsigned long long Dropped();
+
+    private:
+        BinarySink(FILE* file, int flushIntervalMs);
+
+        void WriteForever();
+
+        FILE* const file_;
+        const std::chrono::milliseconds flushInterval_;
+        std::mutex mutex_;
+        std::condition_variable wakeup_;
+        std::vector<std::uint8_t> pending_;
+        unsigned long long dropped_;
+        bool stopping_;
+        std::thread writer_;
+    };
+}  // namespace StatCollect
+
+#endif
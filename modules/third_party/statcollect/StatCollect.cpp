@@ -10,6 +10,7 @@
  **/
 
 #include "StatCollect.h"
+#include "BinarySink.h"
 #include "json.hpp"
 
 namespace StatCollect {
@@ -37,11 +38,10 @@ namespace StatCollect {
     */
     StatsCollectModule::~StatsCollectModule() {
         while (!collectQueue_.empty()) {
-            void* tempPtr = collectQueue_.front();
-            free(tempPtr);
+            DeleteRecord(collectQueue_.front());
             collectQueue_.pop();
         }
-        free(queueMutex_);
+        delete queueMutex_;
     }
 
     /**
@@ -344,7 +344,7 @@ namespace StatCollect {
                 SC_TOTAL_SAMPLE_RECEIVED_EMPTY,
                 SC_CONCEALED_SAMPLES_EMPTY,
                 SC_CONCEALED_EVENTS_EMPTY);
-            std::string* tempStrPrt = &collectInfoJson;
+            std::string* tempStrPrt = new std::string(collectInfoJson);
             resultPtr = static_cast<void*>(tempStrPrt);
         }
         else {
@@ -666,42 +666,103 @@ namespace StatCollect {
     **========================================================
     */
     /**
-     ** Dump packet data
-     ** return: json string format if successfully
+     ** Dump packet data, every queued record in one call
+     ** return: json string format if successfully, one record per line
     */
     std::string StatsCollectModule::DumpData() {
-      std::string result;
+        std::string result;
+        DumpData(&result);
+        return result;
+    }
+
+    /**
+    **========================================================
+    ** StatsCollectInterface External Function DumpData
+    **========================================================
+    */
+    /**
+     ** Dump every queued record, the queue lock is only held to take them
+     ** @param  std::string* json,  receives the records appended as JSON lines
+     ** return: the number of records dumped
+    */
+    std::size_t StatsCollectModule::DumpData(std::string* json) {
         if (collectType_ != SC_TYPE_STRUCT && collectType_ != SC_TYPE_JSON) {
-            return result;
+            return 0;
         }
-        /* Using Json collet type to save into DB */
+        std::queue<void*> records;
         queueMutex_->lock();
-        while (!collectQueue_.empty()) {
-            CollectInfo* CollectInfoPtr = NULL;
-            std::string* dataJsonPtr = NULL;
+        records.swap(collectQueue_);
+        queueMutex_->unlock();
+
+        const std::size_t count = records.size();
+        while (!records.empty()) {
+            void* record = records.front();
+            records.pop();
+            if (!json->empty()) {
+                json->push_back('\n');
+            }
             if (collectType_ == SC_TYPE_STRUCT) {
-                CollectInfoPtr = (CollectInfo*)collectQueue_.front();
-              result = ConvertStructToJSON(CollectInfoPtr);            
+                json->append(ConvertStructToJSON(static_cast<CollectInfo*>(record)));
             }
-            else if (collectType_ == SC_TYPE_JSON) {
-                std::string* dataJsonPtr = static_cast<std::string*>(collectQueue_.front());
-              result = *dataJsonPtr;
-            }                     
-             collectQueue_.pop();
-            if (!result.empty()) {
-              if (collectType_ == SC_TYPE_STRUCT) {
-                delete CollectInfoPtr;
-              } else if (collectType_ == SC_TYPE_JSON) {
-                delete dataJsonPtr;
-              }
-            }           
+            else {
+                json->append(*static_cast<std::string*>(record));
+            }
+            DeleteRecord(record);
+        }
+        return count;
+    }
+
+    /**
+     ** Free a queued record of the current collect type
+     ** @param  void* record,  the record taken from collectQueue_
+    */
+    void StatsCollectModule::DeleteRecord(void* record) {
+        if (collectType_ == SC_TYPE_STRUCT) {
+            delete static_cast<CollectInfo*>(record);
+        }
+        else {
+            delete static_cast<std::string*>(record);
         }
-        
-        queueMutex_->unlock();  
-        
-        return result;
     }
   
+    /**
+     **========================================================
+     ** StatsCollectInterface External Function DumpToSink
+     **========================================================
+     */
+    /**
+     ** Move every queued record to a binary sink, only for SC_TYPE_STRUCT.
+     ** The queue lock is only held to take the records.
+     ** @param  BinarySink*  sink,  the binary sink
+     ** @param  std::string* json,  if not NULL, receives the records as JSON lines
+     ** return:
+     **         SC_COLLECT_TYPE_ERROR,if the collect type is not SC_TYPE_STRUCT.
+     **         SC_SUCCESS,           if the records were appended.
+     */
+    SCResult StatsCollectModule::DumpToSink(BinarySink* sink, std::string* json) {
+        if (collectType_ != SC_TYPE_STRUCT) {
+            return SC_COLLECT_TYPE_ERROR;
+        }
+        std::queue<void*> records;
+        queueMutex_->lock();
+        records.swap(collectQueue_);
+        queueMutex_->unlock();
+
+        while (!records.empty()) {
+            CollectInfo* CollectInfoPtr = static_cast<CollectInfo*>(records.front());
+            records.pop();
+            sink->Append(*CollectInfoPtr);
+            if (json != NULL) {
+                if (!json->empty()) {
+                    json->push_back('\n');
+                }
+                json->append(ConvertStructToJSON(CollectInfoPtr));
+            }
+            delete CollectInfoPtr;
+        }
+        return SC_SUCCESS;
+    }
+
     /**
      **========================================================
      ** StatsCollectInterface External Function SetStatsConfig
@@ -718,7 +779,14 @@ namespace StatCollect {
       if (collectType != 0 && collectType != 1) {
         return SC_COLLECT_TYPE_ERROR;
       }
+      // Queued records of the previous type can not be dumped any more
+      queueMutex_->lock();
+      while (!collectQueue_.empty()) {
+        DeleteRecord(collectQueue_.front());
+        collectQueue_.pop();
+      }
       collectType_ = collectType;
+      queueMutex_->unlock();
       return SC_SUCCESS;
     }
 }  // namespace StatCollect
\ No newline at end of file
@@ -195,6 +195,8 @@ namespace StatCollect {
         double    pacerPaddingRate;
     };
 
+    class BinarySink;
+
     class StatsCollectModule {
     public:
         /**
@@ -547,12 +549,42 @@ namespace StatCollect {
          **========================================================
          */
         /**
-         ** Dump packet data
-         ** return: json string format if successfully
+         ** Dump packet data, every queued record in one call
+         ** return: json string format if successfully, one record per line
         */
         std::string DumpData();
 
+        /**
+         **========================================================
+         ** StatsCollectInterface External Function DumpData
+         **========================================================
+         */
+        /**
+         ** Dump every queued record, the queue lock is only held to take them
+         ** @param  std::string* json,  receives the records appended as JSON lines
+         ** return: the number of records dumped
+        */
+        std::size_t DumpData(std::string* json);
+
+        /**
+         **========================================================
+         ** StatsCollectInterface External Function DumpToSink
+         **========================================================
+         */
+        /**
+         ** Move every queued record to a binary sink, only for SC_TYPE_STRUCT.
+         ** The queue lock is only held to take the records.
+         ** @param  BinarySink*  sink,  the binary sink
+         ** @param  std::string* json,  if not NULL, receives the records as JSON lines
+         ** return:
+         **         SC_COLLECT_TYPE_ERROR,if the collect type is not SC_TYPE_STRUCT.
+         **         SC_SUCCESS,           if the records were appended.
+         */
+        SCResult DumpToSink(BinarySink* sink, std::string* json);
+
     private:
+        void DeleteRecord(void* record);
+
         std::queue<void*>  collectQueue_;
         SCType collectType_;
         std::mutex* queueMutex_;
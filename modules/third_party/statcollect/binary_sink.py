@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Reads the binary statcollect files written by BinarySink.
+
+The records have the columns of extract.SCHEMA, so a file maps directly to
+a NumPy structured array without any parsing. Run with
+
+      python3 binary_sink.py [--json] FILE
+
+to print the number of records, or the records as JSON lines like the
+receiver log.
+"""
+
+import argparse
+import json
+import os
+import struct
+
+import numpy
+
+import extract
+
+
+# Must match BinarySink.cpp
+SINK_MAGIC = b"SCBINARY"
+SINK_VERSION = 1
+SINK_HEADER = struct.Struct("<8sII")
+
+
+def is_sink_file(path: str)->bool:
+    with open(path, "rb") as sink:
+        return sink.read(len(SINK_MAGIC)) == SINK_MAGIC
+
+
+def read_records(path: str):
+    '''
+    Returns the records of a sink file as a read-only memory-mapped
+    structured array of extract.DTYPE. A record cut short by a crashed
+    writer at the end of the file is ignored.
+    '''
+    with open(path, "rb") as sink:
+        header = sink.read(SINK_HEADER.size)
+    if len(header) < SINK_HEADER.size:
+        raise ValueError("{} is not a statcollect sink file".format(path))
+    magic, version, record_size = SINK_HEADER.unpack(header)
+    if magic != SINK_MAGIC or version != SINK_VERSION:
+        raise ValueError("{} is not a statcollect sink file".format(path))
+    if record_size != extract.DTYPE.itemsize:
+        raise ValueError("Unexpected record size {}".format(record_size))
+    count = (os.path.getsize(path) - SINK_HEADER.size) // record_size
+    if count == 0:
+        return numpy.zeros(0, dtype=extract.DTYPE)
+    return numpy.memmap(path, dtype=extract.DTYPE, mode="r",
+                        offset=SINK_HEADER.size, shape=(count,))
+
+
+def record_json(row)->dict:
+    '''
+    Returns a record in the nested form of the JSON log.
+    '''
+    record = {}
+    for name, _ in extract.SCHEMA:
+        parent = record
+        *parents, key = name.split(".")
+        for step in parents:
+            parent = parent.setdefault(step, {})
+        parent[key] = row[name].item()
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true",
+                        help="print the records as JSON lines")
+    parser.add_argument("path", help="the sink file")
+    args = parser.parse_args()
+    records = read_records(args.path)
+    if not args.json:
+        print(len(records))
+        return
+    for row in records:
+        print(json.dumps(record_json(row), sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
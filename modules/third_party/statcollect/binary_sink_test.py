@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 binary_sink_test.py
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy
+
+import binary_sink
+import extract
+import extract_test
+
+
+def write_sink(path: str, records: list, tail: bytes = b""):
+    rows = numpy.array([extract.record_row(record) for record in records],
+                       dtype=extract.DTYPE)
+    with open(path, "wb") as sink:
+        sink.write(binary_sink.SINK_HEADER.pack(
+            binary_sink.SINK_MAGIC, binary_sink.SINK_VERSION,
+            extract.DTYPE.itemsize))
+        sink.write(rows.tobytes() + tail)
+
+
+class TestBinarySink(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, "stats.bin")
+        self.records = [extract_test.statcollect_record(i) for i in range(5)]
+
+    def testRecordSize(self):
+        # BinarySink.cpp writes kSinkRecordSize bytes per record
+        self.assertEqual(extract.DTYPE.itemsize, 232)
+
+    def testReadRecords(self):
+        write_sink(self.path, self.records)
+        records = binary_sink.read_records(self.path)
+        self.assertEqual(len(records), 5)
+        self.assertEqual(list(records["packetInfo.header.sequenceNumber"]),
+                         [0, 1, 2, 3, 4])
+        self.assertEqual(records["packetInfo.header.ssrc"][0], 0xdeadbeef)
+
+    def testTruncatedRecordIgnored(self):
+        write_sink(self.path, self.records, tail=b"\0" * 100)
+        self.assertEqual(len(binary_sink.read_records(self.path)), 5)
+
+    def testEmptyFile(self):
+        write_sink(self.path, [])
+        self.assertEqual(len(binary_sink.read_records(self.path)), 0)
+
+    def testNotSinkFile(self):
+        with open(self.path, "w") as log:
+            log.write("(x.cc:1): not a sink file at all\n")
+        self.assertFalse(binary_sink.is_sink_file(self.path))
+        with self.assertRaises(ValueError):
+            binary_sink.read_records(self.path)
+
+    def testRecordJson(self):
+        write_sink(self.path, self.records)
+        record = binary_sink.record_json(binary_sink.read_records(self.path)[3])
+        self.assertEqual(extract.record_row(record),
+                         extract.record_row(self.records[3]))
+        self.assertEqual(record["packetInfo"]["header"]["payloadType"], 125)
+
+    def testExtractSinkFile(self):
+        write_sink(self.path, self.records)
+        output = os.path.join(self.directory, "stats.npy")
+        self.assertEqual(extract.extract(self.path, output), 5)
+        table = numpy.load(output)
+        self.assertEqual(list(table["packetInfo.arrivalTimeMs"] - 1600000000000),
+                         [0, 1, 2, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
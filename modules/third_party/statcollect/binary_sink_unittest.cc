@@ -0,0 +1,104 @@
+/**
+ * @file      binary_sink_unittest.cc
+ * @brief     The tests of BinarySink.
+ * @repo      AlphaRTC
+ * @copyright Copyright (c) Microsoft Corporation. All rights reserved.
+ * @license   Licensed under the MIT License.
+ **/
+
+#include "BinarySink.h"
+
+#include "test/gtest.h"
+#include "test/testsupport/file_utils.h"
+
+#include <cstdio>
+#include <memory>
+#include <string>
+#include <vector>
+
+namespace StatCollect {
+namespace {
+
+CollectInfo Record(unsigned short sequenceNumber) {
+    CollectInfo info = {};
+    info.packetInfo.header.sequenceNumber = sequenceNumber;
+    info.packetInfo.arrivalTimeMs = 1600000000000 + sequenceNumber;
+    return info;
+}
+
+std::vector<std::uint8_t> ReadFile(const std::string& path) {
+    std::vector<std::uint8_t> content;
+    FILE* file = fopen(path.c_str(), "rb");
+    if (file == NULL) {
+        return content;
+    }
+    int c;
+    while ((c = fgetc(file)) != EOF) {
+        content.push_back(static_cast<std::uint8_t>(c));
+    }
+    fclose(file);
+    return content;
+}
+
+void WriteRecords(const std::string& path, unsigned short first, int count) {
+    std::unique_ptr<BinarySink> sink(BinarySink::Open(path, 10));
+    ASSERT_TRUE(sink);
+    for (int i = 0; i < count; ++i) {
+        sink->Append(Record(first + i));
+    }
+}
+
+// The sequence number right after the payload type of record i
+unsigned short SequenceNumber(const std::vector<std::uint8_t>& content, int i) {
+    const std::size_t offset = kSinkHeaderSize + i * kSinkRecordSize + 1;
+    return static_cast<unsigned short>(content[offset] | content[offset + 1] << 8);
+}
+
+class BinarySinkTest : public ::testing::Test {
+protected:
+    BinarySinkTest()
+        : path_(webrtc::test::TempFilename(webrtc::test::OutputPath(),
+                                           "binary_sink")) {}
+
+    ~BinarySinkTest() override { webrtc::test::RemoveFile(path_); }
+
+    const std::string path_;
+};
+
+TEST_F(BinarySinkTest, AppendsToMatchingFile) {
+    WriteRecords(path_, 0, 2);
+    WriteRecords(path_, 2, 1);
+    const std::vector<std::uint8_t> content = ReadFile(path_);
+    ASSERT_EQ(kSinkHeaderSize + 3 * kSinkRecordSize, content.size());
+    for (int i = 0; i < 3; ++i) {
+        EXPECT_EQ(i, SequenceNumber(content, i));
+    }
+}
+
+TEST_F(BinarySinkTest, CutsPartialRecordBeforeAppending) {
+    WriteRecords(path_, 0, 2);
+    // An interrupted run leaves part of a record behind
+    FILE* file = fopen(path_.c_str(), "ab");
+    ASSERT_TRUE(file != NULL);
+    const std::vector<std::uint8_t> partial(100, 0xff);
+    fwrite(partial.data(), 1, partial.size(), file);
+    fclose(file);
+
+    WriteRecords(path_, 2, 1);
+    const std::vector<std::uint8_t> content = ReadFile(path_);
+    ASSERT_EQ(kSinkHeaderSize + 3 * kSinkRecordSize, content.size());
+    for (int i = 0; i < 3; ++i) {
+        EXPECT_EQ(i, SequenceNumber(content, i));
+    }
+}
+
+TEST_F(BinarySinkTest, RefusesFileOfAnotherLayout) {
+    FILE* file = fopen(path_.c_str(), "wb");
+    ASSERT_TRUE(file != NULL);
+    fputs("not a sink file at all\n", file);
+    fclose(file);
+    EXPECT_EQ(nullptr, BinarySink::Open(path_, 10));
+}
+
+}  // namespace
+}  // namespace StatCollect
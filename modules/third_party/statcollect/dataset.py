@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Builds a training dataset from many webrtc logs.
+
+Every log is extracted into its own .npy shard (see extract.py) by a pool of
+processes, and index.json lists every trace of the dataset: call id, SSRC,
+time range and packet count, so training jobs can sample traces without
+scanning the shards. Logs whose size and modification time did not change
+since the previous build are skipped. Call ids are relative to the log root
+of the first build, which the index keeps. Run with
+
+      python3 dataset.py [--jobs N] [--log-root DIR] -o DATASET LOGS [LOGS ...]
+
+where LOGS are log files, directories or glob patterns.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+
+import numpy
+
+import extract
+
+
+INDEX_NAME = "index.json"
+INDEX_VERSION = 2
+
+
+def find_logs(patterns: list)->list:
+    logs = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                logs.extend(os.path.join(root, name) for name in names
+                            if name.endswith(".log"))
+        else:
+            logs.extend(glob.glob(pattern))
+    return sorted(set(os.path.abspath(log) for log in logs))
+
+
+def call_id(log: str, root: str)->str:
+    '''
+    Name of the call recorded by log, its path relative to root without
+    extension.
+    '''
+    return os.path.splitext(os.path.relpath(log, root))[0].replace(
+        os.sep, "/")
+
+
+def shard_name(call: str)->str:
+    '''
+    File name of the shard of a call, its base name for readability and a
+    hash of the whole call id so that distinct calls never share a shard.
+    '''
+    digest = hashlib.sha256(call.encode("utf-8")).hexdigest()[:32]
+    return "{}-{}.npy".format(os.path.basename(call), digest)
+
+
+def trace_entries(call: str, shard: str, table)->list:
+    '''
+    Returns one index entry per SSRC found in a shard.
+    '''
+    ssrcs = table["packetInfo.header.ssrc"]
+    arrivals = table["packetInfo.arrivalTimeMs"]
+    entries = []
+    for ssrc in numpy.unique(ssrcs):
+        mask = ssrcs == ssrc
+        entries.append({
+            "call_id": call,
+            "shard": shard,
+            "ssrc": int(ssrc),
+            "start_ms": int(arrivals[mask].min()),
+            "end_ms": int(arrivals[mask].max()),
+            "packets": int(mask.sum()),
+        })
+    return entries
+
+
+def build_shard(task):
+    '''
+    Extracts one log into its shard and returns its index entries.
+    '''
+    log, call, output_dir = task
+    shard = shard_name(call)
+    path = os.path.join(output_dir, shard)
+    # Readers never see a partially written shard
+    temporary = path + ".tmp"
+    extract.extract(log, temporary)
+    os.replace(temporary, path)
+    return log, trace_entries(call, shard, numpy.load(path, mmap_mode="r"))
+
+
+def load_index(output_dir: str)->dict:
+    try:
+        with open(os.path.join(output_dir, INDEX_NAME), "r") as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return {"version": INDEX_VERSION, "log_root": None, "sources": {},
+                "traces": []}
+    if index.get("version") != INDEX_VERSION:
+        return {"version": INDEX_VERSION, "log_root": None, "sources": {},
+                "traces": []}
+    return index
+
+
+def choose_log_root(logs: list, log_root: str, previous: dict)->str:
+    '''
+    Returns the log root of the build: the one of the previous build, which
+    log_root must match if given, else log_root or the common directory of
+    the logs. Raises ValueError if a log is outside of it.
+    '''
+    if log_root is not None:
+        log_root = os.path.abspath(log_root)
+    if previous["log_root"] is not None:
+        if log_root is not None and log_root != previous["log_root"]:
+            raise ValueError(
+                "dataset was built with log root {}, not {}".format(
+                    previous["log_root"], log_root))
+        log_root = previous["log_root"]
+    elif log_root is None:
+        log_root = os.path.commonpath(
+            [os.path.dirname(log) for log in logs]) if logs else os.getcwd()
+    for log in logs:
+        if os.path.relpath(log, log_root).startswith(os.pardir):
+            raise ValueError("{} is not under the log root {}".format(
+                log, log_root))
+    return log_root
+
+
+def save_index(output_dir: str, index: dict):
+    path = os.path.join(output_dir, INDEX_NAME)
+    with open(path + ".tmp", "w") as index_file:
+        json.dump(index, index_file, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def build(logs: list, output_dir: str, jobs: int = 1, log_root: str = None):
+    '''
+    Extracts the logs that changed since the last build into output_dir
+    and rewrites its index, the shards of logs left out are removed.
+    log_root defaults to the one of the previous build, see
+    choose_log_root. Returns the number of (built, skipped) logs.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    previous = load_index(output_dir)
+    log_root = choose_log_root(logs, log_root, previous)
+    sources = {}
+    traces = []
+    tasks = []
+    for log in logs:
+        stat = os.stat(log)
+        call = call_id(log, log_root)
+        source = {"call_id": call, "size": stat.st_size,
+                  "mtime_ns": stat.st_mtime_ns}
+        sources[log] = source
+        old = previous["sources"].get(log)
+        if old == source and os.path.exists(
+                os.path.join(output_dir, shard_name(call))):
+            traces.extend(entry for entry in previous["traces"]
+                          if entry["call_id"] == call)
+        else:
+            tasks.append((log, call, output_dir))
+    if jobs > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.imap_unordered(build_shard, tasks)
+            for _, entries in results:
+                traces.extend(entries)
+    else:
+        for task in tasks:
+            traces.extend(build_shard(task)[1])
+    traces.sort(key=lambda entry: (entry["call_id"], entry["ssrc"]))
+    save_index(output_dir, {
+        "version": INDEX_VERSION, "log_root": log_root, "sources": sources,
+        "traces": traces})
+    shards = set(shard_name(source["call_id"]) for source in sources.values())
+    for source in previous["sources"].values():
+        stale = shard_name(source["call_id"])
+        if stale not in shards and os.path.exists(
+                os.path.join(output_dir, stale)):
+            os.remove(os.path.join(output_dir, stale))
+    return len(tasks), len(logs) - len(tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("logs", nargs="+",
+                        help="log files, directories or glob patterns")
+    parser.add_argument("-o", "--output", required=True,
+                        help="dataset directory")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="logs extracted in parallel")
+    parser.add_argument("--log-root",
+                        help="directory the call ids are relative to, "
+                        "defaults to the one of the previous build or the "
+                        "common directory of the logs")
+    args = parser.parse_args()
+    built, skipped = build(find_logs(args.logs), args.output, args.jobs,
+                           args.log_root)
+    print("{} logs extracted, {} unchanged".format(built, skipped))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 dataset_test.py
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy
+
+import dataset
+import extract_test
+
+
+def write_log(path: str, ssrcs: list, packets: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as log:
+        for ssrc in ssrcs:
+            for sequence_number in range(packets):
+                record = extract_test.statcollect_record(sequence_number)
+                record["packetInfo"]["header"]["ssrc"] = ssrc
+                log.write("(remote_estimator_proxy.cc:180): {}\n".format(
+                    json.dumps(record)))
+
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.logs = os.path.join(directory.name, "logs")
+        self.output = os.path.join(directory.name, "dataset")
+        write_log(os.path.join(self.logs, "a", "webrtc.log"), [1, 2], 3)
+        write_log(os.path.join(self.logs, "b", "webrtc.log"), [7], 4)
+
+    def read_index(self)->dict:
+        with open(os.path.join(self.output, dataset.INDEX_NAME)) as index:
+            return json.load(index)
+
+    def testBuildIndex(self):
+        logs = dataset.find_logs([self.logs])
+        self.assertEqual(dataset.build(logs, self.output, jobs=2), (2, 0))
+        traces = self.read_index()["traces"]
+        self.assertEqual(
+            [(t["call_id"], t["ssrc"], t["packets"]) for t in traces],
+            [("a/webrtc", 1, 3), ("a/webrtc", 2, 3), ("b/webrtc", 7, 4)])
+        self.assertEqual(traces[2]["start_ms"], 1600000000000)
+        self.assertEqual(traces[2]["end_ms"], 1600000000003)
+        shard = numpy.load(os.path.join(self.output, traces[0]["shard"]))
+        self.assertEqual(len(shard), 6)
+
+    def testIncrementalBuild(self):
+        logs = dataset.find_logs([self.logs])
+        dataset.build(logs, self.output)
+        self.assertEqual(dataset.build(logs, self.output), (0, 2))
+        self.assertEqual(len(self.read_index()["traces"]), 3)
+        changed = os.path.join(self.logs, "b", "webrtc.log")
+        write_log(changed, [7, 8], 4)
+        self.assertEqual(dataset.build(logs, self.output), (1, 1))
+        self.assertEqual(
+            [t["ssrc"] for t in self.read_index()["traces"]], [1, 2, 7, 8])
+
+    def testSubsetKeepsCallIds(self):
+        logs = dataset.find_logs([self.logs])
+        dataset.build(logs, self.output)
+        shards = [t["shard"] for t in self.read_index()["traces"]]
+        # Only b: same call id and shard, a's shard goes away
+        self.assertEqual(dataset.build(logs[1:], self.output), (0, 1))
+        traces = self.read_index()["traces"]
+        self.assertEqual([(t["call_id"], t["shard"]) for t in traces],
+                         [("b/webrtc", shards[2])])
+        self.assertFalse(os.path.exists(os.path.join(self.output, shards[0])))
+        self.assertEqual(dataset.build(logs, self.output), (1, 1))
+        self.assertEqual([t["shard"] for t in self.read_index()["traces"]],
+                         shards)
+
+    def testLogRoot(self):
+        logs = dataset.find_logs([self.logs])
+        dataset.build(logs[:1], self.output, log_root=self.logs)
+        self.assertEqual(self.read_index()["traces"][0]["call_id"],
+                         "a/webrtc")
+        with self.assertRaises(ValueError):
+            dataset.build(logs, self.output, log_root=os.path.join(
+                self.logs, "a"))
+        outside = os.path.join(os.path.dirname(self.logs), "c", "webrtc.log")
+        write_log(outside, [3], 1)
+        with self.assertRaises(ValueError):
+            dataset.build(logs + [outside], self.output)
+
+    def testShardNames(self):
+        self.assertNotEqual(dataset.shard_name("a/b"),
+                            dataset.shard_name("a__b"))
+        self.assertTrue(dataset.shard_name("a/b").startswith("b-"))
+
+
+if __name__ == "__main__":
+    unittest.main()
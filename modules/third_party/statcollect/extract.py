@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Extracts statcollect records from webrtc logs into columnar files.
+
+Every record is parsed once and written with the typed schema of the
+StatCollect::CollectInfo struct, either as a memory-mappable NumPy .npy
+structured array (one fixed-width row per packet, the default) or as a .npz
+archive with one array per column. Logs are streamed in chunks, so memory
+stays bounded by the chunk size whatever the log size. Run with
+
+      python3 extract.py [--format npy|npz] [--jobs N] -o OUTPUT LOG [LOG ...]
+
+OUTPUT is a file for a single log, otherwise a directory receiving one
+output per log. Load the result with numpy.load(path, mmap_mode="r").
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+
+import numpy
+
+
+# Column name (the JSON path of the field) and type, in StatCollect.h order
+SCHEMA = [
+        ("packetInfo.header.payloadType", "u1"),
+        ("packetInfo.header.sequenceNumber", "<u2"),
+        ("packetInfo.header.sendTimestamp", "<u4"),
+        ("packetInfo.header.ssrc", "<u4"),
+        ("packetInfo.header.paddingLength", "<u8"),
+        ("packetInfo.header.headerLength", "<u8"),
+        ("packetInfo.arrivalTimeMs", "<i8"),
+        ("packetInfo.payloadSize", "<u8"),
+        ("packetInfo.lossRates", "<f4"),
+        ("mediaInfo.videoInfo.framesCaptured", "<u8"),
+        ("mediaInfo.videoInfo.framesSent", "<u8"),
+        ("mediaInfo.videoInfo.hugeFreameSent", "<u8"),
+        ("mediaInfo.videoInfo.keyFramesSent", "<u8"),
+        ("mediaInfo.videoInfo.videoJitterBufferDelay", "<f8"),
+        ("mediaInfo.videoInfo.videoJitterBufferEmittedCount", "<u8"),
+        ("mediaInfo.videoInfo.framesReceived", "<u8"),
+        ("mediaInfo.videoInfo.keyFramesReceived", "<u8"),
+        ("mediaInfo.videoInfo.framesDecoded", "<u8"),
+        ("mediaInfo.videoInfo.framesDroped", "<u8"),
+        ("mediaInfo.videoInfo.partialFramesLost", "<u8"),
+        ("mediaInfo.videoInfo.fullFramesLost", "<u8"),
+        ("mediaInfo.audioInfo.echoReturnLoss", "<f8"),
+        ("mediaInfo.audioInfo.echoReturnLossEnhancement", "<f8"),
+        ("mediaInfo.audioInfo.totalSamplesSent", "<u8"),
+        ("mediaInfo.audioInfo.estimatedPlayoutTimestamp", "<i8"),
+        ("mediaInfo.audioInfo.audioJitterBufferDelay", "<f8"),
+        ("mediaInfo.audioInfo.audioJitterBufferEmittedCount", "<u8"),
+        ("mediaInfo.audioInfo.totalSamplesReceived", "<u8"),
+        ("mediaInfo.audioInfo.concealedSamples", "<u8"),
+        ("mediaInfo.audioInfo.concealmentEvents", "<u8"),
+        ("hastransportSequenceNumber", "?"),
+        ("pacerPacingRate", "<f8"),
+        ("pacerPaddingRate", "<f8"),
+]
+
+DTYPE = numpy.dtype(SCHEMA)
+
+# Objects holding the fields, looked up once per record
+PARENTS = ["", "packetInfo", "packetInfo.header", "mediaInfo.videoInfo",
+           "mediaInfo.audioInfo"]
+FIELDS = [(PARENTS.index(name.rpartition(".")[0]), name.rpartition(".")[2])
+          for name, _ in SCHEMA]
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# Room for the row count of any file in the .npy header, which is written
+# before the rows are known and patched in place at the end
+NPY_HEADER_COUNT = 10 ** 18
+
+
+def find_record(line: str):
+    '''
+    Returns the statcollect record logged on line, or None.
+    '''
+    if '"packetInfo"' not in line:
+        return None
+    start = line.find("{")
+    if start == -1:
+        return None
+    try:
+        record = json.loads(line[start:])
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def record_row(record: dict)->tuple:
+    '''
+    Returns the SCHEMA values of a record, missing fields are 0.
+    '''
+    packet = record.get("packetInfo") or {}
+    media = record.get("mediaInfo") or {}
+    parents = (record, packet, packet.get("header") or {},
+               media.get("videoInfo") or {}, media.get("audioInfo") or {})
+    return tuple([parents[parent].get(key, 0) for parent, key in FIELDS])
+
+
+def read_chunks(log_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    '''
+    Yields the records of a log, or of a BinarySink file, as structured
+    arrays of at most chunk_size rows.
+    '''
+    import binary_sink  # imports this module
+    if binary_sink.is_sink_file(log_path):
+        records = binary_sink.read_records(log_path)
+        for start in range(0, len(records), chunk_size):
+            yield numpy.array(records[start:start + chunk_size])
+        return
+    rows = []
+    with open(log_path, "r", errors="replace") as log:
+        for line in log:
+            record = find_record(line)
+            if record is None:
+                continue
+            rows.append(record_row(record))
+            if len(rows) == chunk_size:
+                yield numpy.array(rows, dtype=DTYPE)
+                rows = []
+    if rows:
+        yield numpy.array(rows, dtype=DTYPE)
+
+
+def npy_header(dtype, count: int)->bytes:
+    '''
+    Returns a version 1.0 .npy header for a 1-d array of count rows, padded
+    to the length of a header for NPY_HEADER_COUNT rows.
+    '''
+    def header(rows):
+        return repr({
+            "descr": numpy.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (rows,),
+        })
+    text = header(count)
+    # magic (6) + version (2) + length (2), the total is aligned to 64 bytes
+    length = len(header(NPY_HEADER_COUNT)) + 1
+    length += -(10 + length) % 64
+    text = text.ljust(length - 1) + "\n"
+    return (b"\x93NUMPY\x01\x00" + struct.pack("<H", len(text)) +
+            text.encode("latin1"))
+
+
+def write_npy(chunks, output_path: str)->int:
+    count = 0
+    with open(output_path, "wb") as output:
+        output.write(npy_header(DTYPE, 0))
+        for chunk in chunks:
+            output.write(chunk.tobytes())
+            count += len(chunk)
+        output.seek(0)
+        output.write(npy_header(DTYPE, count))
+    return count
+
+
+def write_npz(chunks, output_path: str)->int:
+    count = 0
+    with tempfile.TemporaryDirectory(
+            dir=os.path.dirname(os.path.abspath(output_path))) as spool:
+        columns = {name: open(os.path.join(spool, str(index)), "w+b")
+                   for index, (name, _) in enumerate(SCHEMA)}
+        for chunk in chunks:
+            for name, column in columns.items():
+                column.write(numpy.ascontiguousarray(chunk[name]).tobytes())
+            count += len(chunk)
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, column in columns.items():
+                column.seek(0)
+                with archive.open(
+                        name + ".npy", "w", force_zip64=True) as member:
+                    member.write(npy_header(DTYPE[name], count))
+                    shutil.copyfileobj(column, member)
+                column.close()
+    return count
+
+
+WRITERS = {"npy": write_npy, "npz": write_npz}
+
+
+def extract(log_path: str, output_path: str, output_format: str = "npy",
+            chunk_size: int = DEFAULT_CHUNK_SIZE)->int:
+    '''
+    Extracts one log and returns the number of records written.
+    '''
+    return WRITERS[output_format](
+        read_chunks(log_path, chunk_size), output_path)
+
+
+def extract_task(task):
+    log_path, output_path, output_format, chunk_size = task
+    return log_path, output_path, extract(
+        log_path, output_path, output_format, chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="webrtc logs to extract")
+    parser.add_argument("-o", "--output", required=True,
+                        help="output file, or directory for several logs")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="npy")
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="records parsed before they are written out")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="logs extracted in parallel")
+    args = parser.parse_args()
+
+    if len(args.logs) == 1 and not os.path.isdir(args.output):
+        tasks = [(args.logs[0], args.output, args.format, args.chunk_size)]
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        tasks = [(log, os.path.join(args.output, "{}.{}".format(
+            os.path.basename(log), args.format)), args.format, args.chunk_size)
+                 for log in args.logs]
+    if args.jobs > 1:
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = list(pool.imap_unordered(extract_task, tasks))
+    else:
+        results = [extract_task(task) for task in tasks]
+    for log_path, output_path, count in results:
+        print("{}: {} records -> {}".format(log_path, count, output_path))
+
+
+if __name__ == "__main__":
+    main()
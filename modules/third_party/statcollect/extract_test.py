@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Run the tests with
+
+      python3 extract_test.py
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy
+
+import extract
+
+
+def statcollect_record(sequence_number: int)->dict:
+    return {
+        "hastransportSequenceNumber": True,
+        "mediaInfo": {
+            "audioInfo": {"concealedSamples": 3, "echoReturnLoss": 1.5},
+            "videoInfo": {"framesDroped": 2},
+        },
+        "pacerPacingRate": 1.7976931348623157e+308,
+        "pacerPaddingRate": 300000.0,
+        "packetInfo": {
+            "arrivalTimeMs": 1600000000000 + sequence_number,
+            "header": {
+                "headerLength": 24,
+                "paddingLength": 0,
+                "payloadType": 125,
+                "sendTimestamp": 4000000000,
+                "sequenceNumber": sequence_number,
+                "ssrc": 0xdeadbeef,
+            },
+            "lossRates": 0.25,
+            "payloadSize": 1100,
+        },
+    }
+
+
+class TestExtract(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.log = os.path.join(self.directory.name, "webrtc.log")
+        with open(self.log, "w") as log:
+            log.write("(peer_connection.cc:1) unrelated line\n")
+            for sequence_number in range(5):
+                log.write("(remote_estimator_proxy.cc:180): {}\n".format(
+                    json.dumps(statcollect_record(sequence_number))))
+            log.write('(remote_estimator_proxy.cc:180): {"packetInfo": \n')
+
+    def testNpyIsMemoryMappable(self):
+        output = os.path.join(self.directory.name, "out.npy")
+        self.assertEqual(extract.extract(self.log, output, chunk_size=2), 5)
+        table = numpy.load(output, mmap_mode="r")
+        self.assertEqual(table.dtype, extract.DTYPE)
+        self.assertEqual(len(table), 5)
+        self.assertEqual(list(table["packetInfo.header.sequenceNumber"]),
+                         [0, 1, 2, 3, 4])
+        self.assertEqual(table["packetInfo.header.ssrc"][0], 0xdeadbeef)
+        self.assertEqual(table["packetInfo.header.sendTimestamp"][0],
+                         4000000000)
+        self.assertEqual(table["packetInfo.arrivalTimeMs"][4], 1600000000004)
+        self.assertEqual(table["mediaInfo.videoInfo.framesDroped"][0], 2)
+        self.assertEqual(table["mediaInfo.videoInfo.framesSent"][0], 0)
+        self.assertTrue(table["hastransportSequenceNumber"].all())
+        self.assertEqual(table["pacerPacingRate"][0], numpy.finfo("f8").max)
+
+    def testNpzColumns(self):
+        output = os.path.join(self.directory.name, "out.npz")
+        self.assertEqual(extract.extract(self.log, output, "npz", 2), 5)
+        with numpy.load(output) as columns:
+            self.assertEqual(set(columns.files),
+                             set(name for name, _ in extract.SCHEMA))
+            self.assertEqual(columns["packetInfo.payloadSize"].dtype,
+                             numpy.dtype("<u8"))
+            self.assertEqual(list(columns["packetInfo.payloadSize"]),
+                             [1100] * 5)
+            self.assertAlmostEqual(
+                float(columns["packetInfo.lossRates"][0]), 0.25)
+
+    def testBatchedRecords(self):
+        # A batched dump logs one message with a record per line, only the
+        # first line carries the log prefix
+        batched = os.path.join(self.directory.name, "batched.log")
+        with open(batched, "w") as log:
+            log.write("(remote_estimator_proxy.cc:390): {}\n".format(
+                "\n".join(json.dumps(statcollect_record(sequence_number))
+                          for sequence_number in range(3))))
+        output = os.path.join(self.directory.name, "batched.npy")
+        self.assertEqual(extract.extract(batched, output), 3)
+        self.assertEqual(
+            list(numpy.load(output)["packetInfo.header.sequenceNumber"]),
+            [0, 1, 2])
+
+    def testEmptyLog(self):
+        empty = os.path.join(self.directory.name, "empty.log")
+        open(empty, "w").close()
+        output = os.path.join(self.directory.name, "empty.npy")
+        self.assertEqual(extract.extract(empty, output), 0)
+        self.assertEqual(len(numpy.load(output)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,22 +2,39 @@ import sys
 import os
 import getopt
 
+USAGE = ("parse.py -i <inputfile> -o <outputfile>\n"
+         "parse.py -i <logs directory or glob> -d <dataset directory> [-j <jobs>]")
+
 def main(argv):
     file_name = "webrtc.log"
     out_file_name = "outdata.txt"
+    dataset_dir = None
+    jobs = os.cpu_count()
     try:
-        opts, args = getopt.getopt(argv,"hi:o:",["input=","output="])
+        opts, args = getopt.getopt(argv,"hi:o:d:j:",["input=","output=","dataset=","jobs="])
     except getopt.GetoptError:
-        print ("parse.py -i <inputfile> -o <outputfile>")
+        print (USAGE)
         sys.exit(2)
     for opt, arg in opts:
         if opt == '-h':
-            print ("parse.py -i <inputfile> -o <outputfile>")
+            print (USAGE)
             sys.exit()
         elif opt in ("-i", "--input"):
             file_name = arg
         elif opt in ("-o", "--output"):
             out_file_name = arg
+        elif opt in ("-d", "--dataset"):
+            dataset_dir = arg
+        elif opt in ("-j", "--jobs"):
+            jobs = int(arg)
+    if dataset_dir is not None:
+        # Dataset mode, one shard per log and an index (see dataset.py).
+        # Imported here since it needs NumPy.
+        import dataset
+        built, skipped = dataset.build(
+            dataset.find_logs([file_name] + args), dataset_dir, jobs)
+        print ("{} logs extracted, {} unchanged".format(built, skipped))
+        return
     substr = "{\"mediaInfo\":"
     f = open(out_file_name,"a")
     for line in open(file_name):
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # Copyright (c) 2019 The WebRTC project authors. All Rights Reserved.
 #
 # Use of this source code is governed by a BSD-style license
@@ -41,15 +41,16 @@ def main():
   metrics = []
   for line in fileinput.input():
     line = line.strip()
-    if line.startswith(LINE_PREFIX):
-      line = line.replace(LINE_PREFIX, '')
+    # Metrics may also be embedded in log lines, e.g. in webrtc.log
+    if LINE_PREFIX in line:
+      line = line[line.index(LINE_PREFIX) + len(LINE_PREFIX):]
       metrics.append(json.loads(line))
     else:
-      print line
+      print(line)
 
   for metric in metrics:
     figure = plt.figure()
-    figure.canvas.set_window_title(metric[TRACE_NAME])
+    figure.canvas.manager.set_window_title(metric[TRACE_NAME])
 
     x_values = []
     y_values = []
@@ -0,0 +1,245 @@
+#  Copyright (c) 2016 The WebRTC project authors. All Rights Reserved.
+#
+#  Use of this source code is governed by a BSD-style license
+#  that can be found in the LICENSE file in the root of the source
+#  tree. An additional intellectual property rights grant can be found
+#  in the file PATENTS.  All contributing project authors may
+#  be found in the AUTHORS file in the root of the source tree.
+
+"""Writes the RTP statistics of many RTC event logs to JSON or CSV.
+
+Non-interactive counterpart of rtp_analyzer.py: the SSRCs are selected by
+a rule instead of a prompt, the RTP clock rate is guessed, plots are only
+written to files and the logs are analyzed in a process pool.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import csv
+import fnmatch
+import json
+import multiprocessing
+import optparse
+import os
+import sys
+
+import matplotlib
+matplotlib.use("Agg")  # Plots are only saved, never shown.
+
+import numpy
+
+import packet_cache
+import pb_parse
+import rtp_analyzer
+
+SSRC_RULES = ("all", "incoming", "largest_video")
+# RTP clock rate of video streams in kHz
+VIDEO_FREQUENCY_KHZ = 90
+DELAY_PERCENTILES = (50, 90, 99)
+
+# Columns of the summaries, in the order of the CSV file
+SUMMARY_FIELDS = [
+    "log", "ssrc", "incoming", "packets", "payload_types",
+    "missing_packets", "loss_percent", "duplicated_packets",
+    "reordered_packets", "estimated_frequency_khz", "frequency_khz",
+    "sender_duration_s", "receiver_duration_s", "clock_drift_percent",
+    "send_bitrate_kbps", "receive_bitrate_kbps"] + [
+        "delay_p{}_ms".format(percentile)
+        for percentile in DELAY_PERCENTILES] + ["plots", "error"]
+
+
+def FindLogs(paths, pattern):
+  """Lists the event logs among paths and in the directories among them.
+
+  Args:
+      paths: files and directories, directories are searched recursively
+          for files matching pattern.
+      pattern: shell pattern of the event log file names.
+  """
+  logs = []
+  for path in paths:
+    if not os.path.isdir(path):
+      logs.append(path)
+      continue
+    for (directory, _, files) in sorted(os.walk(path)):
+      logs.extend(os.path.join(directory, name)
+                  for name in sorted(fnmatch.filter(files, pattern)))
+  return logs
+
+
+def SelectSsrcs(packets, rule, ssrc_index=None):
+  """Returns the SSRCs of packets selected by rule, one of SSRC_RULES.
+
+  largest_video is the SSRC of the most bytes among those whose RTP clock
+  runs at VIDEO_FREQUENCY_KHZ.
+
+  Args:
+      ssrc_index: packet_cache.SsrcIndex of packets, built if None.
+  """
+  if ssrc_index is None:
+    ssrc_index = packet_cache.SsrcIndex.Build(packets["ssrc"])
+  directions = rtp_analyzer.SsrcDirections(packets, ssrc_index)
+  if rule == "all":
+    return list(directions)
+  if rule == "incoming":
+    return [ssrc for ssrc in directions if directions[ssrc]]
+  videos = []
+  for ssrc in directions:
+    stats = SsrcStatistics(packets[ssrc_index.Rows(ssrc)], ssrc)
+    if (len(stats.data_points) > 1 and
+        stats.GuessFrequency()[1] == VIDEO_FREQUENCY_KHZ):
+      videos.append((stats.data_points["size"].sum(), ssrc))
+  return [max(videos)[1]] if videos else []
+
+
+def SsrcStatistics(packets, ssrc):
+  """Returns the RTPStatistics of packets, all of ssrc, unwrapped."""
+  stats = rtp_analyzer.RTPStatistics(packets)
+  stats.FilterSsrc(ssrc)
+  return stats
+
+
+def Summarize(packets, ssrc, plot_prefix=None):
+  """Computes the statistics rtp_analyzer.py prints for the packets of ssrc.
+
+  The send times, durations and delays need a standard RTP clock rate,
+  they are left out when none is close to the estimated one.
+
+  Args:
+      plot_prefix: if set, the delay and bandwidth plots are written to
+          files starting with it.
+
+  Returns:
+      dictionary with the SUMMARY_FIELDS but the log.
+  """
+  stats = SsrcStatistics(packets, ssrc)
+  points = stats.data_points
+  sequence_numbers = stats.SequenceNumberStatistics()
+  summary = {
+      "ssrc": "0x{:x}".format(ssrc),
+      "incoming": bool(points["incoming"][-1]),
+      "packets": len(points),
+      "payload_types": " ".join(
+          str(payload_type)
+          for payload_type in numpy.unique(points["payload_type"])),
+      "missing_packets": sequence_numbers["missing"],
+      "loss_percent": 100 * sequence_numbers["missing"] / (
+          sequence_numbers["missing"] + sequence_numbers["distinct"]),
+      "duplicated_packets": sequence_numbers["duplicated"],
+      "reordered_packets": sequence_numbers["reordered"],
+  }
+  if len(points) < 2 or points["timestamp"][-1] == points["timestamp"][0]:
+    summary["error"] = "Too few packets to estimate the RTP clock rate"
+    return summary
+  (freq_est, freq) = stats.GuessFrequency()
+  summary["estimated_frequency_khz"] = float(freq_est)
+  summary["frequency_khz"] = freq
+  if freq is None:
+    summary["error"] = "Frequency could not be guessed"
+    return summary
+  stats.SetFrequency(freq)
+  summary.update(stats.DurationStatistics())
+  for (percentile, delay) in zip(DELAY_PERCENTILES, numpy.percentile(
+      stats.data_points["absdelay"], DELAY_PERCENTILES)):
+    summary["delay_p{}_ms".format(percentile)] = float(delay)
+  if plot_prefix:
+    stats.RemoveReordered()
+    stats.ComputeBandwidth()
+    summary["plots"] = " ".join(stats.SavePlots(plot_prefix))
+  return summary
+
+
+def AnalyzeLog(task):
+  """Summarizes the selected SSRCs of a log, runs in the process pool.
+
+  Args:
+      task: (log path, SSRC rule, plot directory or None).
+
+  Returns:
+      list of summaries, a single one with the error if the log could not
+      be parsed or analyzed.
+  """
+  (log, rule, plot_directory) = task
+  summaries = []
+  try:
+    packets = pb_parse.ParsePackets(log)
+    ssrc_index = packet_cache.SsrcIndex.Build(packets["ssrc"])
+    for ssrc in SelectSsrcs(packets, rule, ssrc_index):
+      plot_prefix = None
+      if plot_directory:
+        plot_prefix = os.path.join(plot_directory, "{}_0x{:x}".format(
+            os.path.basename(log), ssrc))
+      summary = Summarize(packets[ssrc_index.Rows(ssrc)], ssrc, plot_prefix)
+      summary["log"] = log
+      summaries.append(summary)
+  # One bad log must not stop the batch
+  except Exception as error:  # pylint: disable=broad-except
+    return [{"log": log, "error": "{}: {}".format(type(error).__name__,
+                                                  error)}]
+  return summaries
+
+
+def WriteJson(summaries, path):
+  with open(path, "w") as f:
+    json.dump(summaries, f, indent=2, sort_keys=True)
+
+
+def WriteCsv(summaries, path):
+  with open(path, "w") as f:
+    writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, restval="")
+    writer.writeheader()
+    writer.writerows(summaries)
+
+
+def main():
+  usage = ("Usage: %prog [options] <rtc event logs or directories of "
+           "them>")
+  parser = optparse.OptionParser(usage=usage)
+  parser.add_option("--ssrcs", default="all", type="choice",
+                    choices=SSRC_RULES,
+                    help="SSRCs to analyze: all, incoming or largest_video "
+                    "(default: %default)")
+  parser.add_option("--pattern", default="*",
+                    help="file name pattern of the logs in directories "
+                    "(default: %default)")
+  parser.add_option("--output_json", default=None,
+                    help="file to write the summaries to as JSON")
+  parser.add_option("--output_csv", default=None,
+                    help="file to write the summaries to as CSV")
+  parser.add_option("--plot_directory", default=None,
+                    help="directory to save the delay and bandwidth plots "
+                    "to, no plots without it")
+  parser.add_option("--jobs", default=multiprocessing.cpu_count(),
+                    type="int", help="processes (default: %default)")
+
+  (options, args) = parser.parse_args()
+
+  if len(args) < 1:
+    parser.print_help()
+    sys.exit(0)
+
+  logs = FindLogs(args, options.pattern)
+  if options.plot_directory and not os.path.isdir(options.plot_directory):
+    os.makedirs(options.plot_directory)
+  tasks = [(log, options.ssrcs, options.plot_directory) for log in logs]
+  pool = multiprocessing.Pool(max(1, min(options.jobs, len(tasks))))
+  try:
+    summaries = [summary for log_summaries in pool.imap(AnalyzeLog, tasks)
+                 for summary in log_summaries]
+  finally:
+    pool.close()
+    pool.join()
+
+  if options.output_json:
+    WriteJson(summaries, options.output_json)
+  if options.output_csv:
+    WriteCsv(summaries, options.output_csv)
+  if not options.output_json and not options.output_csv:
+    json.dump(summaries, sys.stdout, indent=2, sort_keys=True)
+    print()
+  print("Analyzed {} SSRCs in {} logs".format(len(summaries), len(logs)),
+        file=sys.stderr)
+
+if __name__ == "__main__":
+  main()
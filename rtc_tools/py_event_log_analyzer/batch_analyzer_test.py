@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#  Copyright (c) 2016 The WebRTC project authors. All Rights Reserved.
+#
+#  Use of this source code is governed by a BSD-style license
+#  that can be found in the LICENSE file in the root of the source
+#  tree. An additional intellectual property rights grant can be found
+#  in the file PATENTS.  All contributing project authors may
+#  be found in the AUTHORS file in the root of the source tree.
+
+"""Run the tests with
+
+      python3 batch_analyzer_test.py
+"""
+
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+MISSING_DEPENDENCIES = False  # pylint: disable=invalid-name
+try:
+  import batch_analyzer
+  from pb_parse_test import RtpEvent, SetCacheDirectory
+except ImportError:
+  MISSING_DEPENDENCIES = True
+
+VIDEO_SSRC = 0x1234
+AUDIO_SSRC = 0x5678
+SENT_SSRC = 0x9abc
+
+
+def CallEvents():
+  """A second of video, audio and outgoing video.
+
+  The video at 90 kHz loses 1 packet in 50 and gets 0.2 ms more delay every
+  packet, the audio at 48 kHz is lossless with a constant delay.
+  """
+  events = []
+  for i in range(100):
+    arrival_ms = 1000 + 10 * i
+    if i % 50 != 25:
+      events.append(RtpEvent(1000 * arrival_ms + 200 * i, VIDEO_SSRC,
+                             65500 + i, size=1000, rtp_timestamp=900 * i))
+    events.append(RtpEvent(1000 * arrival_ms, AUDIO_SSRC, i, size=100,
+                           rtp_timestamp=480 * i))
+    events.append(RtpEvent(1000 * arrival_ms, SENT_SSRC, i, size=1200,
+                           incoming=False, rtp_timestamp=900 * i))
+  return events
+
+
+class TestBatchAnalyzer(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.log = os.path.join(self.directory, "call.log")
+    with open(self.log, "wb") as f:
+      f.write(b"".join(CallEvents()))
+    SetCacheDirectory(self, os.path.join(self.directory, "cache"))
+
+  def testSelectSsrcs(self):
+    packets = batch_analyzer.pb_parse.ParsePackets(self.log)
+    self.assertEqual(batch_analyzer.SelectSsrcs(packets, "all"),
+                     [VIDEO_SSRC, AUDIO_SSRC, SENT_SSRC])
+    self.assertEqual(batch_analyzer.SelectSsrcs(packets, "incoming"),
+                     [VIDEO_SSRC, AUDIO_SSRC])
+    self.assertEqual(batch_analyzer.SelectSsrcs(packets, "largest_video"),
+                     [SENT_SSRC])
+
+  def testSummary(self):
+    (video, audio) = batch_analyzer.AnalyzeLog(
+        (self.log, "incoming", self.directory))
+    self.assertEqual(video["ssrc"], "0x1234")
+    self.assertEqual(video["packets"], 98)
+    self.assertEqual(video["missing_packets"], 2)
+    self.assertAlmostEqual(video["loss_percent"], 2)
+    self.assertEqual(video["duplicated_packets"], 0)
+    self.assertEqual(video["frequency_khz"], 90)
+    self.assertAlmostEqual(video["delay_p50_ms"], 9.9)
+    self.assertAlmostEqual(video["clock_drift_percent"], 2)
+    for path in video["plots"].split(" "):
+      self.assertTrue(os.path.isfile(path), path)
+    self.assertEqual(audio["frequency_khz"], 48)
+    self.assertEqual(audio["loss_percent"], 0)
+    self.assertEqual(audio["delay_p99_ms"], 0)
+    self.assertAlmostEqual(audio["send_bitrate_kbps"], 80, delta=1)
+    self.assertEqual(len(audio["plots"].split(" ")), 2)
+
+  def testUnreadableLog(self):
+    truncated = os.path.join(self.directory, "truncated.log")
+    with open(truncated, "wb") as f:
+      f.write(CallEvents()[0][:-2])
+    (summary,) = batch_analyzer.AnalyzeLog((truncated, "all", None))
+    self.assertEqual(summary["log"], truncated)
+    self.assertIn("Truncated", summary["error"])
+
+  def testFailingAnalysis(self):
+    # The plots can't be written under a regular file
+    (summary,) = batch_analyzer.AnalyzeLog((self.log, "incoming", self.log))
+    self.assertEqual(summary["log"], self.log)
+    self.assertIn("NotADirectoryError", summary["error"])
+
+  def testMain(self):
+    shutil.copy(self.log, os.path.join(self.directory, "other.log"))
+    output_json = os.path.join(self.directory, "summary.json")
+    output_csv = os.path.join(self.directory, "summary.csv")
+    subprocess.check_call([
+        sys.executable, batch_analyzer.__file__, "--ssrcs", "incoming",
+        "--pattern", "*.log", "--jobs", "2", "--output_json", output_json,
+        "--output_csv", output_csv, self.directory], stderr=subprocess.PIPE)
+    with open(output_json) as f:
+      summaries = json.load(f)
+    self.assertEqual([(os.path.basename(summary["log"]), summary["ssrc"])
+                      for summary in summaries],
+                     [("call.log", "0x1234"), ("call.log", "0x5678"),
+                      ("other.log", "0x1234"), ("other.log", "0x5678")])
+    with open(output_csv) as f:
+      rows = list(csv.DictReader(f))
+    self.assertEqual(len(rows), 4)
+    self.assertEqual(rows[0]["missing_packets"], "2")
+    self.assertEqual(rows[0]["plots"], "")
+
+
+if __name__ == "__main__":
+  if MISSING_DEPENDENCIES:
+    print("Missing numpy, matplotlib or protobuf, skipping test.")
+  else:
+    unittest.main()
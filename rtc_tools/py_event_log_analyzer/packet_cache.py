@@ -0,0 +1,233 @@
+#  Copyright (c) 2016 The WebRTC project authors. All Rights Reserved.
+#
+#  Use of this source code is governed by a BSD-style license
+#  that can be found in the LICENSE file in the root of the source
+#  tree. An additional intellectual property rights grant can be found
+#  in the file PATENTS.  All contributing project authors may
+#  be found in the AUTHORS file in the root of the source tree.
+
+"""On-disk cache of the packet tables parsed from RTC event logs.
+
+Entries are keyed by a hash of the log content, so a log that is copied or
+renamed is still found and one that changed is parsed again. The content is
+only hashed again when the path, size or modification time of the log
+changed. An entry holds the packet table and its SSRC index as .npy files,
+loaded memory-mapped. Least recently used entries are evicted once the cache
+outgrows its size.
+
+The cache is disabled unless RTC_EVENT_LOG_CACHE_DIR names its directory.
+RTC_EVENT_LOG_CACHE_SIZE_MB bounds its size, 2048 MB by default.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy
+
+CACHE_DIR_ENV = "RTC_EVENT_LOG_CACHE_DIR"
+CACHE_SIZE_ENV = "RTC_EVENT_LOG_CACHE_SIZE_MB"
+DEFAULT_CACHE_SIZE_MB = 2048
+# Part of the key, to be bumped when the entries change format
+CACHE_VERSION = b"2"
+_HASH_BLOCK_SIZE = 1 << 20
+
+# Content hashes of the logs by path, size and modification time
+_KEYS_DIRECTORY = ".keys"
+_PACKETS_FILE = "packets.npy"
+_INDEX_FILES = ("ssrcs.npy", "order.npy", "offsets.npy")
+
+
+class SsrcIndex(object):
+  """Rows of every SSRC in a packet table, in the order of the table.
+
+  Built with one stable sort of the SSRC column: the rows of ssrcs[i] are
+  order[offsets[i]:offsets[i + 1]]. The per-SSRC counts, sums and first or
+  last values are read from it without another pass over the table.
+  """
+
+  def __init__(self, ssrcs, order, offsets):
+    self.ssrcs = ssrcs
+    self.order = order
+    self.offsets = offsets
+
+  @classmethod
+  def Build(cls, ssrc_column):
+    order = numpy.argsort(ssrc_column, kind="stable")
+    sorted_ssrcs = ssrc_column[order]
+    starts = numpy.zeros(min(len(order), 1), dtype=numpy.int64)
+    starts = numpy.concatenate(
+        (starts, numpy.flatnonzero(numpy.diff(sorted_ssrcs)) + 1))
+    return cls(sorted_ssrcs[starts], order,
+               numpy.append(starts, len(order)).astype(numpy.int64))
+
+  def Rows(self, ssrc):
+    """Returns the rows of ssrc, empty if it has none."""
+    i = numpy.searchsorted(self.ssrcs, ssrc)
+    if i == len(self.ssrcs) or self.ssrcs[i] != ssrc:
+      return self.order[:0]
+    return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+  def Counts(self):
+    """Returns the number of rows of every SSRC."""
+    return numpy.diff(self.offsets)
+
+  def Sums(self, column):
+    """Returns the sums of a column of the table per SSRC."""
+    if not len(self.ssrcs):
+      return numpy.zeros(0, dtype=column.dtype)
+    return numpy.add.reduceat(column[self.order], self.offsets[:-1])
+
+  def FirstRows(self):
+    """Returns the first row of every SSRC."""
+    return self.order[self.offsets[:-1]]
+
+  def LastRows(self):
+    """Returns the last row of every SSRC."""
+    return self.order[self.offsets[1:] - 1]
+
+  def Arrays(self):
+    return (self.ssrcs, self.order, self.offsets)
+
+
+def HashFile(file_path):
+  """Returns the hex SHA-256 of the file content and CACHE_VERSION."""
+  digest = hashlib.sha256(CACHE_VERSION)
+  with open(file_path, "rb") as f:
+    block = f.read(_HASH_BLOCK_SIZE)
+    while block:
+      digest.update(block)
+      block = f.read(_HASH_BLOCK_SIZE)
+  return digest.hexdigest()
+
+
+class PacketCache(object):
+  """Packet tables of event logs stored in directory, up to max_bytes."""
+
+  def __init__(self, directory, max_bytes):
+    self.directory = directory
+    self.max_bytes = max_bytes
+
+  def Load(self, file_path, parse):
+    """Returns the packet table of an event log and its SsrcIndex.
+
+    Args:
+        file_path: path to protobuf file of RTC event stream
+        parse: function parsing file_path into a packet table, called when
+            the log is not in the cache yet.
+
+    Returns:
+        (packets, SsrcIndex), memory-mapped read-only from the cache unless
+        another process evicted the entry meanwhile.
+    """
+    entry = os.path.join(self.directory, self._ContentHash(file_path))
+    loaded = self._LoadEntry(entry)
+    if loaded is not None:
+      return loaded
+    packets = parse(file_path)
+    index = SsrcIndex.Build(packets["ssrc"])
+    # What is left of an entry being evicted is replaced
+    shutil.rmtree(entry, ignore_errors=True)
+    self._Store(entry, packets, index)
+    self.Evict(keep=entry)
+    return self._LoadEntry(entry) or (packets, index)
+
+  def _ContentHash(self, file_path):
+    """Returns the HashFile of file_path, hashed again only when changed."""
+    stat = os.stat(file_path)
+    digest = hashlib.sha256(CACHE_VERSION)
+    digest.update("{}\0{}\0{!r}".format(
+        os.path.abspath(file_path), stat.st_size,
+        stat.st_mtime).encode("utf-8"))
+    keys = os.path.join(self.directory, _KEYS_DIRECTORY)
+    key = os.path.join(keys, digest.hexdigest())
+    try:
+      with open(key) as f:
+        return f.read()
+    except IOError:
+      pass
+    content_hash = HashFile(file_path)
+    if not os.path.isdir(keys):
+      os.makedirs(keys)
+    (handle, staging) = tempfile.mkstemp(dir=keys, prefix=".staging-")
+    with os.fdopen(handle, "w") as f:
+      f.write(content_hash)
+    os.rename(staging, key)
+    return content_hash
+
+  def _LoadEntry(self, entry):
+    """Returns the packets and SsrcIndex of entry, None if it is missing or
+    partial, e.g. evicted by another process."""
+    try:
+      packets = numpy.load(os.path.join(entry, _PACKETS_FILE), mmap_mode="r")
+      index = SsrcIndex(*[numpy.load(os.path.join(entry, name), mmap_mode="r")
+                          for name in _INDEX_FILES])
+      # Marks the entry as recently used
+      os.utime(entry, None)
+    except (IOError, OSError, ValueError):
+      return None
+    return (packets, index)
+
+  def _Store(self, entry, packets, index):
+    if not os.path.isdir(self.directory):
+      os.makedirs(self.directory)
+    # Written aside then renamed, so concurrent readers only see complete
+    # entries
+    staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+    try:
+      numpy.save(os.path.join(staging, _PACKETS_FILE), packets)
+      for (name, array) in zip(_INDEX_FILES, index.Arrays()):
+        numpy.save(os.path.join(staging, name), array)
+      os.rename(staging, entry)
+    except OSError:
+      # Another process stored the same log meanwhile
+      if not os.path.isdir(entry):
+        raise
+    finally:
+      if os.path.isdir(staging):
+        shutil.rmtree(staging)
+
+  def Evict(self, keep=None):
+    """Removes the least recently used entries above max_bytes but keep.
+
+    The content hashes of the logs whose entry is gone are removed as well.
+    """
+    entries = []
+    for name in os.listdir(self.directory):
+      path = os.path.join(self.directory, name)
+      if name.startswith(".") or not os.path.isdir(path):
+        continue
+      size = sum(os.path.getsize(os.path.join(path, file_name))
+                 for file_name in os.listdir(path))
+      entries.append((os.path.getmtime(path), size, path))
+    total = sum(size for (_, size, _) in entries)
+    for (_, size, path) in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      if path != keep:
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+    keys = os.path.join(self.directory, _KEYS_DIRECTORY)
+    if not os.path.isdir(keys):
+      return
+    for name in os.listdir(keys):
+      if name.startswith("."):
+        continue
+      key = os.path.join(keys, name)
+      try:
+        with open(key) as f:
+          if not os.path.isdir(os.path.join(self.directory, f.read())):
+            os.remove(key)
+      except (IOError, OSError):
+        # Being written or removed by another process
+        pass
+
+
+def DefaultCache():
+  """Returns the PacketCache set up by the environment, None if disabled."""
+  directory = os.environ.get(CACHE_DIR_ENV)
+  if not directory:
+    return None
+  size_mb = int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE_MB))
+  return PacketCache(os.path.expanduser(directory), size_mb << 20)
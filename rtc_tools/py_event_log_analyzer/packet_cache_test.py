@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#  Copyright (c) 2016 The WebRTC project authors. All Rights Reserved.
+#
+#  Use of this source code is governed by a BSD-style license
+#  that can be found in the LICENSE file in the root of the source
+#  tree. An additional intellectual property rights grant can be found
+#  in the file PATENTS.  All contributing project authors may
+#  be found in the AUTHORS file in the root of the source tree.
+
+"""Run the tests with
+
+      python3 packet_cache_test.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+MISSING_NUMPY = False  # pylint: disable=invalid-name
+try:
+  import numpy
+  import packet_cache
+except ImportError:
+  MISSING_NUMPY = True
+
+PACKET_DTYPE = [("ssrc", "i8"), ("size", "i8")]
+
+
+class TestPacketCache(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.cache = packet_cache.PacketCache(
+        os.path.join(self.directory, "cache"), 1 << 20)
+    self.parsed = []
+
+  def WriteLog(self, name, content):
+    path = os.path.join(self.directory, name)
+    with open(path, "wb") as f:
+      f.write(content)
+    return path
+
+  def Parse(self, file_path):
+    """Makes a packet table of one packet per byte of the log."""
+    self.parsed.append(os.path.basename(file_path))
+    with open(file_path, "rb") as f:
+      content = bytearray(f.read())
+    packets = numpy.zeros(len(content), dtype=PACKET_DTYPE)
+    packets["ssrc"] = content
+    packets["size"] = numpy.arange(len(content))
+    return packets
+
+  def testSsrcIndex(self):
+    index = packet_cache.SsrcIndex.Build(numpy.array([5, 3, 5, 9, 3, 5]))
+    self.assertEqual(list(index.ssrcs), [3, 5, 9])
+    self.assertEqual(list(index.Rows(5)), [0, 2, 5])
+    self.assertEqual(list(index.Rows(3)), [1, 4])
+    self.assertEqual(list(index.Rows(4)), [])
+    self.assertEqual(list(index.Rows(10)), [])
+    self.assertEqual(list(index.Counts()), [2, 3, 1])
+    self.assertEqual(list(index.Sums(numpy.arange(6))), [5, 7, 3])
+    self.assertEqual(list(index.FirstRows()), [1, 0, 3])
+    self.assertEqual(list(index.LastRows()), [4, 5, 3])
+    empty = packet_cache.SsrcIndex.Build(numpy.zeros(0, dtype=numpy.int64))
+    self.assertEqual(list(empty.Rows(3)), [])
+    self.assertEqual(list(empty.Counts()), [])
+    self.assertEqual(list(empty.Sums(numpy.zeros(0))), [])
+
+  def testKeyedByContent(self):
+    log = self.WriteLog("a.log", b"\x01\x02\x01")
+    (packets, index) = self.cache.Load(log, self.Parse)
+    self.assertEqual(list(packets["size"]), [0, 1, 2])
+    self.assertEqual(list(index.Rows(1)), [0, 2])
+    # A copy is found, a change is parsed again
+    copy = self.WriteLog("b.log", b"\x01\x02\x01")
+    (cached, _) = self.cache.Load(copy, self.Parse)
+    self.assertIsInstance(cached, numpy.memmap)
+    self.assertEqual(cached.tolist(), packets.tolist())
+    self.WriteLog("a.log", b"\x01\x02")
+    (changed, _) = self.cache.Load(log, self.Parse)
+    self.assertEqual(len(changed), 2)
+    self.assertEqual(self.parsed, ["a.log", "a.log"])
+
+  def testHashedOnlyWhenChanged(self):
+    log = self.WriteLog("a.log", b"\x01\x02")
+    stat = os.stat(log)
+    self.cache.Load(log, self.Parse)
+    # Same path, size and modification time: the content is not read again
+    self.WriteLog("a.log", b"\x03\x04")
+    os.utime(log, (stat.st_atime, stat.st_mtime))
+    (packets, _) = self.cache.Load(log, self.Parse)
+    self.assertEqual(list(packets["ssrc"]), [1, 2])
+    os.utime(log, (stat.st_atime, stat.st_mtime + 1))
+    (packets, _) = self.cache.Load(log, self.Parse)
+    self.assertEqual(list(packets["ssrc"]), [3, 4])
+    self.assertEqual(self.parsed, ["a.log", "a.log"])
+
+  def testPartialEntryParsedAgain(self):
+    log = self.WriteLog("a.log", b"\x01\x02\x01")
+    self.cache.Load(log, self.Parse)
+    # Another process evicting the entry removed part of it
+    entry = os.path.join(self.cache.directory, packet_cache.HashFile(log))
+    os.remove(os.path.join(entry, "order.npy"))
+    (packets, index) = self.cache.Load(log, self.Parse)
+    self.assertEqual(list(packets["size"]), [0, 1, 2])
+    self.assertEqual(list(index.Rows(1)), [0, 2])
+    self.assertEqual(self.parsed, ["a.log", "a.log"])
+    shutil.rmtree(entry)
+    (packets, _) = self.cache.Load(log, self.Parse)
+    self.assertEqual(len(packets), 3)
+    self.assertEqual(self.parsed, ["a.log", "a.log", "a.log"])
+
+  def testDisabledByDefault(self):
+    previous = os.environ.pop(packet_cache.CACHE_DIR_ENV, None)
+    if previous is not None:
+      self.addCleanup(os.environ.__setitem__, packet_cache.CACHE_DIR_ENV,
+                      previous)
+    self.assertIsNone(packet_cache.DefaultCache())
+    os.environ[packet_cache.CACHE_DIR_ENV] = self.directory
+    self.addCleanup(os.environ.pop, packet_cache.CACHE_DIR_ENV)
+    self.assertEqual(packet_cache.DefaultCache().directory, self.directory)
+
+  def Entries(self):
+    return sorted(name for name in os.listdir(self.cache.directory)
+                  if not name.startswith("."))
+
+  def EntrySize(self, log):
+    entry = os.path.join(self.cache.directory, packet_cache.HashFile(log))
+    return sum(os.path.getsize(os.path.join(entry, name))
+               for name in os.listdir(entry))
+
+  def testLeastRecentlyUsedEvicted(self):
+    logs = [self.WriteLog(name, name.encode() * 1000)
+            for name in ("a", "b", "c")]
+    for (timestamp, log) in enumerate(logs):
+      self.cache.Load(log, self.Parse)
+      os.utime(os.path.join(self.cache.directory, packet_cache.HashFile(log)),
+               (timestamp, timestamp))
+    # Reading a makes b the least recently used
+    self.cache.Load(logs[0], self.Parse)
+    self.cache.max_bytes = self.EntrySize(logs[0]) + self.EntrySize(logs[2])
+    self.cache.Evict()
+    self.assertEqual(self.Entries(),
+                     sorted(packet_cache.HashFile(log)
+                            for log in (logs[0], logs[2])))
+    # The entry just stored stays even above the size
+    self.cache.max_bytes = 0
+    (packets, _) = self.cache.Load(logs[1], self.Parse)
+    self.assertEqual(len(packets), 1000)
+    self.assertEqual(self.Entries(), [packet_cache.HashFile(logs[1])])
+    self.assertEqual(self.parsed, ["a", "b", "c", "b"])
+    # Only the content hash of the remaining entry is kept
+    self.assertEqual(
+        len(os.listdir(os.path.join(self.cache.directory, ".keys"))), 1)
+
+if __name__ == "__main__":
+  if MISSING_NUMPY:
+    print("Missing numpy, skipping test.")
+  else:
+    unittest.main()
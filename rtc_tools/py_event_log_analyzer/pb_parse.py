@@ -9,10 +9,56 @@
 """Parses protobuf RTC dumps."""
 
 from __future__ import division
+import mmap
+import os
 import struct
+
+import numpy
+
+import packet_cache
 import pyproto.logging.rtc_event_log.rtc_event_log_pb2 as rtc_pb
 
 
+# Columns of the RTP packet table, one row per packet. Sequence numbers and
+# timestamps are wide enough to hold their unwrapped values.
+PACKET_DTYPE = numpy.dtype([
+    ("arrival_timestamp_ms", numpy.float64),
+    ("size", numpy.int64),
+    ("incoming", numpy.bool_),
+    ("sequence_number", numpy.int64),
+    ("timestamp", numpy.int64),
+    ("ssrc", numpy.int64),
+    ("payload_type", numpy.int64),
+    ("marker_bit", numpy.int64),
+])
+
+# Packets per array yielded by ReadPacketChunks
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# Protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+# Field numbers of rtc_event_log.proto
+_EVENT_STREAM_STREAM = 1
+_EVENT_TIMESTAMP_US = 1
+_EVENT_RTP_PACKET = 3
+_RTP_PACKET_INCOMING = 1
+_RTP_PACKET_PACKET_LENGTH = 3
+_RTP_PACKET_HEADER = 4
+
+# The fixed RTP header fields the packet table needs, RFC 3550 section 5.1
+_RTP_HEADER_DTYPE = numpy.dtype([
+    ("first2header_bytes", ">u2"),
+    ("sequence_number", ">u2"),
+    ("timestamp", ">u4"),
+    ("ssrc", ">u4"),
+])
+_RTP_HEADER_SIZE = _RTP_HEADER_DTYPE.itemsize
+
+
 class DataPoint(object):
   """Simple container class for RTP events."""
 
@@ -31,16 +77,30 @@ class DataPoint(object):
     self.payload_type = first2header_bytes & 0b01111111
     self.marker_bit = (first2header_bytes & 0b10000000) >> 7
 
+  @classmethod
+  def FromRow(cls, row):
+    """Builds a data point from the values of a PACKET_DTYPE row."""
+    point = cls.__new__(cls)
+    for (name, value) in zip(PACKET_DTYPE.names, row):
+      setattr(point, name, value)
+    return point
+
 
 def ParseProtobuf(file_path):
   """Parses RTC event log from protobuf file.
 
+  The packets come from the packet_cache when it is enabled.
+
   Args:
        file_path: path to protobuf file of RTC event stream
 
   Returns:
     all RTP packet events from the event stream as a list of DataPoints
   """
+  if packet_cache.DefaultCache() is not None:
+    return [DataPoint.FromRow(row)
+            for row in ParsePackets(file_path).tolist()]
+
   event_stream = rtc_pb.EventStream()
   with open(file_path, "rb") as f:
     event_stream.ParseFromString(f.read())
@@ -50,3 +110,206 @@ def ParseProtobuf(file_path):
                     event.timestamp_us, event.rtp_packet.incoming)
           for event in event_stream.stream
           if event.HasField("rtp_packet")]
+
+
+def DataPointsToArray(data_points):
+  """Returns data_points as a structured array of PACKET_DTYPE.
+
+  Args:
+       data_points: list of DataPoints, or an array of PACKET_DTYPE which is
+           returned as is.
+  """
+  if isinstance(data_points, numpy.ndarray):
+    return data_points
+  packets = numpy.zeros(len(data_points), dtype=PACKET_DTYPE)
+  for name in PACKET_DTYPE.names:
+    packets[name] = [getattr(point, name) for point in data_points]
+  return packets
+
+
+def _ReadVarint(buf, pos):
+  """Returns the varint at buf[pos] and the position after it."""
+  result = buf[pos]
+  if result < 0x80:
+    return (result, pos + 1)
+  result = 0
+  shift = 0
+  while True:
+    byte = buf[pos]
+    pos += 1
+    result |= (byte & 0x7f) << shift
+    if byte < 0x80:
+      return (result, pos)
+    shift += 7
+
+
+def _Fields(buf, pos, end):
+  """Yields the fields of the message in buf[pos:end].
+
+  Yields:
+    (field number, value) of the varint fields and (field number, (start,
+    stop)) of the length-delimited ones, which span buf[start:stop]. Fixed
+    size fields are skipped.
+  """
+  while pos < end:
+    (key, pos) = _ReadVarint(buf, pos)
+    wire_type = key & 0x7
+    if wire_type == _VARINT:
+      (value, pos) = _ReadVarint(buf, pos)
+      yield (key >> 3, value)
+    elif wire_type == _LENGTH_DELIMITED:
+      (length, pos) = _ReadVarint(buf, pos)
+      yield (key >> 3, (pos, pos + length))
+      pos += length
+    elif wire_type == _FIXED64:
+      pos += 8
+    elif wire_type == _FIXED32:
+      pos += 4
+    else:
+      raise ValueError("Unsupported wire type {} at byte {}".format(
+          wire_type, pos))
+  if pos != end:
+    raise ValueError("Truncated message at byte {}".format(end))
+
+
+def _ReadRtpEvent(buf, start, stop):
+  """Decodes an Event if it is an RTP packet.
+
+  Returns:
+    (timestamp_us, packet_length, incoming, (header start, header stop)), or
+    None for other events.
+  """
+  timestamp_us = 0
+  rtp_packet = None
+  for (field_number, value) in _Fields(buf, start, stop):
+    if field_number == _EVENT_TIMESTAMP_US and not isinstance(value, tuple):
+      # int64 is encoded as its two's complement
+      timestamp_us = value - (1 << 64) if value >= 1 << 63 else value
+    elif field_number == _EVENT_RTP_PACKET and isinstance(value, tuple):
+      rtp_packet = value
+  if rtp_packet is None:
+    return None
+  packet_length = 0
+  incoming = False
+  header = (0, 0)
+  for (field_number, value) in _Fields(buf, *rtp_packet):
+    if field_number == _RTP_PACKET_INCOMING:
+      incoming = bool(value)
+    elif field_number == _RTP_PACKET_PACKET_LENGTH:
+      packet_length = value
+    elif field_number == _RTP_PACKET_HEADER:
+      header = value
+  return (timestamp_us, packet_length, incoming, header)
+
+
+def _PacketArray(timestamps_us, sizes, incoming, headers):
+  """Builds an array of PACKET_DTYPE from the fields of the RTP events.
+
+  Args:
+       headers: bytearray of the first _RTP_HEADER_SIZE bytes of every
+           header, unpacked together.
+  """
+  rtp_headers = numpy.frombuffer(bytes(headers), dtype=_RTP_HEADER_DTYPE)
+  packets = numpy.empty(len(sizes), dtype=PACKET_DTYPE)
+  packets["arrival_timestamp_ms"] = numpy.array(timestamps_us,
+                                                dtype=numpy.int64) / 1000
+  packets["size"] = sizes
+  packets["incoming"] = incoming
+  packets["sequence_number"] = rtp_headers["sequence_number"]
+  packets["timestamp"] = rtp_headers["timestamp"]
+  packets["ssrc"] = rtp_headers["ssrc"]
+  packets["payload_type"] = rtp_headers["first2header_bytes"] & 0b01111111
+  packets["marker_bit"] = (rtp_headers["first2header_bytes"] &
+                           0b10000000) >> 7
+  return packets
+
+
+def ReadPacketChunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, ssrcs=None):
+  """Reads the RTP packet events of an RTC event log chunk by chunk.
+
+  Walks the EventStream wire format of the memory-mapped file instead of
+  parsing it whole, so the memory used is bounded by a chunk whatever the
+  size of the log. Events other than rtp_packet are skipped undecoded.
+
+  Args:
+       file_path: path to protobuf file of RTC event stream
+       chunk_size: number of packets per chunk, the last one may hold fewer
+       ssrcs: if not None, only the packets of these SSRCs are read, the
+           others are dropped before their header is unpacked
+
+  Yields:
+    arrays of PACKET_DTYPE, in the order of the event stream
+  """
+  wanted = None
+  if ssrcs is not None:
+    wanted = set(struct.pack("!I", ssrc) for ssrc in ssrcs)
+  with open(file_path, "rb") as f:
+    if os.fstat(f.fileno()).st_size == 0:
+      return
+    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      for chunk in _ReadPacketChunks(buf, chunk_size, wanted):
+        yield chunk
+    except IndexError:
+      raise ValueError("Truncated event log {}".format(file_path))
+    finally:
+      buf.close()
+
+
+def _ReadPacketChunks(buf, chunk_size, wanted):
+  """Yields the packets of the EventStream in buf, see ReadPacketChunks."""
+  (timestamps_us, sizes, incoming, headers) = ([], [], [], bytearray())
+  for (field_number, event) in _Fields(buf, 0, len(buf)):
+    if field_number != _EVENT_STREAM_STREAM or not isinstance(event, tuple):
+      continue
+    packet = _ReadRtpEvent(buf, *event)
+    if packet is None:
+      continue
+    (header_start, header_stop) = packet[3]
+    if header_stop - header_start < _RTP_HEADER_SIZE:
+      raise ValueError("RTP header of {} bytes at byte {}".format(
+          header_stop - header_start, header_start))
+    header = buf[header_start:header_start + _RTP_HEADER_SIZE]
+    if wanted is not None and header[8:12] not in wanted:
+      continue
+    timestamps_us.append(packet[0])
+    sizes.append(packet[1])
+    incoming.append(packet[2])
+    headers += header
+    if len(sizes) == chunk_size:
+      yield _PacketArray(timestamps_us, sizes, incoming, headers)
+      (timestamps_us, sizes, incoming, headers) = ([], [], [], bytearray())
+  if sizes:
+    yield _PacketArray(timestamps_us, sizes, incoming, headers)
+
+
+def _ReadPackets(file_path, ssrcs=None):
+  chunks = list(ReadPacketChunks(file_path, ssrcs=ssrcs))
+  if not chunks:
+    return numpy.zeros(0, dtype=PACKET_DTYPE)
+  return numpy.concatenate(chunks)
+
+
+def ParsePackets(file_path, ssrcs=None):
+  """Parses the RTP packet events of an RTC event log into one array.
+
+  Same packets as ParseProtobuf, read with ReadPacketChunks. When the
+  packet_cache is enabled, a log is only read the first time, later calls
+  return the table memory-mapped from the cache and select the SSRCs with
+  its index.
+
+  Args:
+       file_path: path to protobuf file of RTC event stream
+       ssrcs: if not None, only the packets of these SSRCs are read
+
+  Returns:
+    an array of PACKET_DTYPE, read-only if it comes from the cache
+  """
+  cache = packet_cache.DefaultCache()
+  if cache is None:
+    return _ReadPackets(file_path, ssrcs)
+  (packets, index) = cache.Load(file_path, _ReadPackets)
+  if ssrcs is None:
+    return packets
+  rows = [index.Rows(ssrc) for ssrc in set(ssrcs)]
+  return packets[numpy.sort(numpy.concatenate(rows))] if rows else packets[:0]
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#  Copyright (c) 2016 The WebRTC project authors. All Rights Reserved.
+#
+#  Use of this source code is governed by a BSD-style license
+#  that can be found in the LICENSE file in the root of the source
+#  tree. An additional intellectual property rights grant can be found
+#  in the file PATENTS.  All contributing project authors may
+#  be found in the AUTHORS file in the root of the source tree.
+
+"""Run the tests with
+
+      python3 pb_parse_test.py
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+MISSING_PROTOBUF = False  # pylint: disable=invalid-name
+try:
+  import numpy
+  import packet_cache
+  import pb_parse
+except ImportError:
+  MISSING_PROTOBUF = True
+
+
+def Varint(value):
+  encoded = bytearray()
+  value &= (1 << 64) - 1
+  while value >= 0x80:
+    encoded.append(value & 0x7f | 0x80)
+    value >>= 7
+  encoded.append(value)
+  return bytes(encoded)
+
+
+def VarintField(field_number, value):
+  return Varint(field_number << 3) + Varint(value)
+
+
+def BytesField(field_number, data):
+  return Varint(field_number << 3 | 2) + Varint(len(data)) + data
+
+
+def RtpEvent(timestamp_us, ssrc, sequence_number, size=100, incoming=True,
+             rtp_timestamp=None):
+  if rtp_timestamp is None:
+    rtp_timestamp = 1000 * sequence_number
+  header = struct.pack("!HHII", 0x80e0, sequence_number % 2**16,
+                       rtp_timestamp % 2**32, ssrc)
+  rtp_packet = (VarintField(1, incoming) + VarintField(3, size) +
+                BytesField(4, header + b"\x00" * 8) +
+                # probe_cluster_id, negative
+                VarintField(5, -1))
+  return BytesField(1, VarintField(1, timestamp_us) + VarintField(2, 3) +
+                    BytesField(3, rtp_packet))
+
+
+def OtherEvent(timestamp_us):
+  # An RTCP packet and a double in a fixed64 field
+  rtcp_packet = VarintField(1, 1) + BytesField(3, b"\x81" * 40)
+  return BytesField(1, VarintField(1, timestamp_us) + VarintField(2, 4) +
+                    BytesField(4, rtcp_packet) +
+                    Varint(9 << 3 | 1) + b"\x00" * 8)
+
+
+def SetCacheDirectory(test_case, directory):
+  """Points the packet_cache at directory for the duration of test_case."""
+  previous = os.environ.get(packet_cache.CACHE_DIR_ENV)
+  os.environ[packet_cache.CACHE_DIR_ENV] = directory
+  if previous is None:
+    test_case.addCleanup(os.environ.pop, packet_cache.CACHE_DIR_ENV)
+  else:
+    test_case.addCleanup(os.environ.__setitem__, packet_cache.CACHE_DIR_ENV,
+                         previous)
+
+
+class TestReadPacketChunks(unittest.TestCase):
+  def setUp(self):
+    (handle, self.path) = tempfile.mkstemp()
+    os.close(handle)
+    self.addCleanup(os.remove, self.path)
+    SetCacheDirectory(self, "")
+
+  def WriteLog(self, events):
+    with open(self.path, "wb") as f:
+      f.write(b"".join(events))
+
+  def testRtpPackets(self):
+    self.WriteLog([OtherEvent(5), RtpEvent(1500, 0xdeadbeef, 7, 1200),
+                   OtherEvent(6), RtpEvent(-2000, 1, 8, 60, False)])
+    packets = pb_parse.ParsePackets(self.path)
+    self.assertEqual(packets.dtype, pb_parse.PACKET_DTYPE)
+    self.assertEqual(list(packets["arrival_timestamp_ms"]), [1.5, -2.0])
+    self.assertEqual(list(packets["size"]), [1200, 60])
+    self.assertEqual(list(packets["incoming"]), [True, False])
+    self.assertEqual(list(packets["sequence_number"]), [7, 8])
+    self.assertEqual(list(packets["timestamp"]), [7000, 8000])
+    self.assertEqual(list(packets["ssrc"]), [0xdeadbeef, 1])
+    self.assertEqual(list(packets["payload_type"]), [96, 96])
+    self.assertEqual(list(packets["marker_bit"]), [1, 1])
+
+  def testChunksAndSsrcFilter(self):
+    self.WriteLog([RtpEvent(i, 1 + i % 3, i) for i in range(10)])
+    chunks = list(pb_parse.ReadPacketChunks(self.path, chunk_size=4))
+    self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+    self.assertEqual(list(numpy.concatenate(chunks)["sequence_number"]),
+                     list(range(10)))
+    packets = pb_parse.ParsePackets(self.path, ssrcs=[2, 3])
+    self.assertEqual(list(packets["sequence_number"]), [1, 2, 4, 5, 7, 8])
+
+  def testEmptyLog(self):
+    self.WriteLog([])
+    self.assertEqual(len(pb_parse.ParsePackets(self.path)), 0)
+
+  def testTruncatedLog(self):
+    self.WriteLog([RtpEvent(1, 1, 1)[:-3]])
+    with self.assertRaises(ValueError):
+      pb_parse.ParsePackets(self.path)
+
+
+class TestCachedParsing(TestReadPacketChunks):
+  def setUp(self):
+    super(TestCachedParsing, self).setUp()
+    cache_directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, cache_directory)
+    SetCacheDirectory(self, cache_directory)
+
+  def testCachedPackets(self):
+    self.WriteLog([RtpEvent(i, 1 + i % 3, i) for i in range(10)])
+    first = pb_parse.ParsePackets(self.path)
+    second = pb_parse.ParsePackets(self.path)
+    self.assertIsInstance(second, numpy.memmap)
+    self.assertEqual(first.tolist(), second.tolist())
+    packets = pb_parse.ParsePackets(self.path, ssrcs=[3, 2, 7])
+    self.assertEqual(list(packets["sequence_number"]), [1, 2, 4, 5, 7, 8])
+    self.assertEqual(len(pb_parse.ParsePackets(self.path, ssrcs=[])), 0)
+
+  def testDataPointsFromCache(self):
+    self.WriteLog([RtpEvent(1500, 0xdeadbeef, 7, 1200),
+                   RtpEvent(2000, 1, 8, 60, False)])
+    (point, _) = pb_parse.ParseProtobuf(self.path)
+    self.assertEqual(
+        (point.arrival_timestamp_ms, point.size, point.incoming,
+         point.sequence_number, point.timestamp, point.ssrc,
+         point.payload_type, point.marker_bit),
+        (1.5, 1200, True, 7, 7000, 0xdeadbeef, 96, 1))
+
+
+if __name__ == "__main__":
+  if MISSING_PROTOBUF:
+    print("Missing numpy or protobuf, skipping test.")
+  else:
+    unittest.main()
@@ -20,9 +20,16 @@ import matplotlib.pyplot as plt
 import numpy
 
 import misc
+import packet_cache
 import pb_parse
 
 
+# Columns RTPStatistics computes for every packet
+DERIVED_COLUMNS = ("real_send_time_ms", "delay", "absdelay")
+STATISTICS_DTYPE = numpy.dtype(pb_parse.PACKET_DTYPE.descr + [
+    (name, numpy.float64) for name in DERIVED_COLUMNS])
+
+
 class RTPStatistics(object):
   """Has methods for calculating and plotting RTP stream statistics."""
 
@@ -33,29 +40,36 @@ class RTPStatistics(object):
     """Initializes object with data_points and computes simple statistics.
 
     Computes percentages of number of packets and packet sizes by
-    SSRC.
+    SSRC, from an index of the packets of every SSRC shared by the
+    statistics.
 
     Args:
-        data_points: list of pb_parse.DataPoints on which statistics are
-            calculated.
+        data_points: list of pb_parse.DataPoints, or array of
+            pb_parse.PACKET_DTYPE, on which statistics are calculated.
 
     """
 
-    self.data_points = data_points
+    self.data_points = PacketTable(pb_parse.DataPointsToArray(data_points))
+    self.ssrc_index = packet_cache.SsrcIndex.Build(self.data_points["ssrc"])
+    ssrcs = self.ssrc_index.ssrcs.tolist()
     self.ssrc_frequencies = misc.NormalizeCounter(
-        collections.Counter([pt.ssrc for pt in self.data_points]))
-    self.ssrc_size_table = misc.SsrcNormalizedSizeTable(self.data_points)
+        dict(zip(ssrcs, self.ssrc_index.Counts().tolist())))
+    self.ssrc_size_table = misc.NormalizeCounter(dict(zip(
+        ssrcs, self.ssrc_index.Sums(self.data_points["size"]).tolist())))
     self.bandwidth_kbps = None
     self.smooth_bw_kbps = None
 
   def PrintHeaderStatistics(self):
     print("{:>6}{:>14}{:>14}{:>6}{:>6}{:>3}{:>11}".format(
         "SeqNo", "TimeStamp", "SendTime", "Size", "PT", "M", "SSRC"))
-    for point in self.data_points:
+    columns = [self.data_points[name].tolist() for name in (
+        "sequence_number", "timestamp", "arrival_timestamp_ms", "size",
+        "payload_type", "marker_bit", "ssrc")]
+    for (sequence_number, timestamp, arrival_timestamp_ms, size,
+         payload_type, marker_bit, ssrc) in zip(*columns):
       print("{:>6}{:>14}{:>14}{:>6}{:>6}{:>3}{:>11}".format(
-          point.sequence_number, point.timestamp,
-          int(point.arrival_timestamp_ms), point.size, point.payload_type,
-          point.marker_bit, "0x{:x}".format(point.ssrc)))
+          sequence_number, timestamp, int(arrival_timestamp_ms), size,
+          payload_type, marker_bit, "0x{:x}".format(ssrc)))
 
   def PrintSsrcInfo(self, ssrc_id, ssrc):
     """Prints packet and size statistics for a given SSRC.
@@ -64,11 +78,11 @@ class RTPStatistics(object):
         ssrc_id: textual identifier of SSRC printed beside statistics for it.
         ssrc: SSRC by which to filter data and display statistics
     """
-    filtered_ssrc = [point for point in self.data_points if point.ssrc
-                     == ssrc]
-    payloads = misc.NormalizeCounter(
-        collections.Counter([point.payload_type for point in
-                             filtered_ssrc]))
+    rows = self.ssrc_index.Rows(ssrc)
+    # In order of first appearance, like the Counter this replaced
+    (payloads, first_rows) = numpy.unique(
+        self.data_points["payload_type"][rows], return_index=True)
+    payloads = payloads[numpy.argsort(first_rows)].tolist()
 
     payload_info = "payload type(s): {}".format(
         ", ".join(str(payload) for payload in  payloads))
@@ -76,9 +90,8 @@ class RTPStatistics(object):
         ssrc_id, ssrc, payload_info, self.ssrc_frequencies[ssrc] * 100,
         self.ssrc_size_table[ssrc] * 100))
     print("  packet sizes:")
-    (bin_counts, bin_bounds) = numpy.histogram([point.size for point in
-                                                filtered_ssrc], bins=5,
-                                               density=False)
+    (bin_counts, bin_bounds) = numpy.histogram(self.data_points["size"][rows],
+                                               bins=5, density=False)
     bin_proportions = bin_counts / sum(bin_counts)
     print("\n".join([
         " {:.1f} - {:.1f}: {:.2f}%".format(bin_bounds[i], bin_bounds[i + 1],
@@ -90,11 +103,11 @@ class RTPStatistics(object):
     """Queries user for SSRC."""
 
     if len(self.ssrc_frequencies) == 1:
-      chosen_ssrc = self.ssrc_frequencies.keys()[0]
+      chosen_ssrc = list(self.ssrc_frequencies)[0]
       self.PrintSsrcInfo("", chosen_ssrc)
       return chosen_ssrc
 
-    ssrc_is_incoming = misc.SsrcDirections(self.data_points)
+    ssrc_is_incoming = SsrcDirections(self.data_points, self.ssrc_index)
     incoming = [ssrc for ssrc in ssrc_is_incoming if ssrc_is_incoming[ssrc]]
     outgoing = [ssrc for ssrc in ssrc_is_incoming if not ssrc_is_incoming[ssrc]]
 
@@ -119,36 +132,40 @@ class RTPStatistics(object):
     Removes data points with `ssrc != chosen_ssrc`. Unwraps sequence
     numbers and timestamps for the chosen selection.
     """
-    self.data_points = [point for point in self.data_points if
-                        point.ssrc == chosen_ssrc]
-    unwrapped_sequence_numbers = misc.Unwrap(
-        [point.sequence_number for point in self.data_points], 2**16 - 1)
-    for (data_point, sequence_number) in zip(self.data_points,
-                                             unwrapped_sequence_numbers):
-      data_point.sequence_number = sequence_number
-
-    unwrapped_timestamps = misc.Unwrap([point.timestamp for point in
-                                        self.data_points], 2**32 - 1)
-
-    for (data_point, timestamp) in zip(self.data_points,
-                                       unwrapped_timestamps):
-      data_point.timestamp = timestamp
+    self.data_points = self.data_points[self.ssrc_index.Rows(chosen_ssrc)]
+    self.ssrc_index = packet_cache.SsrcIndex.Build(self.data_points["ssrc"])
+    self.data_points["sequence_number"] = Unwrap(
+        self.data_points["sequence_number"], 2**16)
+    self.data_points["timestamp"] = Unwrap(self.data_points["timestamp"],
+                                           2**32)
+
+  def SequenceNumberStatistics(self):
+    """Counts missing, duplicated and reordered packets.
+
+    Returns:
+        dictionary with the number of distinct sequence numbers and the
+        missing, duplicated and reordered packet counts.
+    """
+    sequence_numbers = self.data_points["sequence_number"]
+    distinct = len(numpy.unique(sequence_numbers))
+    return {
+        "distinct": distinct,
+        "missing": int(sequence_numbers.max() - sequence_numbers.min() +
+                       (1 - distinct)),
+        "duplicated": len(sequence_numbers) - distinct,
+        "reordered": int(numpy.count_nonzero(
+            sequence_numbers[:-1] >= sequence_numbers[1:])),
+    }
 
   def PrintSequenceNumberStatistics(self):
-    seq_no_set = set(point.sequence_number for point in
-                     self.data_points)
-    missing_sequence_numbers = max(seq_no_set) - min(seq_no_set) + (
-        1 - len(seq_no_set))
+    statistics = self.SequenceNumberStatistics()
     print("Missing sequence numbers: {} out of {}  ({:.2f}%)".format(
-        missing_sequence_numbers,
-        len(seq_no_set),
-        100 * missing_sequence_numbers / len(seq_no_set)
+        statistics["missing"],
+        statistics["distinct"],
+        100 * statistics["missing"] / statistics["distinct"]
     ))
-    print("Duplicated packets: {}".format(len(self.data_points) -
-                                          len(seq_no_set)))
-    print("Reordered packets: {}".format(
-        misc.CountReordered([point.sequence_number for point in
-                             self.data_points])))
+    print("Duplicated packets: {}".format(statistics["duplicated"]))
+    print("Reordered packets: {}".format(statistics["reordered"]))
 
   def EstimateFrequency(self, always_query_sample_rate):
     """Estimates frequency and updates data.
@@ -158,17 +175,7 @@ class RTPStatistics(object):
     sending time of packets. Updates `self.data_points` with changes
     in delay and send time.
     """
-    delta_timestamp = (self.data_points[-1].timestamp -
-                       self.data_points[0].timestamp)
-    delta_arr_timestamp = float((self.data_points[-1].arrival_timestamp_ms -
-                                 self.data_points[0].arrival_timestamp_ms))
-    freq_est = delta_timestamp / delta_arr_timestamp
-
-    freq_vec = [8, 16, 32, 48, 90]
-    freq = None
-    for f in freq_vec:
-      if abs((freq_est - f) / f) < 0.05:
-        freq = f
+    (freq_est, freq) = self.GuessFrequency()
 
     print("Estimated frequency: {:.3f}kHz".format(freq_est))
     if freq is None or always_query_sample_rate:
@@ -178,52 +185,108 @@ class RTPStatistics(object):
     else:
       print("Guessed frequency: {}kHz".format(freq))
 
-    for point in self.data_points:
-      point.real_send_time_ms = (point.timestamp -
-                                 self.data_points[0].timestamp) / freq
-      point.delay = point.arrival_timestamp_ms - point.real_send_time_ms
+    self.SetFrequency(freq)
 
-  def PrintDurationStatistics(self):
-    """Prints delay, clock drift and bitrate statistics."""
+  def GuessFrequency(self):
+    """Guesses the RTP clock rate from the timestamps and arrival times.
+
+    Returns:
+        the estimated rate in kHz and the standard rate within 5% of it,
+        None if there is none.
+    """
+    timestamps = self.data_points["timestamp"]
+    arrival_timestamps_ms = self.data_points["arrival_timestamp_ms"]
+    delta_timestamp = timestamps[-1] - timestamps[0]
+    delta_arr_timestamp = float(arrival_timestamps_ms[-1] -
+                                arrival_timestamps_ms[0])
+    freq_est = delta_timestamp / delta_arr_timestamp
 
-    min_delay = min(point.delay for point in self.data_points)
+    freq_vec = [8, 16, 32, 48, 90]
+    freq = None
+    for f in freq_vec:
+      if abs((freq_est - f) / f) < 0.05:
+        freq = f
+    return (freq_est, freq)
+
+  def SetFrequency(self, freq):
+    """Computes send times and delays from the RTP clock rate in kHz."""
+    timestamps = self.data_points["timestamp"]
+    self.data_points["real_send_time_ms"] = (timestamps -
+                                             timestamps[0]) / freq
+    self.data_points["delay"] = (self.data_points["arrival_timestamp_ms"] -
+                                 self.data_points["real_send_time_ms"])
+
+  def DurationStatistics(self):
+    """Computes delay, clock drift and bitrate statistics.
+
+    Needs the send times of EstimateFrequency or SetFrequency, updates
+    `self.data_points` with the delay above the minimum one.
+
+    Returns:
+        dictionary with the stream durations at the sender and the
+        receiver in seconds, the clock drift in percent and the send and
+        receive average bitrates in kbps.
+    """
+    delays = self.data_points["delay"]
+    self.data_points["absdelay"] = delays - delays.min()
+
+    stream_duration_sender = self.data_points["real_send_time_ms"][-1] / 1000
+    arrival_timestamps_ms = self.data_points["arrival_timestamp_ms"]
+    stream_duration_receiver = (arrival_timestamps_ms.max() -
+                                arrival_timestamps_ms.min()) / 1000
+    total_size = self.data_points["size"].sum() * 8 / 1000
+    return {
+        "sender_duration_s": float(stream_duration_sender),
+        "receiver_duration_s": float(stream_duration_receiver),
+        "clock_drift_percent": float(
+            100 * (stream_duration_receiver / stream_duration_sender - 1)),
+        "send_bitrate_kbps": float(total_size / stream_duration_sender),
+        "receive_bitrate_kbps": float(total_size / stream_duration_receiver),
+    }
 
-    for point in self.data_points:
-      point.absdelay = point.delay - min_delay
+  def PrintDurationStatistics(self):
+    """Prints delay, clock drift and bitrate statistics."""
 
-    stream_duration_sender = self.data_points[-1].real_send_time_ms / 1000
+    statistics = self.DurationStatistics()
     print("Stream duration at sender: {:.1f} seconds".format(
-        stream_duration_sender
+        statistics["sender_duration_s"]
     ))
 
-    arrival_timestamps_ms = [point.arrival_timestamp_ms for point in
-                             self.data_points]
-    stream_duration_receiver = (max(arrival_timestamps_ms) -
-                                min(arrival_timestamps_ms)) / 1000
     print("Stream duration at receiver: {:.1f} seconds".format(
-        stream_duration_receiver
+        statistics["receiver_duration_s"]
     ))
 
-    print("Clock drift: {:.2f}%".format(
-        100 * (stream_duration_receiver / stream_duration_sender - 1)
-    ))
+    print("Clock drift: {:.2f}%".format(statistics["clock_drift_percent"]))
 
-    total_size = sum(point.size for point in self.data_points) * 8 / 1000
     print("Send average bitrate: {:.2f} kbps".format(
-        total_size / stream_duration_sender))
+        statistics["send_bitrate_kbps"]))
 
     print("Receive average bitrate: {:.2f} kbps".format(
-        total_size / stream_duration_receiver))
+        statistics["receive_bitrate_kbps"]))
 
   def RemoveReordered(self):
-    last = self.data_points[0]
-    data_points_ordered = [last]
-    for point in self.data_points[1:]:
-      if point.sequence_number > last.sequence_number and (
-          point.real_send_time_ms > last.real_send_time_ms):
-        data_points_ordered.append(point)
-        last = point
-    self.data_points = data_points_ordered
+    sequence_numbers = self.data_points["sequence_number"]
+    send_times_ms = self.data_points["real_send_time_ms"]
+    in_order = ((sequence_numbers[1:] > sequence_numbers[:-1]) &
+                (send_times_ms[1:] > send_times_ms[:-1]))
+    if in_order.all():
+      return
+    # A packet is kept when it comes after the last kept one, which depends
+    # on the packets removed before it: only the part from the first packet
+    # out of order is walked.
+    first = int(numpy.argmin(in_order)) + 1
+    kept = list(range(first))
+    (last_sequence_number, last_send_time_ms) = (
+        sequence_numbers[first - 1], send_times_ms[first - 1])
+    for (i, sequence_number, send_time_ms) in zip(
+        range(first, len(sequence_numbers)),
+        sequence_numbers[first:].tolist(), send_times_ms[first:].tolist()):
+      if (sequence_number > last_sequence_number and
+          send_time_ms > last_send_time_ms):
+        kept.append(i)
+        (last_sequence_number, last_send_time_ms) = (sequence_number,
+                                                     send_time_ms)
+    self.data_points = self.data_points[kept]
 
   def ComputeBandwidth(self):
     """Computes bandwidth averaged over several consecutive packets.
@@ -232,14 +295,15 @@ class RTPStatistics(object):
     BANDWIDTH_SMOOTHING_WINDOW_SIZE. Averaging is done with
     numpy.correlate.
     """
-    start_ms = self.data_points[0].real_send_time_ms
-    stop_ms = self.data_points[-1].real_send_time_ms
+    send_times_ms = self.data_points["real_send_time_ms"]
+    start_ms = send_times_ms[0]
+    stop_ms = send_times_ms[-1]
     (self.bandwidth_kbps, _) = numpy.histogram(
-        [point.real_send_time_ms for point in self.data_points],
+        send_times_ms,
         bins=numpy.arange(start_ms, stop_ms,
                           RTPStatistics.PLOT_RESOLUTION_MS),
-        weights=[point.size * 8 / RTPStatistics.PLOT_RESOLUTION_MS
-                 for point in self.data_points]
+        weights=(self.data_points["size"] * 8 /
+                 RTPStatistics.PLOT_RESOLUTION_MS)
     )
     correlate_filter = (numpy.ones(
         RTPStatistics.BANDWIDTH_SMOOTHING_WINDOW_SIZE) /
@@ -249,8 +313,28 @@ class RTPStatistics(object):
   def PlotStatistics(self):
     """Plots changes in delay and average bandwidth."""
 
-    start_ms = self.data_points[0].real_send_time_ms
-    stop_ms = self.data_points[-1].real_send_time_ms
+    self.DrawStatistics()
+    plt.show()
+
+  def SavePlots(self, path_prefix):
+    """Writes the plots of PlotStatistics to PNG files.
+
+    Returns:
+        the paths of the delay and bandwidth plots, path_prefix followed by
+        _delay.png and _bandwidth.png.
+    """
+    self.DrawStatistics()
+    paths = [path_prefix + "_delay.png", path_prefix + "_bandwidth.png"]
+    for (figure, path) in zip((1, 2), paths):
+      plt.figure(figure).savefig(path)
+    plt.close("all")
+    return paths
+
+  def DrawStatistics(self):
+    """Draws changes in delay and average bandwidth in figures 1 and 2."""
+
+    start_ms = self.data_points["real_send_time_ms"][0]
+    stop_ms = self.data_points["real_send_time_ms"][-1]
     time_axis = numpy.arange(start_ms / 1000, stop_ms / 1000,
                              RTPStatistics.PLOT_RESOLUTION_MS / 1000)
 
@@ -268,7 +352,48 @@ class RTPStatistics(object):
     plt.xlabel("Send time [s]")
     plt.ylabel("Bandwidth [kbps]")
 
-    plt.show()
+
+def PacketTable(packets):
+  """Returns a copy of packets with the columns the statistics fill in.
+
+  The send time, delay and delay above the minimum of every packet are
+  computed by EstimateFrequency and PrintDurationStatistics, they are NaN
+  until then.
+  """
+  table = numpy.empty(len(packets), dtype=STATISTICS_DTYPE)
+  for name in packets.dtype.names:
+    table[name] = packets[name]
+  for name in DERIVED_COLUMNS:
+    table[name] = numpy.nan
+  return table
+
+
+def SsrcDirections(packets, ssrc_index=None):
+  """Maps every SSRC to whether its last packet is incoming.
+
+  Args:
+      packets: array of pb_parse.PACKET_DTYPE.
+      ssrc_index: packet_cache.SsrcIndex of packets, built if None.
+  """
+  if ssrc_index is None:
+    ssrc_index = packet_cache.SsrcIndex.Build(packets["ssrc"])
+  incoming = packets["incoming"][ssrc_index.LastRows()]
+  # In the order of the first packet of every SSRC
+  order = numpy.argsort(ssrc_index.FirstRows(), kind="stable")
+  return collections.OrderedDict(zip(ssrc_index.ssrcs[order].tolist(),
+                                     incoming[order].tolist()))
+
+
+def Unwrap(values, mod):
+  """Returns values unwrapped modulo mod, like misc.Unwrap, as an array.
+
+  Every difference between consecutive values is brought to
+  [-mod / 2, mod / 2) and the unwrapped values are their running sum
+  from the first one.
+  """
+  values = numpy.asarray(values, dtype=numpy.int64)
+  steps = (numpy.diff(values) + mod // 2) % mod - mod // 2
+  return numpy.concatenate((values[:1], values[:1] + numpy.cumsum(steps)))
 
 
 def CalculateDelay(start, stop, step, points):
@@ -279,14 +404,24 @@ def CalculateDelay(start, stop, step, points):
   the average of the delays of points rounded to the same. Returns
   masked array, in which time points with no value are masked.
 
+  Args:
+      points: array with the real_send_time_ms and absdelay columns, or
+          list of objects with these attributes.
   """
-  grouped_delays = [[] for _ in numpy.arange(start, stop + step, step)]
-  rounded_value_index = lambda x: int((x - start) / step)
-  for point in points:
-    grouped_delays[rounded_value_index(point.real_send_time_ms)
-                  ].append(point.absdelay)
-  regularized_delays = [numpy.average(arr) if arr else -1 for arr in
-                        grouped_delays]
+  if isinstance(points, numpy.ndarray):
+    send_times_ms = points["real_send_time_ms"]
+    delays = points["absdelay"]
+  else:
+    send_times_ms = numpy.array([point.real_send_time_ms for point in points],
+                                dtype=numpy.float64)
+    delays = numpy.array([point.absdelay for point in points],
+                         dtype=numpy.float64)
+  bins = len(numpy.arange(start, stop + step, step))
+  indices = ((send_times_ms - start) / step).astype(numpy.int64)
+  counts = numpy.bincount(indices, minlength=bins)
+  sums = numpy.bincount(indices, weights=delays, minlength=bins)
+  regularized_delays = numpy.full(len(counts), -1, dtype=numpy.float64)
+  numpy.divide(sums, counts, out=regularized_delays, where=counts > 0)
   return numpy.ma.masked_values(regularized_delays, -1)
 
 
@@ -315,7 +450,7 @@ def main():
   if options.working_directory and not os.path.isabs(input_file):
     input_file = os.path.join(options.working_directory, input_file)
 
-  data_points = pb_parse.ParseProtobuf(input_file)
+  data_points = pb_parse.ParsePackets(input_file)
   rtp_stats = RTPStatistics(data_points)
 
   if options.dump_header_to_stdout:
@@ -15,6 +15,8 @@ or
 """
 
 import collections
+import contextlib
+import io
 import unittest
 
 MISSING_NUMPY = False  # pylint: disable=invalid-name
@@ -26,6 +28,18 @@ except ImportError:
 
 FakePoint = collections.namedtuple("FakePoint",
                                    ["real_send_time_ms", "absdelay"])
+FakeDataPoint = collections.namedtuple(
+    "FakeDataPoint", ["arrival_timestamp_ms", "size", "incoming",
+                      "sequence_number", "timestamp", "ssrc", "payload_type",
+                      "marker_bit"])
+
+
+def MakeDataPoints(sequence_numbers, ssrc=1, incoming=True):
+  return [FakeDataPoint(arrival_timestamp_ms=1000 + 20 * i, size=100 + i,
+                        incoming=incoming, sequence_number=sequence_number,
+                        timestamp=(2**32 - 3600 + 1800 * i) % 2**32,
+                        ssrc=ssrc, payload_type=96, marker_bit=0)
+          for (i, sequence_number) in enumerate(sequence_numbers)]
 
 
 class TestDelay(unittest.TestCase):
@@ -53,9 +67,69 @@ class TestDelay(unittest.TestCase):
     mask = rtp_analyzer.CalculateDelay(0, 3, 2, points)
     self.AssertMaskEqual(mask, [0, 0, -1], [False, False, True])
 
+  def testCalculateDelayArray(self):
+    points = numpy.array([(0, 1), (0.5, 3), (2, 4)],
+                         dtype=[("real_send_time_ms", float),
+                                ("absdelay", float)])
+    mask = rtp_analyzer.CalculateDelay(0, 2, 1, points)
+    self.AssertMaskEqual(mask, [2, -1, 4], [False, True, False])
+
+
+class TestRTPStatistics(unittest.TestCase):
+  def Run(self, method, *args):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+      method(*args)
+    return output.getvalue()
+
+  def testSsrcTables(self):
+    stats = rtp_analyzer.RTPStatistics(
+        MakeDataPoints([1, 2, 3], ssrc=7, incoming=False) +
+        MakeDataPoints([1], ssrc=5))
+    self.assertEqual(stats.ssrc_frequencies, {5: 0.25, 7: 0.75})
+    self.assertAlmostEqual(stats.ssrc_size_table[5], 100 / 403)
+    self.assertEqual(list(rtp_analyzer.SsrcDirections(stats.data_points)
+                          .items()), [(7, False), (5, True)])
+
+  def testPayloadTypesInOrderOfAppearance(self):
+    points = MakeDataPoints([1, 2, 3, 4])
+    points = [point._replace(payload_type=payload_type)
+              for (point, payload_type) in zip(points, [111, 96, 111, 100])]
+    stats = rtp_analyzer.RTPStatistics(points)
+    self.assertTrue(self.Run(stats.PrintSsrcInfo, "", 1).startswith(
+        " 0x1 payload type(s): 111, 96, 100, "))
+
+  def testFilterSsrcUnwraps(self):
+    stats = rtp_analyzer.RTPStatistics(
+        MakeDataPoints([65533, 65534, 0, 1], ssrc=7) +
+        MakeDataPoints([1], ssrc=5))
+    stats.FilterSsrc(7)
+    self.assertEqual(list(stats.data_points["ssrc"]), [7] * 4)
+    self.assertEqual(list(stats.data_points["sequence_number"]),
+                     [65533, 65534, 65536, 65537])
+    self.assertEqual(list(stats.data_points["timestamp"]),
+                     [2**32 - 3600, 2**32 - 1800, 2**32, 2**32 + 1800])
+
+  def testSequenceNumberStatistics(self):
+    stats = rtp_analyzer.RTPStatistics(MakeDataPoints([1, 2, 2, 5, 4, 6]))
+    self.assertEqual(self.Run(stats.PrintSequenceNumberStatistics),
+                     "Missing sequence numbers: 1 out of 5  (20.00%)\n"
+                     "Duplicated packets: 1\n"
+                     "Reordered packets: 2\n")
+
+  def testRemoveReordered(self):
+    stats = rtp_analyzer.RTPStatistics(MakeDataPoints([1, 2, 5, 3, 6, 7]))
+    stats.FilterSsrc(1)
+    stats.SetFrequency(90)
+    self.assertEqual(list(stats.data_points["real_send_time_ms"]),
+                     [0, 20, 40, 60, 80, 100])
+    stats.RemoveReordered()
+    self.assertEqual(list(stats.data_points["sequence_number"]),
+                     [1, 2, 5, 6, 7])
+
 
 if __name__ == "__main__":
   if MISSING_NUMPY:
-    print "Missing numpy, skipping test."
+    print("Missing numpy, skipping test.")
   else:
     unittest.main()
@@ -31,9 +31,14 @@ const uint32_t kReceiverLocalAudioSsrc = 0x1234567;
 
 constexpr int kEventLogOutputIntervalMs = 5000;
 
-CallClientFakeAudio InitAudio(TimeController* time_controller) {
+CallClientFakeAudio InitAudio(TimeController* time_controller,
+                              const std::string& audio_file) {
   CallClientFakeAudio setup;
-  auto capturer = TestAudioDeviceModule::CreatePulsedNoiseCapturer(256, 48000);
+  auto capturer =
+      audio_file.empty()
+          ? TestAudioDeviceModule::CreatePulsedNoiseCapturer(256, 48000)
+          : TestAudioDeviceModule::CreateWavFileReader(audio_file,
+                                                       /*repeat=*/true);
   auto renderer = TestAudioDeviceModule::CreateDiscardRenderer(48000);
   setup.fake_audio_device = TestAudioDeviceModule::Create(
       time_controller->GetTaskQueueFactory(), std::move(capturer),
@@ -161,22 +166,14 @@ LoggingNetworkControllerFactory::LoggingNetworkControllerFactory(
       RTC_LOG(LS_WARNING)
           << "Can't log controller state for injected network controllers";
   } else {
-    if (log_writer_factory) {
-      goog_cc_factory_.AttachWriter(
-          log_writer_factory->Create(".cc_state.txt"));
-      print_cc_state_ = true;
-    }
-    cc_factory_ = &goog_cc_factory_;
+    cc_factory_ = &alpha_cc_factory_;
   }
 }
 
 LoggingNetworkControllerFactory::~LoggingNetworkControllerFactory() {}
 
 void LoggingNetworkControllerFactory::LogCongestionControllerStats(
-    Timestamp at_time) {
-  if (print_cc_state_)
-    goog_cc_factory_.PrintState(at_time);
-}
+    Timestamp at_time) {}
 
 NetworkControlUpdate LoggingNetworkControllerFactory::GetUpdate() const {
   if (last_controller_)
@@ -212,7 +209,7 @@ CallClient::CallClient(
   SendTask([this, config] {
     event_log_ = CreateEventLog(time_controller_->GetTaskQueueFactory(),
                                 log_writer_factory_.get());
-    fake_audio_setup_ = InitAudio(time_controller_);
+    fake_audio_setup_ = InitAudio(time_controller_, config.audio_file);
     call_.reset(CreateCall(time_controller_, event_log_.get(), config,
                            &network_controller_factory_,
                            fake_audio_setup_.audio_state));
@@ -18,9 +18,10 @@
 
 #include "api/rtc_event_log/rtc_event_log.h"
 #include "api/test/time_controller.h"
+#include "api/transport/alpha_cc_factory.h"
+#include "api/transport/field_trial_based_config.h"
 #include "call/call.h"
 #include "modules/audio_device/include/test_audio_device.h"
-#include "modules/congestion_controller/goog_cc/test/goog_cc_printer.h"
 #include "rtc_base/constructor_magic.h"
 #include "rtc_base/task_queue_for_test.h"
 #include "test/logging/log_writer.h"
@@ -74,14 +75,15 @@ class LoggingNetworkControllerFactory
       NetworkControllerConfig config) override;
   TimeDelta GetProcessInterval() const override;
   // TODO(srte): Consider using the Columnprinter interface for this.
+  // AlphaCC doesn't print its controller state, this is a no-op.
   void LogCongestionControllerStats(Timestamp at_time);
 
   NetworkControlUpdate GetUpdate() const;
 
  private:
-  GoogCcDebugFactory goog_cc_factory_;
+  // The AlphaCC controller (see api/transport/alpha_cc_factory.h)
+  GoogCcNetworkControllerFactory alpha_cc_factory_;
   NetworkControllerFactoryInterface* cc_factory_ = nullptr;
-  bool print_cc_state_ = false;
   NetworkControleUpdateCache* last_controller_ = nullptr;
 };
 
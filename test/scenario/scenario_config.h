@@ -52,6 +52,8 @@ struct TransportControllerConfig {
 
 struct CallClientConfig {
   TransportControllerConfig transport;
+  // WAV file the captured audio is read from in a loop, pulsed noise if empty
+  std::string audio_file;
   const WebRtcKeyValueConfig* field_trials = nullptr;
 };
 